@@ -24,7 +24,8 @@ data class ProcessReceiptResponse(
 
 data class ReceiptDto(
     val id: String,
-    val raw_text: String,
+    // Omitido por padrão pela API (?exclude=raw_text)
+    val raw_text: String? = null,
     val items: List<ReceiptItemDto>,
     val subtotal: Double,
     val total: Double,
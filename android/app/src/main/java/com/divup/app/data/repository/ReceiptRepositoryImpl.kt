@@ -34,7 +34,7 @@ class ReceiptRepositoryImpl @Inject constructor(
                     if (dto != null) {
                         val receipt = Receipt(
                             id = dto.id,
-                            rawText = dto.raw_text,
+                            rawText = dto.raw_text.orEmpty(),
                             items = dto.items.map { 
                                 ReceiptItem(
                                     id = it.id,
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
-from app.api.routes import receipt
+from app.api.routes import receipt, split
 
 api_router = APIRouter()
 api_router.include_router(receipt.router, prefix="/receipt", tags=["receipt"])
+api_router.include_router(split.router, prefix="/split", tags=["split"])
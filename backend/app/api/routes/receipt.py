@@ -1,75 +1,335 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from app.models.receipt import ProcessReceiptResponse
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from app.models.receipt import (
+    BatchImageResult, BatchReceiptResponse, JobResponse, JobStatus,
+    ProcessReceiptResponse, ReceiptData, ReceiptItem
+)
+from app.core.admission import ClientLimiter
+from app.core.ocr.merge import merge_receipts
+from app.core.metrics import ERRORS, SERIALIZATION_SECONDS, UPLOAD_READ_SECONDS
+from app.core.static import accepts_encoding
 from app.services.receipt_service import ReceiptService
+from app.services.job_queue import JobQueue, QueueFullError
 from app.core.config import settings
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+import asyncio
+import gzip
+import json
+import logging
 import os
+import time
 import uuid
-import shutil
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 receipt_service = ReceiptService()
+# Workers iniciados/parados no lifespan da aplicação (app.main)
+job_queue = JobQueue(
+    receipt_service,
+    workers=settings.JOB_WORKERS,
+    max_depth=settings.JOB_QUEUE_MAX_DEPTH,
+    result_ttl=settings.JOB_RESULT_TTL_SECONDS,
+)
 
-@router.post("/process", response_model=ProcessReceiptResponse)
-async def process_receipt(file: UploadFile = File(...)):
+# Rotas de upload (caminho -> máximo de arquivos) e limite por cliente, aplicados
+# pelo AdmissionMiddleware (app.main) antes de o corpo ser bufferizado
+UPLOAD_ROUTES = {
+    "/process": 1,
+    "/process/stream": 1,
+    "/process/batch": settings.BATCH_MAX_IMAGES,
+    "/jobs": 1,
+}
+client_limiter = ClientLimiter(
+    rate_per_minute=settings.CLIENT_RATE_LIMIT_PER_MINUTE,
+    burst=settings.CLIENT_RATE_LIMIT_BURST,
+    max_in_flight=settings.CLIENT_MAX_IN_FLIGHT,
+)
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Lê o upload em chunks, abortando assim que passar de MAX_UPLOAD_BYTES."""
+    chunks = []
+    size = 0
+    with UPLOAD_READ_SECONDS.time():
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_BYTES:
+                ERRORS.inc(stage="upload", type="too_large")
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Imagem muito grande. Máximo: {settings.MAX_UPLOAD_BYTES // (1024 * 1024)}MB."
+                )
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+RECEIPT_FIELDS = frozenset(ReceiptData.model_fields)
+
+def _field_list(value: Optional[str], param: str) -> set:
+    names = {name.strip() for name in (value or "").split(",") if name.strip()}
+    unknown = names - RECEIPT_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campo(s) inválido(s) em '{param}': {', '.join(sorted(unknown))}. "
+                   f"Disponíveis: {', '.join(sorted(RECEIPT_FIELDS))}"
+        )
+    return names
+
+def receipt_exclusion(
+    fields: Optional[str] = Query(None, description="Campos da nota a retornar (ex: id,items,total)"),
+    exclude: str = Query("raw_text", description="Campos da nota a omitir; vazio devolve tudo"),
+) -> set:
+    """Campos de ReceiptData fora da resposta. Por padrão só o raw_text (a resposta bruta do modelo)."""
+    excluded = _field_list(exclude, "exclude")
+    if fields is not None:
+        excluded |= RECEIPT_FIELDS - _field_list(fields, "fields")
+    return excluded
+
+def nested_exclude(excluded: set, batch: bool = False) -> Optional[dict]:
+    """Aplica os campos excluídos a toda nota dentro da resposta."""
+    if not excluded:
+        return None
+    if batch:
+        return {"receipt": excluded, "results": {"__all__": {"receipt": excluded}}}
+    return {"receipt": excluded}
+
+def json_response(
+    request: Request,
+    model: BaseModel,
+    endpoint: str,
+    exclude=None,
+    status_code: int = 200,
+) -> Response:
     """
-    Processa imagem de nota fiscal.
-    
-    Aceita: JPEG, PNG
-    Max size: 10MB (validado no nginx/config ou aqui se desejar)
+    Serializa a resposta uma única vez (pydantic-core direto para bytes, sem
+    jsonable_encoder) e comprime com gzip acima de RESPONSE_GZIP_MIN_BYTES.
     """
+    headers = {}
+    with SERIALIZATION_SECONDS.time(endpoint=endpoint):
+        body = model.__pydantic_serializer__.to_json(model, exclude=exclude)
+        if len(body) >= settings.RESPONSE_GZIP_MIN_BYTES:
+            headers["Vary"] = "Accept-Encoding"
+            if accepts_encoding(request.headers.get("accept-encoding", ""), "gzip"):
+                body = gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL)
+                headers["Content-Encoding"] = "gzip"
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+def persist_upload(content: bytes, ext: str) -> str:
+    """Grava uma cópia do upload em UPLOAD_DIR (modo debug/auditoria)."""
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4()}{ext}")
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+async def receive_upload(file: UploadFile) -> bytes:
+    """Valida a extensão e lê o upload (gravando cópia se PERSIST_UPLOADS)."""
     # Validar extensão
     ext = os.path.splitext(file.filename)[1].lower()
     if ext not in settings.ALLOWED_EXTENSIONS.split(','):
+        ERRORS.inc(stage="upload", type="invalid_extension")
         raise HTTPException(status_code=400, detail="Formato inválido. Use JPG ou PNG.")
-    
-    # Garantir diretório de upload
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    
-    # Salvar temporariamente
-    temp_filename = f"{uuid.uuid4()}{ext}"
-    temp_path = os.path.join(settings.UPLOAD_DIR, temp_filename)
-    
+
+    content = await read_upload(file)
+
+    if settings.PERSIST_UPLOADS:
+        await asyncio.to_thread(persist_upload, content, ext)
+
+    return content
+
+async def enqueue_upload(file: UploadFile):
+    """Valida, lê e enfileira o upload. Fila cheia vira 503 + Retry-After."""
+    content = await receive_upload(file)
+
     try:
-        with open(temp_path, "wb") as f:
-            # Ler em chunks para não estourar memória se for grande, 
-            # mas aqui assumimos < 10MB
-            content = await file.read()
-            f.write(content)
-        
-        # Processar OCR
-        receipt_data, processing_time = receipt_service.process_receipt_image(temp_path)
-        
-        # DEBUG: Verificar quantos itens estão sendo retornados
-        print(f"\n📤 RESPOSTA HTTP: Enviando {len(receipt_data.items)} itens para o cliente")
-        for idx, item in enumerate(receipt_data.items, 1):
-            print(f"   {idx}. {item.name[:40]} - {item.quantity}x R${item.unit_price:.2f}")
-        print()
-        
-        return ProcessReceiptResponse(
-            success=True,
-            receipt=receipt_data,
-            processing_time_ms=processing_time
+        return job_queue.submit(content)
+    except QueueFullError as e:
+        ERRORS.inc(stage="queue", type="queue_full")
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor ocupado processando outras notas. Tente novamente em instantes.",
+            headers={"Retry-After": str(e.retry_after)},
         )
-    
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return ProcessReceiptResponse(
+
+@router.post("/process", response_model=ProcessReceiptResponse)
+async def process_receipt(
+    request: Request,
+    file: UploadFile = File(...),
+    excluded: set = Depends(receipt_exclusion),
+):
+    """
+    Processa imagem de nota fiscal.
+
+    Aceita: JPEG, PNG
+    Max size: MAX_UPLOAD_BYTES (10MB por padrão)
+
+    Síncrono para o cliente: enfileira e aguarda o job terminar.
+    `fields`/`exclude` escolhem os campos da nota (raw_text fica de fora por padrão).
+    """
+    job = await enqueue_upload(file)
+    await job_queue.wait(job)
+
+    if job.status == JobStatus.FAILED:
+        # O traceback já foi registrado pelo ReceiptService
+        return json_response(request, ProcessReceiptResponse(
             success=False,
-            error=str(e),
+            error=job.error,
             processing_time_ms=0
+        ), endpoint="process")
+
+    logger.debug("resposta_enviada", extra={"job_id": job.id, "items": len(job.receipt.items)})
+
+    return json_response(request, ProcessReceiptResponse(
+        success=True,
+        receipt=job.receipt,
+        processing_time_ms=job.processing_time_ms
+    ), endpoint="process", exclude=nested_exclude(excluded))
+
+@router.post("/process/batch", response_model=BatchReceiptResponse)
+async def process_receipt_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    merge: bool = Query(True, description="Juntar as fotos em uma única nota"),
+    excluded: set = Depends(receipt_exclusion),
+):
+    """
+    Processa várias fotos de uma vez (nota longa em partes ou várias contas).
+
+    As imagens são extraídas em paralelo. Com merge=true retorna uma nota
+    única, removendo itens repetidos na sobreposição entre fotos consecutivas;
+    com merge=false, retorna uma nota por imagem. Sempre inclui o tempo de
+    cada imagem.
+    """
+    if len(files) > settings.BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Envie no máximo {settings.BATCH_MAX_IMAGES} imagens por vez."
+        )
+
+    start_time = time.time()
+    contents = [await receive_upload(file) for file in files]
+    outcomes = await receipt_service.process_batch(contents)
+
+    results = [
+        BatchImageResult(
+            index=index,
+            filename=file.filename,
+            success=error is None,
+            receipt=None if merge else receipt_data,
+            error=str(error) if error else None,
+            processing_time_ms=processing_time,
         )
-    
-    finally:
-        # Limpar arquivo temporário
-        # Em produção, poderíamos mover para S3 ou manter por um tempo para debug
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except Exception:
-                pass
+        for index, (file, (receipt_data, error, processing_time)) in enumerate(zip(files, outcomes))
+    ]
+    succeeded = [receipt_data for receipt_data, error, _ in outcomes if error is None]
+
+    merged = merge_receipts(succeeded) if merge and succeeded else None
+    return json_response(request, BatchReceiptResponse(
+        success=bool(succeeded),
+        receipt=merged,
+        results=results,
+        error=None if succeeded else "Nenhuma imagem pôde ser processada",
+        processing_time_ms=int((time.time() - start_time) * 1000),
+    ), endpoint="batch", exclude=nested_exclude(excluded, batch=True))
+
+def stream_frame(frame: dict, fmt: str) -> str:
+    with SERIALIZATION_SECONDS.time(endpoint="stream"):
+        payload = json.dumps(frame, ensure_ascii=False)
+    if fmt == "sse":
+        return f"event: {frame['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+@router.post("/process/stream")
+async def process_receipt_stream(
+    file: UploadFile = File(...),
+    format: Literal["ndjson", "sse"] = Query("ndjson")
+):
+    """
+    Processa a nota enviando os itens conforme o modelo os gera.
+
+    Frames (NDJSON por padrão, ou Server-Sent Events com ?format=sse):
+    - {"type": "item", "item": {...}} para cada item
+    - {"type": "summary", ...} no final, com totais, estabelecimento e data
+    - {"type": "error", "error": "..."} se a extração falhar
+    """
+    content = await receive_upload(file)
+    start_time = time.time()
+
+    async def frames():
+        streamed_ids = []
+        try:
+            async for result in receipt_service.stream_receipt_image(content):
+                if isinstance(result, ReceiptItem):
+                    streamed_ids.append(result.id)
+                    yield stream_frame({"type": "item", "item": result.model_dump()}, format)
+                    continue
+
+                summary = {
+                    "type": "summary",
+                    "receipt_id": result.id,
+                    "item_count": len(result.items),
+                    "subtotal": result.subtotal,
+                    "total": result.total,
+                    "establishment_name": result.establishment_name,
+                    "date": result.date,
+                    "confidence_score": result.confidence_score,
+                    "processing_time_ms": int((time.time() - start_time) * 1000),
+                }
+                if [item.id for item in result.items] != streamed_ids:
+                    # Itens finais divergem do que foi enviado: manda a lista definitiva
+                    summary["items"] = [item.model_dump() for item in result.items]
+                yield stream_frame(summary, format)
+        except Exception as e:
+            yield stream_frame({"type": "error", "error": str(e)}, format)
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(frames(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: Request, file: UploadFile = File(...)):
+    """
+    Enfileira a nota e retorna o id do job imediatamente.
+
+    Acompanhe com GET /receipt/jobs/{job_id} (use ?wait=N para long-poll).
+    """
+    job = await enqueue_upload(file)
+    return json_response(request, job.to_response(), endpoint="jobs", status_code=202)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    request: Request,
+    job_id: str,
+    wait: float = Query(0, ge=0),
+    excluded: set = Depends(receipt_exclusion),
+):
+    """Status/resultado do job. Com `wait`, segura a resposta até terminar (long-poll)."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado.")
+    if wait:
+        await job_queue.wait(job, timeout=min(wait, settings.JOB_MAX_WAIT_SECONDS))
+    return json_response(request, job.to_response(), endpoint="jobs", exclude=nested_exclude(excluded))
+
+@router.get("/stats")
+async def processing_stats():
+    """Contadores de cache (hits/misses), fila de jobs e extrações em andamento."""
+    return {**receipt_service.stats(), "jobs": job_queue.stats(), "admission": client_limiter.stats()}
 
 @router.get("/health")
 async def health_check():
     """Health check."""
     return {"status": "healthy"}
+
+# Por último: o parâmetro de caminho pegaria /stats, /health etc.
+@router.get("/{receipt_id}", response_model=ReceiptData)
+async def get_receipt(
+    request: Request,
+    receipt_id: str,
+    excluded: set = Depends(receipt_exclusion),
+):
+    """Nota já processada, pelo id (outro amigo abrindo a mesma conta, app recarregado)."""
+    receipt_data = await receipt_service.get_receipt(receipt_id)
+    if receipt_data is None:
+        raise HTTPException(status_code=404, detail="Nota não encontrada ou expirada.")
+    return json_response(request, receipt_data, endpoint="receipt", exclude=excluded)
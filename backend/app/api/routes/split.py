@@ -0,0 +1,135 @@
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from app.api.routes.receipt import receipt_service
+from app.core.config import settings
+from app.models.split import CreateSplitSessionRequest, SplitSessionResponse
+from app.services.split_sessions import SessionError, SessionLimitError, SplitSessionManager
+from typing import Optional
+import asyncio
+import json
+
+router = APIRouter()
+# Varredura de sessões ociosas iniciada/parada no lifespan da aplicação (app.main)
+split_sessions = SplitSessionManager(
+    max_sessions=settings.SPLIT_MAX_SESSIONS,
+    max_participants=settings.SPLIT_MAX_PARTICIPANTS,
+    idle_seconds=settings.SPLIT_SESSION_IDLE_SECONDS,
+    max_pending=settings.SPLIT_MAX_PENDING_MESSAGES,
+    history=settings.SPLIT_DELTA_HISTORY,
+)
+
+# Códigos de fechamento do WebSocket (faixa 4000-4999 é da aplicação)
+CLOSE_NOT_FOUND = 4404
+CLOSE_FULL = 4429
+CLOSE_SLOW_CONSUMER = 4008
+
+@router.post("/sessions", response_model=SplitSessionResponse, status_code=201)
+async def create_session(body: CreateSplitSessionRequest):
+    """
+    Abre uma sessão de divisão para uma nota já processada.
+
+    Os amigos entram pelo código (GET /split/sessions/{code} ou WebSocket).
+    """
+    if not receipt_service.keeps_receipts:
+        raise HTTPException(
+            status_code=503,
+            detail="Sessões de divisão indisponíveis: o servidor não guarda as notas processadas "
+                   "(store e cache desligados).",
+        )
+    receipt_data = await receipt_service.get_receipt(body.receipt_id)
+    if receipt_data is None:
+        raise HTTPException(status_code=404, detail="Nota não encontrada ou expirada.")
+    try:
+        session = split_sessions.create(receipt_data)
+    except SessionLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return SplitSessionResponse(
+        code=session.code,
+        receipt_id=receipt_data.id,
+        websocket_path=f"{settings.API_V1_PREFIX}/split/sessions/{session.code}/ws",
+    )
+
+@router.get("/sessions/{code}")
+async def get_session(code: str):
+    """Estado atual da sessão (o mesmo snapshot enviado ao conectar no WebSocket)."""
+    session = split_sessions.get(code)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sessão não encontrada ou expirada.")
+    return session.snapshot()
+
+@router.get("/stats")
+async def split_stats():
+    return split_sessions.stats()
+
+@router.websocket("/sessions/{code}/ws")
+async def session_socket(
+    websocket: WebSocket,
+    code: str,
+    name: str = Query("Convidado", max_length=40),
+    participant_id: Optional[str] = None,
+    since: Optional[int] = None,
+):
+    """
+    Canal da sessão. Ao conectar: {"type": "welcome"} e depois um snapshot, ou só
+    os deltas após `since` (reconexão). Em seguida, cada mudança chega como delta:
+    {"type": "join"|"claim"|"leave", "version": n, ...}.
+
+    Para reconectar como a mesma pessoa, use o `participant_id` do welcome. Quem
+    desconecta sem ter pegado nada sai da sessão (delta "leave"); voltando com o
+    id, entra de novo com ele.
+
+    Cliente envia {"type": "claim", "item_id": "...", "quantity": n}.
+    """
+    session = split_sessions.get(code)
+    await websocket.accept()
+    if session is None:
+        await websocket.close(code=CLOSE_NOT_FOUND, reason="Sessão não encontrada")
+        return
+    try:
+        participant_id = session.join(name, participant_id)
+    except SessionLimitError as e:
+        await websocket.close(code=CLOSE_FULL, reason=str(e))
+        return
+
+    # Inscreve antes de qualquer await: nenhum delta se perde entre o snapshot e a fila
+    backlog = session.deltas_since(since) if since is not None else None
+    catch_up = backlog if backlog is not None else [json.dumps(session.snapshot(), ensure_ascii=False)]
+    subscriber = split_sessions.subscriber(participant_id)
+    session.subscribe(subscriber)
+
+    async def sender():
+        await websocket.send_text(json.dumps({
+            "type": "welcome", "participant_id": participant_id, "version": session.version,
+        }))
+        for message in catch_up:
+            await websocket.send_text(message)
+        while True:
+            message = await subscriber.queue.get()
+            if subscriber.overflowed:
+                # Perdeu deltas: derruba para o cliente reconectar com ?since=
+                split_sessions.slow_disconnects += 1
+                await websocket.close(code=CLOSE_SLOW_CONSUMER, reason="Conexão lenta")
+                return
+            await websocket.send_text(message)
+
+    sender_task = asyncio.create_task(sender())
+    try:
+        while True:
+            # Se o sender derrubar a conexão, o receive acorda com WebSocketDisconnect
+            text = await websocket.receive_text()
+            try:
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    raise SessionError("JSON inválido")
+                if not isinstance(message, dict) or message.get("type") != "claim":
+                    raise SessionError("Mensagem desconhecida")
+                session.claim(participant_id, message.get("item_id"), message.get("quantity"))
+            except SessionError as e:
+                subscriber.offer(json.dumps({"type": "error", "error": str(e)}, ensure_ascii=False))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        session.unsubscribe(subscriber)
+        session.leave(participant_id)
+        sender_task.cancel()
+        await asyncio.gather(sender_task, return_exceptions=True)
@@ -0,0 +1,301 @@
+"""
+Controle de admissão dos uploads, antes da rota e enquanto o corpo chega.
+
+- Content-Length acima do limite: 413 sem ler nada;
+- corpo (ou um arquivo do multipart) passando do limite: 413 no meio da leitura;
+- arquivo que não começa com a assinatura de JPEG/PNG: 415 nos primeiros bytes;
+- token bucket por cliente (IP; opcionalmente IP + X-Device-Id): 429 +
+  Retry-After. Cada arquivo do multipart gasta um token, então um lote de 10
+  fotos custa 10.
+
+O limite de uploads em andamento vale enquanto a requisição está aberta: em
+POST /jobs ele é liberado no 202, e os jobs que ficam na fila não contam para
+o cliente (só para JOB_QUEUE_MAX_DEPTH, que é de todos).
+
+Nada disso depende de o multipart já ter sido parseado pelo Starlette, que
+só entrega o formulário à rota depois de bufferizar o corpo inteiro.
+"""
+from app.core.metrics import ERRORS
+from app.core.resilience import TokenBucket
+from collections import OrderedDict
+from typing import Dict, Optional
+import itertools
+import json
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIGNATURES = (
+    b"\xff\xd8\xff",  # JPEG
+    b"\x89PNG\r\n\x1a\n",  # PNG
+)
+SIGNATURE_LENGTH = max(len(signature) for signature in IMAGE_SIGNATURES)
+# Cabeçalhos de uma parte do multipart maiores que isso não são de um upload legítimo
+MAX_PART_HEADER_BYTES = 16 * 1024
+
+_BOUNDARY_RE = re.compile(rb'boundary="?([^";]+)"?', re.IGNORECASE)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class MultipartSniffer:
+    """
+    Acompanha o multipart/form-data conforme os chunks chegam, sem bufferizar
+    os arquivos: acha o início de cada parte, confere a assinatura dos
+    arquivos e conta os bytes de cada um.
+    """
+
+    def __init__(self, boundary: bytes, max_file_bytes: int):
+        self._delimiter = b"\r\n--" + boundary
+        self.max_file_bytes = max_file_bytes
+        # O corpo começa direto com "--boundary" (sem CRLF antes)
+        self._buffer = b"\r\n"
+        self._state = "delimiter"
+        self._in_file = False
+        self._file_bytes = 0
+        self.files = 0
+
+    def feed(self, chunk: bytes) -> int:
+        """Processa um chunk; retorna quantos arquivos novos começaram nele."""
+        started = self.files
+        self._buffer += chunk
+        while True:
+            if self._state == "delimiter":
+                index = self._buffer.find(self._delimiter)
+                if index < 0:
+                    # Guarda só o bastante para achar um delimitador partido entre chunks
+                    keep = len(self._delimiter) - 1
+                    self._count(len(self._buffer) - keep)
+                    self._buffer = self._buffer[-keep:]
+                    break
+                self._count(index)
+                self._buffer = self._buffer[index + len(self._delimiter):]
+                self._in_file = False
+                self._state = "headers"
+            elif self._state == "headers":
+                end = self._buffer.find(b"\r\n\r\n")
+                if end < 0:
+                    if len(self._buffer) > MAX_PART_HEADER_BYTES:
+                        raise AdmissionRejected(400, "multipart_invalido", "Upload malformado.")
+                    break
+                headers = self._buffer[:end].lower()
+                self._buffer = self._buffer[end + 4:]
+                if b"filename=" in headers:
+                    self.files += 1
+                    self._in_file = True
+                    self._file_bytes = 0
+                    self._state = "signature"
+                else:
+                    self._state = "delimiter"
+            else:  # signature
+                if len(self._buffer) < SIGNATURE_LENGTH:
+                    break
+                if not self._buffer.startswith(IMAGE_SIGNATURES):
+                    raise AdmissionRejected(415, "tipo_invalido", "Arquivo não é uma imagem JPG ou PNG.")
+                self._state = "delimiter"
+        return self.files - started
+
+    def _count(self, size: int):
+        if self._in_file and size > 0:
+            self._file_bytes += size
+            if self._file_bytes > self.max_file_bytes:
+                raise AdmissionRejected(
+                    413, "too_large",
+                    f"Imagem muito grande. Máximo: {self.max_file_bytes // (1024 * 1024)}MB.",
+                )
+
+
+class _Client:
+    __slots__ = ("bucket", "in_flight")
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.in_flight = 0
+
+
+class ClientLimiter:
+    """
+    Token bucket e uploads em andamento por cliente, para uma mesa barulhenta
+    não esgotar a quota do modelo que é de todos. Guarda até `max_clients`
+    clientes (LRU); os ociosos mais antigos são esquecidos.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int, max_in_flight: int, max_clients: int = 10_000):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, _Client]" = OrderedDict()
+
+    def admit(self, key: str) -> _Client:
+        """Reserva um upload em andamento e um token (ou levanta AdmissionRejected)."""
+        client = self._client(key)
+        if client.in_flight >= self.max_in_flight:
+            raise AdmissionRejected(
+                429, "client_in_flight",
+                "Você já tem notas sendo processadas. Aguarde terminarem.", retry_after=1,
+            )
+        self.charge(client)
+        client.in_flight += 1
+        return client
+
+    def charge(self, client: _Client):
+        if not client.bucket.try_acquire():
+            raise AdmissionRejected(
+                429, "client_rate_limited",
+                "Muitas fotos em pouco tempo. Tente novamente em instantes.",
+                retry_after=client.bucket.wait_time(),
+            )
+
+    def release(self, client: _Client):
+        client.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "in_flight": sum(client.in_flight for client in self._clients.values()),
+        }
+
+    def _client(self, key: str) -> _Client:
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients[key] = _Client(TokenBucket(rate=self.rate, burst=self.burst))
+            excess = len(self._clients) - self.max_clients
+            if excess > 0:
+                for old_key in list(itertools.islice(self._clients, excess)):
+                    if self._clients[old_key].in_flight == 0:
+                        del self._clients[old_key]
+        else:
+            self._clients.move_to_end(key)
+        return client
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI aplicado aos POST de upload: caminho -> máximo de arquivos."""
+
+    def __init__(
+        self,
+        app,
+        upload_paths: Dict[str, int],
+        max_file_bytes: int,
+        limiter: Optional[ClientLimiter] = None,
+        trust_forwarded_for: bool = False,
+        key_by_device: bool = False,
+    ):
+        self.app = app
+        self.upload_paths = upload_paths
+        self.max_file_bytes = max_file_bytes
+        self.limiter = limiter
+        self.trust_forwarded_for = trust_forwarded_for
+        self.key_by_device = key_by_device
+
+    async def __call__(self, scope, receive, send):
+        max_files = self.upload_paths.get(scope.get("path")) if scope["type"] == "http" else None
+        if max_files is None or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        # Folga para os cabeçalhos das partes e campos do formulário
+        max_body_bytes = max_files * self.max_file_bytes + 64 * 1024
+
+        headers = dict(scope["headers"])
+        client = None
+        response_started = False
+        rejected: Optional[AdmissionRejected] = None
+        try:
+            content_length = headers.get(b"content-length")
+            if content_length is not None and content_length.isdigit() and int(content_length) > max_body_bytes:
+                raise AdmissionRejected(
+                    413, "too_large",
+                    f"Imagem muito grande. Máximo: {self.max_file_bytes // (1024 * 1024)}MB.",
+                )
+            if self.limiter is not None:
+                client = self.limiter.admit(self._client_key(scope, headers))
+
+            match = _BOUNDARY_RE.search(headers.get(b"content-type", b""))
+            sniffer = MultipartSniffer(match.group(1), self.max_file_bytes) if match else None
+            received = 0
+
+            async def admitted_receive():
+                nonlocal received, rejected
+                message = await receive()
+                if message["type"] != "http.request" or rejected is not None:
+                    return message
+                body = message.get("body", b"")
+                received += len(body)
+                try:
+                    if sniffer is not None and body:
+                        # O primeiro arquivo já foi pago na admissão
+                        already = sniffer.files
+                        for index in range(already, already + sniffer.feed(body)):
+                            if index >= max_files:
+                                raise AdmissionRejected(
+                                    400, "too_many_files", f"Envie no máximo {max_files} imagens por vez."
+                                )
+                            if index > 0 and client is not None:
+                                self.limiter.charge(client)
+                    if received > max_body_bytes:
+                        raise AdmissionRejected(413, "too_large", "Upload muito grande.")
+                except AdmissionRejected as e:
+                    rejected = e
+                    raise
+                return message
+
+            async def admitted_send(message):
+                nonlocal response_started
+                # A rota pode transformar a leitura abortada em erro próprio: vale o da admissão
+                if rejected is not None:
+                    return
+                response_started = True
+                await send(message)
+
+            await self.app(scope, admitted_receive, admitted_send)
+        except AdmissionRejected as e:
+            rejected = e
+        except Exception:
+            if rejected is None:
+                raise
+        finally:
+            if client is not None:
+                self.limiter.release(client)
+
+        if rejected is not None and not response_started:
+            await self._reject(send, rejected)
+
+    def _client_key(self, scope, headers: dict) -> str:
+        """
+        IP do cliente. Com `key_by_device`, IP + X-Device-Id: o id (que o
+        próprio cliente escolhe) só divide o balde de um IP, nunca troca de IP.
+        """
+        if self.trust_forwarded_for and b"x-forwarded-for" in headers:
+            key = "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        else:
+            key = "ip:" + (scope.get("client") or ("desconhecido",))[0]
+        if self.key_by_device:
+            device_id = headers.get(b"x-device-id", b"").decode("latin-1").strip()
+            if device_id and len(device_id) <= 64:
+                key += "|device:" + device_id
+        return key
+
+    async def _reject(self, send, rejected: AdmissionRejected):
+        ERRORS.inc(stage="admission", type=rejected.reason)
+        logger.info("upload_recusado", extra={"reason": rejected.reason, "status": rejected.status_code})
+        body = json.dumps({"detail": rejected.detail}, ensure_ascii=False).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            # O corpo não foi lido até o fim: a conexão não pode ser reaproveitada
+            (b"connection", b"close"),
+        ]
+        if rejected.retry_after is not None:
+            headers.append((b"retry-after", str(max(1, math.ceil(rejected.retry_after))).encode()))
+        await send({"type": "http.response.start", "status": rejected.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
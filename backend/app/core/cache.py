@@ -0,0 +1,138 @@
+from app.models.receipt import ReceiptData
+from collections import OrderedDict
+from typing import Optional
+import os
+import sqlite3
+import threading
+import time
+
+class ReceiptCache:
+    """
+    Cache de resultados de extração endereçado pelo hash do conteúdo da imagem.
+
+    Duas camadas:
+    - Memória: LRU com TTL, limitado por número de entradas e por bytes (JSON).
+    - Disco (opcional): SQLite, sobrevive a restarts do container.
+
+    Os objetos devolvidos são compartilhados entre requisições: não modifique.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: float = 3600,
+        db_path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # chave -> (expira_em, tamanho_em_bytes, ReceiptData)
+        self._entries: "OrderedDict[str, tuple[float, int, ReceiptData]]" = OrderedDict()
+        self._bytes = 0
+        # id da nota -> chave, para achar pelo id uma nota ainda na memória
+        self._keys_by_id: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS receipt_cache ("
+                " key TEXT PRIMARY KEY,"
+                " expires_at REAL NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[ReceiptData]:
+        """Busca na memória e, se não achar, no disco (promovendo para memória)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, receipt = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return receipt
+                self._remove(key)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT expires_at, payload FROM receipt_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    expires_at, payload = row
+                    if expires_at > now:
+                        receipt = ReceiptData.model_validate_json(payload)
+                        self._store(key, receipt, len(payload), expires_at)
+                        self.disk_hits += 1
+                        return receipt
+                    self._db.execute("DELETE FROM receipt_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def get_by_id(self, receipt_id: str) -> Optional[ReceiptData]:
+        """Nota pelo id, só na camada de memória (o disco é indexado pelo hash)."""
+        with self._lock:
+            key = self._keys_by_id.get(receipt_id)
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None or entry[0] <= time.time():
+                return None
+            return entry[2]
+
+    def set(self, key: str, receipt: ReceiptData) -> None:
+        payload = receipt.model_dump_json()
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, receipt, len(payload), expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO receipt_cache (key, expires_at, payload) VALUES (?, ?, ?)",
+                    (key, expires_at, payload),
+                )
+                self._db.execute("DELETE FROM receipt_cache WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _store(self, key: str, receipt: ReceiptData, size: int, expires_at: float) -> None:
+        """Insere na camada de memória e aplica a política LRU (chamar com lock)."""
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, size, receipt)
+        self._bytes += size
+        self._keys_by_id[receipt.id] = key
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, size, receipt = self._entries.pop(key)
+        self._bytes -= size
+        if self._keys_by_id.get(receipt.id) == key:
+            del self._keys_by_id[receipt.id]
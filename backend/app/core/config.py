@@ -1,10 +1,150 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "DivUp API"
     API_V1_PREFIX: str = "/api/v1"
     UPLOAD_DIR: str = "/app/uploads"
     ALLOWED_EXTENSIONS: str = ".jpg,.jpeg,.png"
+    MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 256 * 1024
+    # Gravar cada upload em UPLOAD_DIR (debug/auditoria). Desligado = sem disco no caminho quente
+    PERSIST_UPLOADS: bool = False
+    # Respostas JSON maiores que isso saem com gzip (se o cliente aceitar)
+    RESPONSE_GZIP_MIN_BYTES: int = 1024
+    RESPONSE_GZIP_LEVEL: int = 5
+    # Nível do log estruturado (DEBUG mostra cada item extraído)
+    LOG_LEVEL: str = "INFO"
+    
+    # Máximo de extrações simultâneas em andamento no modelo (por processo)
+    MAX_CONCURRENT_EXTRACTIONS: int = 8
+    
+    # Lote: máximo de imagens por requisição e quantas extrair em paralelo
+    BATCH_MAX_IMAGES: int = 8
+    BATCH_CONCURRENCY: int = 4
+    
+    # Admissão dos uploads, antes da rota: tamanho e assinatura JPEG/PNG conferidos
+    # enquanto o corpo chega, e limite por cliente (IP)
+    ADMISSION_ENABLED: bool = True
+    # Fotos por minuto por cliente; a rajada precisa comportar um lote inteiro
+    CLIENT_RATE_LIMIT_PER_MINUTE: int = 20
+    CLIENT_RATE_LIMIT_BURST: int = 10
+    CLIENT_MAX_IN_FLIGHT: int = 4
+    # Atrás de proxy reverso: cliente = primeiro IP de X-Forwarded-For
+    TRUST_FORWARDED_FOR: bool = False
+    # Cliente = IP + X-Device-Id: separa os celulares de uma mesa atrás do mesmo NAT.
+    # O id vem do cliente; trocá-lo dá baldes novos, mas só dentro do próprio IP
+    CLIENT_KEY_BY_DEVICE_ID: bool = False
+    
+    # Fila de jobs: workers que drenam a fila e profundidade máxima antes de 503
+    JOB_WORKERS: int = 8
+    JOB_QUEUE_MAX_DEPTH: int = 64
+    JOB_RESULT_TTL_SECONDS: int = 600
+    # Limite do long-poll em GET /receipt/jobs/{id}?wait=
+    JOB_MAX_WAIT_SECONDS: int = 30
+    
+    # Engines (nomes do registro em app.core.ocr.registry): modelo principal e camada OCR barata
+    EXTRACTOR_ENGINE: str = "gemini"
+    OCR_ENGINE: str = "vision"
+    
+    # Engines "record"/"replay": fixtures por hash da imagem e latência sintética (log-normal)
+    REPLAY_FIXTURE_DIR: str = "fixtures/replay"
+    REPLAY_LATENCY_MEDIAN_MS: float = 2500
+    REPLAY_LATENCY_SIGMA: float = 0.4
+    REPLAY_LATENCY_MAX_MS: float = 20000
+    # "error" = imagem sem fixture falha; "any" = responde com uma fixture qualquer
+    REPLAY_ON_MISS: str = "any"
+    
+    # Resiliência da chamada ao Gemini
+    GEMINI_RATE_LIMIT_RPM: int = 60
+    GEMINI_RATE_LIMIT_BURST: int = 10
+    GEMINI_MAX_RETRIES: int = 2
+    GEMINI_RETRY_BASE_DELAY_MS: int = 500
+    GEMINI_RETRY_MAX_DELAY_MS: int = 8000
+    GEMINI_CALL_TIMEOUT_MS: int = 30000
+    # Falhas seguidas para abrir o circuito e tempo até a chamada de teste
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_TIMEOUT_SECONDS: int = 30
+    # Itens como arrays posicionais [nome, qtd, unitário, total] na saída do modelo (menos tokens)
+    GEMINI_COMPACT_OUTPUT: bool = False
+    # Modelo e geração (0 / None = padrão do modelo)
+    GEMINI_MODEL: str = "gemini-2.5-flash"
+    GEMINI_MAX_OUTPUT_TOKENS: int = 0
+    GEMINI_TEMPERATURE: Optional[float] = None
+    # Cache de contexto das instruções no servidor, renovado antes de expirar (0 = desligado).
+    # O Gemini só cria caches acima de um mínimo de tokens do modelo; abaixo disso as chamadas seguem inline
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS: int = 0
+    
+    # Extração em camadas: OCR (Cloud Vision) + parser primeiro, Gemini só se reprovar
+    TIERED_EXTRACTION_ENABLED: bool = False
+    OCR_MIN_ITEMS: int = 2
+    # Diferença relativa aceita entre soma dos itens e total da nota
+    OCR_TOTAL_TOLERANCE: float = 0.02
+    # Taxa de serviço que pode estar somada ao total impresso
+    OCR_SERVICE_FEE_RATE: float = 0.10
+    # Parser por posição das palavras (caixas do Vision); False = só o texto corrido
+    OCR_LAYOUT_PARSER: bool = True
+    
+    # Hedging: sem resposta do Gemini em HEDGE_DELAY_MS (0 = desligado), dispara
+    # outra tentativa em paralelo ("gemini" ou "vision") e fica com a primeira válida
+    HEDGE_DELAY_MS: int = 0
+    HEDGE_STRATEGY: str = "gemini"
+    # Prazo total de uma extração, incluindo o hedge
+    EXTRACTION_DEADLINE_MS: int = 45000
+    
+    # Pré-processamento da imagem antes do modelo
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_DIMENSION: int = 1600
+    IMAGE_GRAYSCALE: bool = False
+    IMAGE_JPEG_QUALITY: int = 80
+    
+    # Checagem de qualidade da foto antes do modelo: recusa em poucos ms fotos
+    # pequenas, escuras, estouradas, tremidas ou sem texto (métricas em 800 px)
+    QUALITY_GATE_ENABLED: bool = True
+    QUALITY_MIN_SIDE_PX: int = 480
+    QUALITY_MIN_BRIGHTNESS: float = 40
+    # Fração de pixels estourados (>= 250) em blocos sem texto: reflexo/flash. Pixels
+    # estourados entre as letras (scan ou print de papel branco) não contam
+    QUALITY_MAX_CLIPPED_RATIO: float = 0.85
+    # Variância do Laplaciano
+    QUALITY_MIN_SHARPNESS: float = 100
+    # Fração de pixels de borda forte (letras)
+    QUALITY_MIN_TEXT_DENSITY: float = 0.01
+    
+    # Cache de resultados por hash do conteúdo da imagem
+    RECEIPT_CACHE_ENABLED: bool = True
+    RECEIPT_CACHE_TTL_SECONDS: int = 6 * 60 * 60
+    RECEIPT_CACHE_MAX_ENTRIES: int = 512
+    RECEIPT_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    # Camada em disco (SQLite dentro de UPLOAD_DIR), sobrevive a restarts
+    RECEIPT_CACHE_DISK_ENABLED: bool = False
+    
+    # Notas processadas (SQLite em UPLOAD_DIR), consultáveis em GET /receipt/{id}
+    RECEIPT_STORE_ENABLED: bool = True
+    RECEIPT_STORE_TTL_SECONDS: int = 7 * 24 * 60 * 60
+    # Gravação em lote fora da requisição: a cada intervalo ou ao juntar BATCH_SIZE notas
+    RECEIPT_STORE_FLUSH_INTERVAL_MS: int = 200
+    RECEIPT_STORE_BATCH_SIZE: int = 100
+    RECEIPT_STORE_COMPACT_INTERVAL_SECONDS: int = 60 * 60
+    
+    # Quase-duplicatas: a mesma foto reenviada (hash perceptual a até MAX_DISTANCE bits
+    # de 64 e máscara de tinta a até MAX_CONTENT_DISTANCE) reaproveita uma cópia da
+    # extração feita dentro da janela. Desligado: notas do mesmo restaurante que diferem
+    # em uma ou duas linhas passam nas duas checagens e receberiam os itens da outra mesa
+    NEAR_DUPLICATE_ENABLED: bool = False
+    NEAR_DUPLICATE_MAX_DISTANCE: int = 4
+    NEAR_DUPLICATE_MAX_CONTENT_DISTANCE: float = 0.2
+    NEAR_DUPLICATE_WINDOW_SECONDS: int = 15 * 60
+    NEAR_DUPLICATE_MAX_ENTRIES: int = 100_000
+    
+    # Sessões de divisão compartilhadas (WebSocket), em memória
+    SPLIT_MAX_SESSIONS: int = 1000
+    SPLIT_MAX_PARTICIPANTS: int = 32
+    SPLIT_SESSION_IDLE_SECONDS: int = 60 * 60
+    # Mensagens na fila de uma conexão antes de desconectá-la por lentidão
+    SPLIT_MAX_PENDING_MESSAGES: int = 64
+    # Deltas guardados para reconexão sem snapshot (?since=versão)
+    SPLIT_DELTA_HISTORY: int = 256
     
     # Google Cloud Vision
     # Caminho para o arquivo JSON de credenciais (dentro do container ou local)
@@ -0,0 +1,49 @@
+"""
+Logging estruturado (chave=valor) configurado pelo LOG_LEVEL.
+
+Uso: logger.info("gemini_extraiu", extra={"items": 12}) vira
+`... level=INFO logger=app.core.ocr.gemini_vision event=gemini_extraiu items=12`.
+"""
+import logging
+import sys
+
+# Atributos que todo LogRecord já tem; o resto veio de `extra` e vira campo
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def _format_field(value) -> str:
+    text = str(value)
+    if not text or any(ch in text for ch in ' ="\n'):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+    return text
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Uma linha por evento: timestamp, nível, logger, evento e os campos extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                fields[key] = value
+        line = self.formatTime(record) + " " + " ".join(
+            f"{key}={_format_field(value)}" for key, value in fields.items()
+        )
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level: str = "INFO"):
+    """Liga o formatter chave=valor no logger `app` com o nível pedido."""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(KeyValueFormatter())
+
+    logger = logging.getLogger("app")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
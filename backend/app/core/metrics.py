@@ -0,0 +1,226 @@
+"""
+Métricas no formato texto do Prometheus, sem dependências externas.
+
+Counter, Gauge e Histogram com labels, registrados num REGISTRY global e
+expostos em GET /metrics. Todas as operações são thread-safe (o
+pré-processamento roda em threads).
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, Sequence, Tuple
+import threading
+import time
+
+# Buckets em segundos: de poucos ms (parse, serialização) a dezenas de s (modelo)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield from self._render_sample(key, value)
+
+    def _render_sample(self, key, value) -> Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track(self, **labels):
+        """Incrementa enquanto o bloco executa (ex: requisições em andamento)."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [contagem por bucket (não cumulativa)..., soma]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0
+
+    @contextmanager
+    def time(self, **labels):
+        """Observa a duração do bloco em segundos."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, state) -> Iterator[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, state):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = _format_labels(self.labelnames, key)
+        yield f"{self.name}_sum{labels} {_format_value(state[-1])}"
+        yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Latência por etapa do pipeline
+UPLOAD_READ_SECONDS = REGISTRY.register(Histogram(
+    "divup_upload_read_seconds", "Tempo lendo o upload do cliente"))
+PREPROCESS_SECONDS = REGISTRY.register(Histogram(
+    "divup_preprocess_seconds", "Tempo de pré-processamento da imagem"))
+MODEL_CALL_SECONDS = REGISTRY.register(Histogram(
+    "divup_model_call_seconds", "Tempo da chamada ao extrator", ["engine"]))
+QUALITY_CHECK_SECONDS = REGISTRY.register(Histogram(
+    "divup_quality_check_seconds", "Tempo da checagem de qualidade da foto"))
+JSON_PARSE_SECONDS = REGISTRY.register(Histogram(
+    "divup_json_parse_seconds", "Tempo validando o JSON devolvido pelo modelo"))
+SERIALIZATION_SECONDS = REGISTRY.register(Histogram(
+    "divup_serialization_seconds", "Tempo serializando a resposta HTTP", ["endpoint"]))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "divup_http_request_duration_seconds", "Duração das requisições HTTP", ["method", "route", "status"]))
+
+# Estado atual
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "divup_http_requests_in_flight", "Requisições HTTP em andamento"))
+EXTRACTIONS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "divup_extractions_in_flight", "Chamadas a extratores em andamento", ["engine"]))
+
+# Contadores
+ITEMS_EXTRACTED = REGISTRY.register(Counter(
+    "divup_items_extracted_total", "Itens extraídos das notas", ["engine"]))
+ERRORS = REGISTRY.register(Counter(
+    "divup_errors_total", "Erros por etapa e tipo de exceção", ["stage", "type"]))
+MODEL_BYTES_SENT = REGISTRY.register(Counter(
+    "divup_model_bytes_sent_total", "Bytes de imagem enviados aos extratores", ["engine"]))
+QUALITY_CHECKS = REGISTRY.register(Counter(
+    "divup_quality_checks_total", "Fotos aceitas/recusadas antes do modelo", ["result", "reason"]))
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: requisições em andamento e duração por rota (template, não URL)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        with HTTP_REQUESTS_IN_FLIGHT.track():
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start,
+                    method=scope["method"],
+                    route=getattr(route, "path", "desconhecida"),
+                    status=status["code"],
+                )
@@ -0,0 +1,242 @@
+from collections import OrderedDict
+from functools import lru_cache
+from math import comb
+from PIL import Image, ImageFilter, ImageOps, UnidentifiedImageError
+from typing import Dict, List, Optional, Set, Tuple
+import io
+import itertools
+import time
+
+HASH_BITS = 64
+# Lado da imagem reduzida que passa pela DCT; os 8x8 coeficientes de menor
+# frequência (menos o DC) viram os 64 bits
+_DCT_SIZE = 32
+_DCT_BLOCK = 8
+# Resolução usada para achar o papel na foto
+_CROP_SIZE = 256
+# Grade (largura x altura) da máscara de tinta que confirma o conteúdo
+_CONTENT_GRID = (32, 64)
+
+
+@lru_cache(maxsize=1)
+def _dct_matrix():
+    import numpy as np
+
+    k = np.arange(_DCT_SIZE)[:, None]
+    x = np.arange(_DCT_SIZE)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * _DCT_SIZE))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def _paper(image_data: bytes) -> Image.Image:
+    """Foto em tons de cinza, reduzida e recortada no papel (região clara)."""
+    # numpy só é importado no primeiro hash (fora do cold start)
+    import numpy as np
+
+    try:
+        img = Image.open(io.BytesIO(image_data))
+        # JPEG: decodifica já reduzido (1/2 a 1/8), o que domina o custo
+        img.draft("L", (_CROP_SIZE, _CROP_SIZE))
+        img = ImageOps.exif_transpose(img).convert("L")
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Imagem inválida ou corrompida: {e}")
+    img.thumbnail((_CROP_SIZE, _CROP_SIZE))
+
+    pixels = np.asarray(img, dtype=np.float32)
+    paper = pixels > (pixels.mean() + pixels.max()) / 2 * 0.9
+    rows = np.flatnonzero(paper.mean(axis=1) > 0.3)
+    cols = np.flatnonzero(paper.mean(axis=0) > 0.3)
+    if len(rows) > 1 and len(cols) > 1:
+        img = img.crop((cols[0], rows[0], cols[-1] + 1, rows[-1] + 1))
+    return img
+
+
+def _phash(img: Image.Image) -> int:
+    import numpy as np
+
+    small = np.asarray(img.resize((_DCT_SIZE, _DCT_SIZE), Image.BILINEAR), dtype=np.float32)
+    dct = _dct_matrix()
+    coefficients = (dct @ small @ dct.T)[:_DCT_BLOCK, :_DCT_BLOCK].flatten()[1:]
+    # 63 coeficientes AC; o 64º bit fica 0
+    bits = coefficients > np.median(coefficients)
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value << 1
+
+
+def _ink_mask(img: Image.Image) -> bytes:
+    """Pixels mais escuros que a vizinhança (texto) numa grade fixa do papel, empacotados."""
+    import numpy as np
+
+    small = img.resize(_CONTENT_GRID, Image.BOX)
+    local = np.asarray(small.filter(ImageFilter.BoxBlur(3)), dtype=np.float32)
+    ink = np.asarray(small, dtype=np.float32) < local - 4
+    return np.packbits(ink).tobytes()
+
+
+def perceptual_hash(image_data: bytes) -> int:
+    """
+    Hash perceptual (pHash) de 64 bits da foto da nota.
+
+    Antes da DCT a imagem é recortada no papel (região clara), para que o
+    fundo da mesa e o enquadramento pesem pouco. Fotos reenviadas
+    (redimensionadas/recomprimidas) ficam a 0-4 bits. Notas diferentes do
+    mesmo modelo de impressão também podem ficar a poucos bits: o hash
+    sozinho não basta para dizer que é a mesma nota (ver image_fingerprint).
+    """
+    return _phash(_paper(image_data))
+
+
+def image_fingerprint(image_data: bytes) -> Tuple[int, bytes]:
+    """
+    (pHash, máscara de tinta) com um decode só. A máscara marca onde há
+    texto no papel: notas do mesmo modelo com itens diferentes têm o texto
+    em outros lugares, o que o pHash (baixas frequências) não vê.
+    """
+    img = _paper(image_data)
+    return _phash(img), _ink_mask(img)
+
+
+def content_distance(a: bytes, b: bytes) -> float:
+    """Distância de Jaccard entre duas máscaras de tinta (0 = mesmo texto, 1 = nada em comum)."""
+    union = differ = 0
+    for x, y in zip(a, b):
+        union += (x | y).bit_count()
+        differ += (x ^ y).bit_count()
+    return differ / union if union else 0.0
+
+
+def _flip_masks(bits: int, radius: int) -> List[int]:
+    """Máscaras XOR de todas as variações de um pedaço com até `radius` bits trocados."""
+    masks = []
+    for flipped in range(radius + 1):
+        for positions in itertools.combinations(range(bits), flipped):
+            masks.append(sum(1 << position for position in positions))
+    return masks
+
+
+def _plan_chunks(max_distance: int, max_entries: int) -> int:
+    """
+    Número de pedaços que minimiza o custo estimado de uma consulta: variações
+    testadas por pedaço + candidatos esperados (hashes uniformes, índice cheio).
+    Pedaços grandes têm poucos candidatos mas muitas variações, e vice-versa.
+    """
+    def cost(chunks: int) -> float:
+        bits = HASH_BITS // chunks
+        probes = sum(comb(bits, k) for k in range(max_distance // chunks + 1))
+        return chunks * probes * (1 + max_entries / 2 ** bits)
+
+    return min(range(1, max_distance + 2), key=cost)
+
+
+class NearDuplicateIndex:
+    """
+    Índice de hashes perceptuais recentes, consultado por distância de Hamming.
+
+    Multi-index hashing: os 64 bits são divididos em m pedaços e cada pedaço
+    indexa as entradas num dicionário. Se dois hashes estão a até
+    `max_distance` bits, algum pedaço difere em no máximo `max_distance // m`
+    bits (casa dos pombos); a consulta procura cada pedaço com essa
+    vizinhança e só os candidatos achados têm a distância calculada.
+
+    Com `max_content_distance`, cada candidato ainda precisa ter a máscara
+    de tinta (image_fingerprint) a no máximo essa distância da consultada.
+
+    Entradas saem após `window_seconds` ou quando o índice passa de
+    `max_entries` (as mais antigas primeiro).
+    """
+
+    def __init__(self, max_distance: int = 4, window_seconds: float = 900, max_entries: int = 100_000,
+                 max_content_distance: Optional[float] = None):
+        self.max_distance = max_distance
+        self.max_content_distance = max_content_distance
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+
+        chunks = _plan_chunks(max_distance, max_entries)
+        self._radius = max_distance // chunks
+        bounds = [round(i * HASH_BITS / chunks) for i in range(chunks + 1)]
+        # (deslocamento, máscara, variações a testar) de cada pedaço
+        self._chunks = [
+            (start, (1 << (end - start)) - 1, _flip_masks(end - start, self._radius))
+            for start, end in zip(bounds, bounds[1:])
+        ]
+        self._buckets: List[Dict[int, Set[int]]] = [{} for _ in self._chunks]
+        # id -> (hash, chave, máscara de tinta, inserido_em), em ordem de inserção
+        self._entries: "OrderedDict[int, tuple[int, str, Optional[bytes], float]]" = OrderedDict()
+        self._ids = itertools.count()
+
+        self.lookups = 0
+        self.matches = 0
+        # Candidatos pelo hash recusados pela máscara de tinta
+        self.content_rejections = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, phash: int, key: str, content: Optional[bytes] = None) -> None:
+        self._evict()
+        entry_id = next(self._ids)
+        self._entries[entry_id] = (phash, key, content, time.monotonic())
+        for bucket, (shift, mask, _) in zip(self._buckets, self._chunks):
+            bucket.setdefault((phash >> shift) & mask, set()).add(entry_id)
+        if len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def query(self, phash: int, content: Optional[bytes] = None) -> List[tuple[str, int]]:
+        """(chave, distância) das entradas dentro da janela, da mais próxima para a mais longe."""
+        self._evict()
+        self.lookups += 1
+        candidates: Set[int] = set()
+        for bucket, (shift, mask, flips) in zip(self._buckets, self._chunks):
+            chunk = (phash >> shift) & mask
+            for flip in flips:
+                members = bucket.get(chunk ^ flip)
+                if members:
+                    candidates.update(members)
+
+        found: Dict[str, int] = {}
+        for entry_id in candidates:
+            other, key, other_content, _ = self._entries[entry_id]
+            distance = (phash ^ other).bit_count()
+            if distance > self.max_distance or distance >= found.get(key, HASH_BITS + 1):
+                continue
+            if self.max_content_distance is not None and (
+                content is None or other_content is None
+                or content_distance(content, other_content) > self.max_content_distance
+            ):
+                self.content_rejections += 1
+                continue
+            found[key] = distance
+        if found:
+            self.matches += 1
+        return sorted(found.items(), key=lambda match: match[1])
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "lookups": self.lookups,
+            "matches": self.matches,
+            "content_rejections": self.content_rejections,
+            "max_distance": self.max_distance,
+            "max_content_distance": self.max_content_distance,
+        }
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self._entries:
+            entry_id, (_, _, _, inserted_at) = next(iter(self._entries.items()))
+            if inserted_at > cutoff:
+                break
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: int):
+        phash, _, _, _ = self._entries.pop(entry_id)
+        for bucket, (shift, mask, _) in zip(self._buckets, self._chunks):
+            chunk = (phash >> shift) & mask
+            members = bucket[chunk]
+            members.discard(entry_id)
+            if not members:
+                del bucket[chunk]
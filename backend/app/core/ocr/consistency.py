@@ -0,0 +1,37 @@
+from app.core.ocr.parser import ReceiptParser
+from app.models.receipt import ReceiptData
+from typing import Optional
+import math
+
+def check_consistency(
+    receipt: ReceiptData,
+    min_items: int = 2,
+    total_tolerance: float = 0.02,
+    service_fee_rate: float = 0.10,
+) -> Optional[str]:
+    """
+    Verifica se o resultado do OCR + parser é confiável o bastante para
+    dispensar o Gemini. Retorna None se passar, ou o motivo da reprovação.
+
+    - pelo menos `min_items` itens;
+    - preços/quantidades numéricos, finitos e positivos;
+    - soma dos itens bate com o total impresso na nota (tolerância relativa),
+      aceitando também a taxa de serviço (ex: 10%) sobre a soma.
+    """
+    if len(receipt.items) < min_items:
+        return "poucos_itens"
+
+    for item in receipt.items:
+        prices = (item.unit_price, item.total_price)
+        if not all(math.isfinite(p) and p > 0 for p in prices) or item.quantity <= 0:
+            return "preco_invalido"
+
+    # Sem linha de TOTAL na nota o parser devolve a própria soma: nada a conferir
+    if not ReceiptParser._TOTAL_RE.search(receipt.raw_text):
+        return "total_nao_encontrado"
+
+    items_sum = sum(item.total_price for item in receipt.items)
+    for expected in (items_sum, items_sum * (1 + service_fee_rate)):
+        if abs(receipt.total - expected) <= total_tolerance * max(expected, 0.01):
+            return None
+    return "total_divergente"
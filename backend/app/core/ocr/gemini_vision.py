@@ -1,128 +1,374 @@
-from google import genai
-from google.genai import types
-import json
-from app.models.receipt import ReceiptData, ReceiptItem
+from pydantic import BaseModel, ValidationError, field_validator
+from typing import Any, AsyncIterator, List, Optional, Union
+from app.core.metrics import ERRORS, JSON_PARSE_SECONDS
+from app.core.ocr.image_source import ImageSource, read_image_bytes
+from app.core.ocr.stream_parser import IncrementalItemParser
+from app.models.receipt import ReceiptData, ReceiptItem, TokenUsage
+import asyncio
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Ordem dos campos de cada item no formato compacto (array posicional)
+ITEM_FIELDS = ("name", "quantity", "unit_price", "total_price")
+
+# Instruções fixas da extração (o formato vem do schema)
+EXTRACTION_PROMPT = """
+Analise esta nota fiscal e extraia os itens, o nome do estabelecimento, a data,
+o subtotal e o total.
+
+IMPORTANTE:
+- Junte nomes fragmentados em múltiplas linhas (ex: "CLASSIC" + "BURGUER" = "CLASSIC BURGUER")
+- Ignore linhas de cabeçalho, rodapé, totais gerais
+- Retorne APENAS itens de consumo
+- quantity é número inteiro; preços são números decimais
+"""
+COMPACT_PROMPT_SUFFIX = "- Cada item é um array [name, quantity, unit_price, total_price]\n"
+
+_ITEM_PROPERTIES = {
+    "name": {"type": "string", "description": "Nome completo do item (junte linhas fragmentadas)"},
+    "quantity": {"type": "integer", "description": "Quantidade"},
+    "unit_price": {"type": "number", "description": "Preço unitário"},
+    "total_price": {"type": "number", "description": "Preço total do item"},
+}
+
+
+def _response_schema(compact: bool) -> dict:
+    """JSON Schema da saída estruturada pedida ao Gemini."""
+    if compact:
+        item_schema = {
+            "type": "array",
+            "description": "[name, quantity, unit_price, total_price]",
+            "prefixItems": [_ITEM_PROPERTIES[field] for field in ITEM_FIELDS],
+            "minItems": len(ITEM_FIELDS),
+            "maxItems": len(ITEM_FIELDS),
+        }
+    else:
+        item_schema = {
+            "type": "object",
+            "properties": _ITEM_PROPERTIES,
+            "required": list(ITEM_FIELDS),
+        }
+    return {
+        "type": "object",
+        "properties": {
+            "establishment_name": {"type": "string", "description": "Nome do restaurante/mercado (topo da nota)"},
+            "date": {"type": "string", "description": "Data da compra no formato DD/MM/AAAA"},
+            "items": {"type": "array", "items": item_schema},
+            "subtotal": {"type": "number"},
+            "total": {"type": "number"},
+        },
+        "required": ["items", "subtotal", "total"],
+    }
+
+
+def item_from_wire(item_data: Any) -> Any:
+    """Converte um item no formato compacto (array) para dict; objetos passam direto."""
+    if isinstance(item_data, list):
+        return dict(zip(ITEM_FIELDS, item_data))
+    return item_data
+
+
+class GeminiReceipt(BaseModel):
+    """Saída estruturada do Gemini; os itens validam direto em ReceiptItem."""
+    establishment_name: Optional[str] = None
+    date: Optional[str] = None
+    items: List[ReceiptItem] = []
+    subtotal: Optional[float] = None
+    total: Optional[float] = None
+
+    @field_validator("items", mode="before")
+    @classmethod
+    def _expand_compact_items(cls, value):
+        if isinstance(value, list):
+            return [item_from_wire(item) for item in value]
+        return value
+
+
+class ContextCache:
+    """
+    Cache de contexto do Gemini com as instruções fixas da extração.
+
+    Criado na primeira chamada e reutilizado pelo nome (cached_content): as
+    instruções deixam de ir inteiras em cada requisição. Passado
+    `refresh_ratio` do TTL, a próxima chamada renova a validade. Se o
+    servidor recusar a criação (ex: conteúdo abaixo do mínimo de tokens do
+    modelo), as chamadas seguem com as instruções inline e a criação só é
+    tentada de novo depois de um TTL.
+    """
+
+    def __init__(self, client, types, model: str, contents: list, base_config: dict,
+                 ttl_seconds: int, refresh_ratio: float = 0.8):
+        self._client = client
+        self._types = types
+        self.model = model
+        self._contents = contents
+        self._base_config = base_config
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ratio = refresh_ratio
+        self.name: Optional[str] = None
+        self._config = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+
+        self.created = 0
+        self.refreshed = 0
+        self.failures = 0
+
+    def current(self):
+        """Config que aponta para o cache, se ele ainda vale (None = instruções inline)."""
+        if self.name is not None and time.monotonic() < self._expires_at:
+            return self._config
+        return None
+
+    async def config(self):
+        """Como `current`, criando ou renovando o cache quando for a hora."""
+        now = time.monotonic()
+        if self.name is not None and now < self._refresh_at:
+            return self._config
+        if self.name is None and now < self._retry_at:
+            return None
+        # Renovação em andamento: quem chega usa o cache atual sem esperar
+        if self._lock.locked() and self.current() is not None:
+            return self._config
+        async with self._lock:
+            now = time.monotonic()
+            if (self.name is None and now >= self._retry_at) or (self.name is not None and now >= self._refresh_at):
+                await self._renew(now)
+        return self.current()
+
+    async def _renew(self, now: float):
+        ttl = f"{self.ttl_seconds}s"
+        try:
+            if self.name is not None and now < self._expires_at:
+                await self._client.aio.caches.update(
+                    name=self.name, config=self._types.UpdateCachedContentConfig(ttl=ttl)
+                )
+                self.refreshed += 1
+            else:
+                cache = await self._client.aio.caches.create(
+                    model=self.model,
+                    config=self._types.CreateCachedContentConfig(
+                        contents=self._contents, ttl=ttl, display_name="divup-extracao"
+                    ),
+                )
+                self.name = cache.name
+                self._config = self._types.GenerateContentConfig(cached_content=cache.name, **self._base_config)
+                self.created += 1
+        except Exception as e:
+            self.failures += 1
+            ERRORS.inc(stage="context_cache", type=type(e).__name__)
+            logger.warning("cache_contexto_falhou", extra={"error": str(e), "renovacao": self.name is not None})
+            if self.name is not None and now < self._expires_at:
+                # O cache atual ainda vale: tenta renovar de novo no meio do que resta
+                self._refresh_at = now + (self._expires_at - now) / 2
+            else:
+                self.name = self._config = None
+                self._retry_at = now + self.ttl_seconds
+            return
+        self._expires_at = now + self.ttl_seconds
+        self._refresh_at = now + self.ttl_seconds * self.refresh_ratio
+        logger.info("cache_contexto_pronto", extra={"cache": self.name, "ttl_s": self.ttl_seconds})
+
+    def stats(self) -> dict:
+        return {
+            "active": self.current() is not None,
+            "ttl_seconds": self.ttl_seconds,
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+        }
+
 
 class GeminiVisionExtractor:
     """Extrator de notas fiscais usando Gemini Vision API (nova SDK)."""
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        compact: bool = False,
+        model: str = "gemini-2.5-flash",
+        max_output_tokens: int = 0,
+        temperature: Optional[float] = None,
+        context_cache_ttl_seconds: int = 0,
+    ):
         # Configurar API key do Gemini
         api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY ou GEMINI_API_KEY não configurado")
-        
+
+        # SDK importada só aqui: google.genai leva ~0.5s para carregar
+        from google import genai
+        from google.genai import types
+
+        self.types = types
         self.client = genai.Client(api_key=api_key)
-    
-    def extract(self, image_path: str) -> ReceiptData:
+        self.model = model
+        # Saída com schema: sem cercas de Markdown nem JSON fora do formato
+        self.compact = compact
+        base_config = {
+            "response_mime_type": "application/json",
+            "response_json_schema": _response_schema(compact),
+            # 0 / None = padrão do modelo
+            "max_output_tokens": max_output_tokens or None,
+            "temperature": temperature,
+        }
+        self.config = types.GenerateContentConfig(**base_config)
+
+        # Prompt montado uma vez por extrator; cada chamada só acrescenta a imagem
+        prompt = EXTRACTION_PROMPT + (COMPACT_PROMPT_SUFFIX if compact else "")
+        self._prompt_part = types.Part(text=prompt)
+        self.context_cache = None
+        if context_cache_ttl_seconds > 0:
+            self.context_cache = ContextCache(
+                self.client, types, model,
+                contents=[types.Content(role="user", parts=[self._prompt_part])],
+                base_config=base_config,
+                ttl_seconds=context_cache_ttl_seconds,
+            )
+
+    def extract(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
         """
         Extrai dados estruturados de uma nota fiscal usando Gemini Vision.
-        
+
         Args:
-            image_path: Caminho para a imagem da nota fiscal
-            
+            image: Conteúdo da imagem (bytes, buffer ou arquivo aberto)
+            mime_type: Tipo real da imagem enviada ao modelo
+
         Returns:
             ReceiptData com itens extraídos
         """
-        # Ler imagem
-        with open(image_path, 'rb') as f:
-            image_data = f.read()
-        
-        # Criar prompt estruturado
-        prompt = """
-Analise esta nota fiscal e extraia os itens, o nome do estabelecimento e a data.
-
-Para cada item, retorne:
-- name: Nome completo do item (junte linhas fragmentadas)
-- quantity: Quantidade (número inteiro)
-- unit_price: Preço unitário (número decimal)
-- total_price: Preço total (número decimal)
-
-Também extraia:
-- establishment_name: Nome do restaurante/mercado (topo da nota)
-- date: Data da compra (formato DD/MM/AAAA)
+        image_data = read_image_bytes(image)
 
-IMPORTANTE:
-- Junte nomes fragmentados em múltiplas linhas (ex: "CLASSIC" + "BURGUER" = "CLASSIC BURGUER")
-- Ignore linhas de cabeçalho, rodapé, totais gerais
-- Retorne APENAS itens de consumo
-- Use números decimais com ponto (ex: 31.00, não 31,00)
-
-Retorne APENAS um JSON válido no formato:
-{
-  "establishment_name": "Nome do Local",
-  "date": "23/12/2025",
-  "items": [
-    {
-      "name": "NOME DO ITEM",
-      "quantity": 1,
-      "unit_price": 10.50,
-      "total_price": 10.50
-    }
-  ],
-  "subtotal": 100.00,
-  "total": 110.00
-}
-"""
-        
-        # Fazer chamada ao Gemini com a nova API (modelo estável com quota maior)
+        # Caminho síncrono: usa o cache de contexto se já existir, mas não o cria
+        cached = self.context_cache.current() if self.context_cache is not None else None
         response = self.client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=[
-                prompt,
-                types.Part(
-                    inline_data=types.Blob(
-                        mime_type="image/jpeg",
-                        data=image_data
-                    )
-                )
-            ]
+            model=self.model,
+            contents=self._build_contents(image_data, mime_type, cached=cached is not None),
+            config=cached or self.config
         )
-        
-        # Extrair JSON da resposta
-        response_text = response.text.strip()
-        
-        # Remover markdown code blocks se existirem
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-        
-        response_text = response_text.strip()
-        
-        # Parse JSON
-        try:
-            data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"❌ Erro ao fazer parse do JSON retornado pelo Gemini:")
-            print(response_text)
-            raise ValueError(f"Gemini retornou JSON inválido: {e}")
-        
-        # Converter para ReceiptData
+
+        return self._parse_response(response.text, self._usage(response))
+
+    async def extract_async(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
+        """
+        Versão assíncrona de `extract`, usando o cliente `aio` da SDK.
+
+        Recebe a imagem já pré-processada (bytes + MIME real) e não bloqueia o
+        event loop durante a chamada ao modelo.
+        """
+        cached = await self.context_cache.config() if self.context_cache is not None else None
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=self._build_contents(read_image_bytes(image), mime_type, cached=cached is not None),
+            config=cached or self.config
+        )
+
+        return self._parse_response(response.text, self._usage(response))
+
+    async def extract_stream(
+        self,
+        image: ImageSource,
+        mime_type: str = "image/jpeg"
+    ) -> AsyncIterator[Union[ReceiptItem, ReceiptData]]:
+        """
+        Extração com streaming: gera cada ReceiptItem assim que o modelo termina
+        de escrevê-lo e, por último, o ReceiptData completo (totais, local, data)
+        contendo os mesmos itens já enviados.
+        """
+        cached = await self.context_cache.config() if self.context_cache is not None else None
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=self._build_contents(read_image_bytes(image), mime_type, cached=cached is not None),
+            config=cached or self.config
+        )
+
+        parser = IncrementalItemParser()
         items = []
-        for item_data in data.get("items", []):
-            item = ReceiptItem(
-                name=item_data["name"],
-                quantity=int(item_data["quantity"]),
-                unit_price=float(item_data["unit_price"]),
-                total_price=float(item_data["total_price"])
+        usage = None
+        async for chunk in stream:
+            # A contagem de tokens vem (acumulada) nos últimos pedaços
+            usage = self._usage(chunk) or usage
+            if not chunk.text:
+                continue
+            for item_data in parser.feed(chunk.text):
+                try:
+                    item = ReceiptItem.model_validate(item_from_wire(item_data))
+                except (TypeError, ValueError):
+                    continue
+                items.append(item)
+                yield item
+
+        receipt = self._parse_response(parser.text, usage)
+        if len(items) == len(receipt.items):
+            # Mantém os ids dos itens já enviados no frame final
+            receipt.items = items
+        yield receipt
+
+    def _build_contents(self, image_data: bytes, mime_type: str = "image/jpeg", cached: bool = False) -> list:
+        """Prompt + imagem para a chamada ao Gemini; com o cache de contexto, só a imagem."""
+        image_part = self.types.Part(
+            inline_data=self.types.Blob(
+                mime_type=mime_type,
+                data=image_data
             )
-            items.append(item)
-        
-        est_name = data.get("establishment_name", "Estabelecimento Desconhecido")
-        date_str = data.get("date", "")
+        )
+        if cached:
+            return [image_part]
+        return [self._prompt_part, image_part]
+
+    def cache_stats(self) -> Optional[dict]:
+        return self.context_cache.stats() if self.context_cache is not None else None
+
+    @staticmethod
+    def _usage(response) -> Optional[TokenUsage]:
+        """Tokens de entrada/saída informados pela API (None se ausentes)."""
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is None or metadata.candidates_token_count is None:
+            return None
+        return TokenUsage(
+            input_tokens=metadata.prompt_token_count or 0,
+            output_tokens=metadata.candidates_token_count or 0,
+            thinking_tokens=metadata.thoughts_token_count or 0,
+            cached_input_tokens=metadata.cached_content_token_count or 0,
+        )
+
+    def _parse_response(self, response_text: str, usage: Optional[TokenUsage] = None) -> ReceiptData:
+        """Valida o JSON do Gemini direto em ReceiptData (uma passada, sem json.loads)."""
+        try:
+            with JSON_PARSE_SECONDS.time():
+                data = GeminiReceipt.model_validate_json(response_text)
+        except ValidationError as e:
+            ERRORS.inc(stage="json_parse", type="ValidationError")
+            logger.warning("gemini_json_invalido", extra={"error_count": e.error_count()})
+            logger.debug("gemini_resposta_bruta", extra={"response": response_text})
+            raise ValueError(f"Gemini retornou JSON inválido: {e}")
+
+        items = data.items
+        est_name = data.establishment_name or "Estabelecimento Desconhecido"
+        date_str = data.date or ""
+
+        logger.info("gemini_extraiu", extra={
+            "items": len(items),
+            "establishment": est_name,
+            "date": date_str,
+            "input_tokens": usage.input_tokens if usage else None,
+            "cached_input_tokens": usage.cached_input_tokens if usage else None,
+            "output_tokens": usage.output_tokens if usage else None,
+        })
 
-        print(f"✅ Gemini extraiu {len(items)} itens da nota de '{est_name}' ({date_str}).")
-        
+        items_total = sum(i.total_price for i in items)
         return ReceiptData(
             raw_text=response_text,
             items=items,
-            subtotal=data.get("subtotal", sum(i.total_price for i in items)),
-            total=data.get("total", sum(i.total_price for i in items)),
+            subtotal=data.subtotal if data.subtotal is not None else items_total,
+            total=data.total if data.total is not None else items_total,
             confidence_score=0.98,
             establishment_name=est_name,
-            date=date_str
+            date=date_str,
+            engine="gemini",
+            usage=usage
         )
@@ -1,27 +1,35 @@
-from google.cloud import vision
+from app.core.ocr.image_source import ImageSource, read_image_bytes
 from app.models.receipt import ReceiptItem, ReceiptData
 from typing import List
-import io
+import asyncio
 import re
 import os
 
 class GoogleVisionExtractor:
     """Extrai texto e estrutura usando Google Cloud Vision API."""
     
-    def __init__(self):
+    def __init__(self, layout: bool = True):
+        # Usa as caixas das palavras (LayoutParser) e só cai no texto corrido se não achar itens
+        self.layout = layout
         # Tenta carregar explicitamente do caminho definido nas configs
         creds_path = "/app/credentials.json"
         
         if os.path.exists(creds_path):
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = creds_path
-            
+        
+        # SDK importada só quando a camada OCR é ligada (fora do caminho padrão)
+        from google.cloud import vision
+        
+        self.vision = vision
         self.client = vision.ImageAnnotatorClient()
 
-    def extract(self, image_path: str) -> ReceiptData:
-        with io.open(image_path, 'rb') as image_file:
-            content = image_file.read()
+    async def extract_async(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
+        """Versão assíncrona: o cliente do Vision é síncrono, então roda numa thread."""
+        return await asyncio.to_thread(self.extract, image, mime_type)
 
-        image = vision.Image(content=content)
+    def extract(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
+        # O Vision detecta o formato sozinho; mime_type existe só para manter a mesma interface
+        image = self.vision.Image(content=read_image_bytes(image))
         
         # Usar TEXT_DETECTION (mais rápido/barato) ou DOCUMENT_TEXT_DETECTION (melhor para layouts densos)
         response = self.client.text_detection(image=image)
@@ -32,19 +40,26 @@ class GoogleVisionExtractor:
         texts = response.text_annotations
         if not texts:
             return ReceiptData(
-                raw_text="", items=[], subtotal=0.0, total=0.0, confidence_score=0.0
+                raw_text="", items=[], subtotal=0.0, total=0.0, confidence_score=0.0,
+                engine="vision"
             )
 
-        # O primeiro elemento contém todo o texto
+        # O primeiro elemento contém todo o texto; os demais são as palavras com suas caixas
         raw_text = texts[0].description
-        
-        # Aqui poderíamos usar a posição das palavras (bounding boxes) para ser mais precisos,
-        # mas por enquanto vamos reutilizar nossa lógica de Regex no texto bruto,
-        # que o Google Vision extrai com muito mais qualidade que o Tesseract.
-        
-        # Parse usando a mesma lógica (ou adaptada)
-        from app.core.ocr.parser import ReceiptParser
-        parser = ReceiptParser()
-        
-        # O parser espera string, o Google já devolve string limpa
-        return parser.parse(raw_text)
+
+        receipt = None
+        if self.layout:
+            from app.core.ocr.layout import LayoutParser, Word
+            words = [
+                Word.from_polygon(text.description, [(v.x, v.y) for v in text.bounding_poly.vertices])
+                for text in texts[1:]
+                if len(text.bounding_poly.vertices) == 4
+            ]
+            receipt = LayoutParser().parse(words, raw_text=raw_text)
+
+        if receipt is None or not receipt.items:
+            # Sem colunas reconhecíveis: regex + lookahead no texto corrido
+            from app.core.ocr.parser import ReceiptParser
+            receipt = ReceiptParser().parse(raw_text)
+        receipt.engine = "vision"
+        return receipt
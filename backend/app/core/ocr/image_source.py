@@ -0,0 +1,20 @@
+from typing import BinaryIO, Union
+
+# Formas aceitas pelos extratores e pelo serviço: bytes em memória, buffers
+# (bytearray/memoryview) ou um objeto tipo arquivo já aberto.
+ImageSource = Union[bytes, bytearray, memoryview, BinaryIO]
+
+def read_image_bytes(source: ImageSource) -> bytes:
+    """
+    Normaliza a origem da imagem para `bytes`.
+
+    `bytes` passa direto, sem cópia. Buffers são copiados uma única vez;
+    objetos tipo arquivo são lidos da posição atual até o fim.
+    """
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        return source.read()
+    raise TypeError(f"Origem de imagem não suportada: {type(source).__name__}")
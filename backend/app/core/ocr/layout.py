@@ -0,0 +1,254 @@
+from app.core.ocr.parser import ReceiptParser
+from app.models.receipt import ReceiptItem, ReceiptData
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+import operator
+import re
+import statistics
+
+logger = logging.getLogger(__name__)
+
+# Tipos de palavra
+_TEXT, _PRICE, _INT, _TIMES, _FILLER = 0, 1, 2, 3, 4
+
+_PRICE_RE = re.compile(r'^(?:R\$)?(\d{1,3}(?:\.\d{3})+,\d{2}|\d+[,\.]\d{2})$')
+_INT_RE = re.compile(r'^\d{1,4}$')
+_TIMES_WORDS = frozenset(('x', 'X', '*'))
+_FILLER_WORDS = frozenset(('R$', '=', '-'))
+# Unidade entre a quantidade e o "X" no formato da NFC-e ("2 UN X 12,90")
+_UNIT_WORDS = frozenset(('UN', 'UND', 'KG', 'PC', 'LT', 'CX'))
+
+_by_left = operator.attrgetter('left')
+
+
+@dataclass
+class Word:
+    """Palavra do OCR com a caixa reduzida ao que o layout usa."""
+    text: str
+    left: float
+    right: float
+    # Centro vertical e altura da caixa
+    y: float
+    height: float
+    # Inclinação da linha de base (dy/dx): foto tirada torta
+    slope: float = 0.0
+
+    @classmethod
+    def from_polygon(cls, text: str, points: Sequence[Tuple[float, float]]) -> "Word":
+        """Vértices no sentido horário a partir do canto superior esquerdo do texto (como o Vision devolve)."""
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = points
+        xs = (x0, x1, x2, x3)
+        return cls(
+            text=text,
+            left=min(xs),
+            right=max(xs),
+            y=(y0 + y1 + y2 + y3) / 4,
+            height=max(((x3 - x0) ** 2 + (y3 - y0) ** 2) ** 0.5, 1.0),
+            slope=(y1 - y0) / (x1 - x0) if x1 != x0 else 0.0,
+        )
+
+
+class LayoutParser:
+    """
+    Parser de notas pela posição das palavras (caixas do OCR), sem lookahead.
+
+    1. Endireita a foto pela inclinação mediana das palavras e ordena pelo
+       centro vertical; uma varredura junta em linhas as palavras cujo centro
+       fica a menos de `row_tolerance` alturas do centro da linha corrente.
+    2. Histograma das bordas direitas dos preços (valores alinhados à
+       direita): faixas vizinhas com contagem viram colunas; a mais à direita
+       com pelo menos `min_column_share` da maior é a coluna do total do item.
+    3. Cada linha: nome à esquerda, região numérica à direita. O total do item
+       é o preço na coluna do total; o unitário, o preço logo antes; a
+       quantidade, o inteiro antes dos preços (ou ao lado do "X").
+       Linha só com preços fecha o nome da linha anterior (nome longo ou NFC-e).
+
+    Tudo numa passada O(n log n) (as ordenações) sobre as palavras.
+    """
+
+    def __init__(self, row_tolerance: float = 0.5, min_column_share: float = 0.25):
+        self.row_tolerance = row_tolerance
+        self.min_column_share = min_column_share
+        # Palavras-chave, unidades soltas e conversão de preço são as do parser de texto
+        self._text_parser = ReceiptParser()
+
+    def parse(self, words: List[Word], raw_text: Optional[str] = None) -> ReceiptData:
+        """Parse das palavras da nota; sem `raw_text`, o texto é remontado a partir das linhas."""
+        rows, bin_width = self._rows(words)
+        if raw_text is None:
+            raw_text = "\n".join(" ".join(word.text for word in row) for row in rows)
+        if not rows:
+            return ReceiptData(raw_text=raw_text, items=[], subtotal=0.0, total=0.0, confidence_score=0.0)
+
+        # Nomes e preços se repetem muito na nota: cada texto é classificado uma vez
+        classified: Dict[str, tuple] = {}
+        kinds = [
+            [classified.get(word.text) or classified.setdefault(word.text, self._classify(word.text)) for word in row]
+            for row in rows
+        ]
+        total_bins = self._total_column(rows, kinds, bin_width)
+
+        items: List[ReceiptItem] = []
+        pending: Optional[str] = None
+        total = None
+        fallback_total = None
+
+        for row, row_kinds in zip(rows, kinds):
+            name, region = self._split_row(row, row_kinds)
+            prices = [(row[i], row_kinds[i][1]) for i in region if row_kinds[i][0] == _PRICE]
+            lowered = name.lower()
+
+            if name and self._text_parser._SKIP_RE.search(lowered):
+                # Rodapé: "TOTAL A PAGAR R$ 356,07" (e não o "SUBTOTAL")
+                if prices and 'total' in lowered and 'subtotal' not in lowered:
+                    if total is None and lowered.startswith('total'):
+                        total = prices[-1][1]
+                    elif fallback_total is None:
+                        fallback_total = prices[-1][1]
+                pending = None
+                continue
+
+            item_total = prices[-1][1] if prices and int(prices[-1][0].right // bin_width) in total_bins else None
+            if item_total is None:
+                # Descrições ("300ML HH") não substituem o nome que espera os valores
+                if name and not self._is_description(name):
+                    pending = name
+                continue
+
+            if not name:
+                if pending is None:
+                    continue
+                name = pending
+            pending = None
+            quantity, unit_price = self._quantity_and_unit(row, row_kinds, region, item_total)
+            items.append(ReceiptItem(name=name, quantity=quantity, unit_price=unit_price, total_price=item_total))
+
+        if total is None:
+            total = fallback_total if fallback_total is not None else sum(item.total_price for item in items)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("layout_extraiu", extra={"rows": len(rows), "items": len(items)})
+
+        return ReceiptData(
+            raw_text=raw_text,
+            items=items,
+            subtotal=sum(item.total_price for item in items),
+            total=total,
+            confidence_score=0.95 if items else 0.0,
+        )
+
+    def _rows(self, words: List[Word]) -> Tuple[List[List[Word]], float]:
+        """
+        Agrupa as palavras em linhas (varredura sobre o centro vertical
+        endireitado); devolve também a altura mediana das palavras.
+        """
+        words = [word for word in words if word.text.strip()]
+        if not words:
+            return [], 1.0
+        slope = statistics.median(word.slope for word in words)
+        height = statistics.median(word.height for word in words)
+        tolerance = self.row_tolerance * height
+        ordered = sorted(
+            ((word.y - slope * (word.left + word.right) / 2, word) for word in words),
+            key=lambda pair: pair[0],
+        )
+
+        rows: List[List[Word]] = []
+        current: List[Word] = []
+        center_sum = 0.0
+        for y, word in ordered:
+            if current and y - center_sum / len(current) > tolerance:
+                current.sort(key=_by_left)
+                rows.append(current)
+                current, center_sum = [], 0.0
+            current.append(word)
+            center_sum += y
+        current.sort(key=_by_left)
+        rows.append(current)
+        return rows, height
+
+    def _total_column(self, rows: List[List[Word]], kinds: List[List[tuple]], bin_width: float) -> set:
+        """Faixas (índices do histograma) da coluna mais à direita com preços suficientes."""
+        histogram: Dict[int, int] = {}
+        for row, row_kinds in zip(rows, kinds):
+            for word, kind in zip(row, row_kinds):
+                if kind[0] == _PRICE:
+                    index = int(word.right // bin_width)
+                    histogram[index] = histogram.get(index, 0) + 1
+        if not histogram:
+            return set()
+
+        # Faixas vizinhas com contagem formam uma coluna
+        columns: List[List[int]] = []
+        for index in sorted(histogram):
+            if columns and index - columns[-1][-1] <= 1:
+                columns[-1].append(index)
+            else:
+                columns.append([index])
+        counts = [sum(histogram[index] for index in column) for column in columns]
+        threshold = self.min_column_share * max(counts)
+        for column, count in zip(reversed(columns), reversed(counts)):
+            if count >= threshold:
+                return set(column)
+        return set()
+
+    def _classify(self, text: str) -> tuple:
+        match = _PRICE_RE.match(text)
+        if match:
+            return (_PRICE, self._text_parser._parse_price(match.group(1)))
+        if _INT_RE.match(text):
+            return (_INT, int(text))
+        if text in _TIMES_WORDS:
+            return (_TIMES,)
+        if text in _FILLER_WORDS:
+            return (_FILLER,)
+        return (_TEXT,)
+
+    def _split_row(self, row: List[Word], row_kinds: List[tuple]) -> Tuple[str, range]:
+        """(nome, índices da região numérica no fim da linha)."""
+        start = len(row)
+        while start > 0:
+            kind = row_kinds[start - 1][0]
+            if kind != _TEXT:
+                start -= 1
+            elif row[start - 1].text.upper() in _UNIT_WORDS and start >= 2 and row_kinds[start - 2][0] == _INT:
+                start -= 1
+            else:
+                break
+        # Inteiros antes da primeira palavra de texto são códigos do item ("001 0103 COMBINADO")
+        first = 0
+        while first < start and row_kinds[first][0] != _TEXT:
+            first += 1
+        return " ".join(word.text for word in row[first:start]), range(start, len(row))
+
+    def _quantity_and_unit(self, row: List[Word], row_kinds: List[tuple], region: range,
+                           total: float) -> Tuple[int, float]:
+        quantity = None
+        unit_price = None
+        positions = [i for i in region if row_kinds[i][0] != _FILLER and row[i].text.upper() not in _UNIT_WORDS]
+        # O último preço da região é o total; antes dele vêm quantidade e unitário
+        last_price = max(i for i in region if row_kinds[i][0] == _PRICE)
+        for before, i, after in zip([None] + positions, positions, positions[1:] + [None]):
+            kind = row_kinds[i][0]
+            if kind == _TIMES:
+                # "2 UN X 12,90" ou "R$ 94,90 X 3"
+                for a, b in ((before, after), (after, before)):
+                    if a is not None and b is not None and row_kinds[a][0] == _INT and row_kinds[b][0] == _PRICE:
+                        quantity, unit_price = row_kinds[a][1], row_kinds[b][1]
+                        break
+            elif kind == _PRICE and i != last_price and unit_price is None:
+                unit_price = row_kinds[i][1]
+            elif kind == _INT and quantity is None and i < last_price:
+                quantity = row_kinds[i][1]
+
+        if quantity is None or quantity <= 0:
+            quantity = max(1, round(total / unit_price)) if unit_price else 1
+        if unit_price is None:
+            unit_price = round(total / quantity, 2)
+        return quantity, unit_price
+
+    def _is_description(self, name: str) -> bool:
+        """Linhas de unidade/descrição ("300ML HH", "Duo Espetos") não são nome de item."""
+        parser = self._text_parser
+        return len(name) < 4 or bool(parser._UNIT_ONLY_RE.match(name) or parser._UNIT_COMBO_RE.match(name))
@@ -0,0 +1,62 @@
+from app.models.receipt import ReceiptData, ReceiptItem, TokenUsage
+from typing import List
+
+def _item_key(item: ReceiptItem) -> tuple:
+    """Chave de comparação tolerante a espaços/caixa e arredondamento."""
+    return (" ".join(item.name.upper().split()), item.quantity, round(item.total_price, 2))
+
+def _overlap(tail: List[tuple], head: List[tuple]) -> int:
+    """Maior k tal que os últimos k de `tail` são iguais aos primeiros k de `head`."""
+    for k in range(min(len(tail), len(head)), 0, -1):
+        if tail[-k:] == head[:k]:
+            return k
+    return 0
+
+def merge_receipts(receipts: List[ReceiptData]) -> ReceiptData:
+    """
+    Junta várias fotos (na ordem enviada) em uma única nota.
+
+    Fotos consecutivas de uma nota longa costumam se sobrepor: os últimos
+    itens de uma aparecem no topo da seguinte. Essa sobreposição é removida.
+
+    Total: se a maior nota individual já cobre a soma dos itens, é a mesma
+    nota fotografada em partes (o total geral está na última foto); caso
+    contrário são contas diferentes e os totais são somados.
+
+    Motor: o das fotos, se todas vieram do mesmo; senão "mixed". Tokens: a
+    soma do gasto em cada foto.
+    """
+    if len(receipts) == 1:
+        return receipts[0]
+
+    items: List[ReceiptItem] = []
+    keys: List[tuple] = []
+    for receipt in receipts:
+        page_keys = [_item_key(item) for item in receipt.items]
+        skip = _overlap(keys, page_keys)
+        items.extend(receipt.items[skip:])
+        keys.extend(page_keys[skip:])
+
+    subtotal = round(sum(item.total_price for item in items), 2)
+    totals = [r.total for r in receipts]
+    total = max(totals) if max(totals) >= subtotal - 0.01 else round(sum(totals), 2)
+
+    engines = {r.engine for r in receipts}
+    usages = [r.usage for r in receipts if r.usage is not None]
+    usage = None
+    if usages:
+        usage = TokenUsage(**{
+            field: sum(getattr(u, field) for u in usages) for field in TokenUsage.model_fields
+        })
+
+    return ReceiptData(
+        raw_text="\n".join(r.raw_text for r in receipts),
+        items=items,
+        subtotal=subtotal,
+        total=total,
+        confidence_score=min(r.confidence_score for r in receipts),
+        establishment_name=next((r.establishment_name for r in receipts if r.establishment_name), None),
+        date=next((r.date for r in receipts if r.date), None),
+        engine=engines.pop() if len(engines) == 1 else "mixed",
+        usage=usage,
+    )
@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+from PIL import Image, UnidentifiedImageError
+from typing import Optional
+import io
+
+# Lado maior da imagem em que as métricas são calculadas: os limiares de
+# nitidez e densidade de texto valem para qualquer resolução de entrada
+WORKING_SIZE = 800
+# Lado (px, na resolução de trabalho) dos blocos em que o estouro é avaliado:
+# bloco estourado só conta como reflexo se não tiver bordas (letras apagadas)
+GLARE_TILE = 32
+# Fração de pixels de borda abaixo da qual um bloco não tem textura
+GLARE_TILE_MAX_EDGES = 0.005
+
+# Motivo da recusa -> mensagem para o usuário (o que fazer na próxima foto)
+REJECTION_MESSAGES = {
+    "resolucao_baixa": "Foto com resolução muito baixa. Aproxime o celular da nota e tire outra.",
+    "escura": "Foto muito escura. Procure um lugar mais iluminado ou ligue o flash.",
+    "estourada": "Foto clara demais (reflexo ou flash). Incline a nota ou desligue o flash.",
+    "borrada": "Foto tremida ou fora de foco. Segure o celular firme e toque na nota para focar.",
+    "sem_texto": "Não encontramos texto na foto. Enquadre a nota inteira, de perto.",
+}
+
+
+class ImageQualityError(ValueError):
+    """Foto recusada antes do modelo; a mensagem diz ao usuário como refazer."""
+
+    def __init__(self, reason: str):
+        super().__init__(REJECTION_MESSAGES[reason])
+        self.reason = reason
+
+
+@dataclass
+class QualityReport:
+    """Métricas da foto (na resolução de trabalho) e o motivo da recusa, se houver."""
+    width: int
+    height: int
+    brightness: float
+    clipped_ratio: float
+    # Pixels estourados em blocos sem textura (reflexo/flash, não papel branco com texto)
+    glare_ratio: float
+    sharpness: float
+    text_density: float
+    rejection: Optional[str] = None
+
+
+class ImageQualityGate:
+    """
+    Checagem local e barata da foto, antes de qualquer chamada ao modelo.
+
+    - resolução: menor lado da imagem recebida;
+    - exposição: brilho médio (escura) e fração de pixels estourados em
+      blocos sem bordas (reflexo que apagou as letras; papel branco de um
+      scan limpo estoura, mas tem texto);
+    - nitidez: variância do Laplaciano (foco/tremida);
+    - densidade de texto: fração de pixels de borda forte (letras).
+
+    Roda em poucos ms sobre a imagem já pré-processada (decode reduzido,
+    tons de cinza, numpy).
+    """
+
+    def __init__(
+        self,
+        min_side: int = 480,
+        min_brightness: float = 40,
+        max_clipped_ratio: float = 0.85,
+        min_sharpness: float = 100,
+        min_text_density: float = 0.01,
+    ):
+        self.min_side = min_side
+        self.min_brightness = min_brightness
+        self.max_clipped_ratio = max_clipped_ratio
+        self.min_sharpness = min_sharpness
+        self.min_text_density = min_text_density
+
+    def measure(self, image_data: bytes) -> QualityReport:
+        # numpy só é importado na primeira checagem (fora do cold start)
+        import numpy as np
+
+        try:
+            img = Image.open(io.BytesIO(image_data))
+            width, height = img.size
+            # O draft só reduz se os dois lados continuarem >= à caixa pedida:
+            # a caixa segue a proporção da foto
+            scale = min(1.0, WORKING_SIZE / max(width, height))
+            img.draft("L", (round(width * scale), round(height * scale)))
+            img = img.convert("L")
+        except (UnidentifiedImageError, OSError) as e:
+            raise ValueError(f"Imagem inválida ou corrompida: {e}")
+        if max(img.size) > WORKING_SIZE:
+            img.thumbnail((WORKING_SIZE, WORKING_SIZE))
+
+        pixels = np.asarray(img, dtype=np.float32)
+        laplacian = (
+            pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:]
+            - 4 * pixels[1:-1, 1:-1]
+        )
+        edges = np.abs(laplacian) > 40
+        clipped = pixels >= 250
+        return QualityReport(
+            width=width,
+            height=height,
+            brightness=float(pixels.mean()),
+            clipped_ratio=float(clipped.mean()),
+            glare_ratio=self._glare_ratio(clipped[1:-1, 1:-1], edges),
+            sharpness=float(laplacian.var()),
+            text_density=float(edges.mean()),
+        )
+
+    @staticmethod
+    def _glare_ratio(clipped, edges) -> float:
+        """Fração dos pixels que estão estourados dentro de blocos GLARE_TILE sem textura."""
+        height, width = clipped.shape
+        tile = min(GLARE_TILE, height, width)
+        if tile == 0:
+            return 0.0
+        rows, cols = height // tile, width // tile
+        shape = (rows, tile, cols, tile)
+        crop = (slice(0, rows * tile), slice(0, cols * tile))
+        flat = edges[crop].reshape(shape).mean(axis=(1, 3)) < GLARE_TILE_MAX_EDGES
+        glare = clipped[crop].reshape(shape).sum(axis=(1, 3))[flat].sum()
+        return float(glare / clipped.size)
+
+    def check(self, image_data: bytes) -> QualityReport:
+        """Mede a foto e preenche `rejection` com o primeiro motivo de recusa (ou None)."""
+        report = self.measure(image_data)
+        if min(report.width, report.height) < self.min_side:
+            report.rejection = "resolucao_baixa"
+        elif report.brightness < self.min_brightness:
+            report.rejection = "escura"
+        elif report.glare_ratio > self.max_clipped_ratio:
+            report.rejection = "estourada"
+        elif report.sharpness < self.min_sharpness:
+            report.rejection = "borrada"
+        elif report.text_density < self.min_text_density:
+            report.rejection = "sem_texto"
+        return report
@@ -0,0 +1,76 @@
+"""
+Registro de extratores por nome.
+
+Cada engine é registrada com uma fábrica; o módulo do extrator (e a SDK que
+ele carrega) só é importado quando a engine é criada de fato. As engines
+usadas por camada vêm da configuração (EXTRACTOR_ENGINE / OCR_ENGINE).
+"""
+from app.core.config import settings
+from typing import Callable, Dict, List
+
+
+class UnknownExtractorError(ValueError):
+    """Nome de engine sem fábrica registrada."""
+
+
+class ExtractorRegistry:
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], object]] = {}
+
+    def register(self, name: str, factory: Callable[[], object]):
+        """Registra (ou substitui) a fábrica da engine `name`."""
+        self._factories[name] = factory
+
+    def create(self, name: str):
+        """Constrói o extrator da engine `name` (importando o módulo dele agora)."""
+        factory = self._factories.get(name)
+        if factory is None:
+            raise UnknownExtractorError(
+                f"Extrator desconhecido: '{name}'. Disponíveis: {', '.join(self.available())}"
+            )
+        return factory()
+
+    def available(self) -> List[str]:
+        return sorted(self._factories)
+
+
+def _gemini():
+    from app.core.ocr.gemini_vision import GeminiVisionExtractor
+    return GeminiVisionExtractor(
+        compact=settings.GEMINI_COMPACT_OUTPUT,
+        model=settings.GEMINI_MODEL,
+        max_output_tokens=settings.GEMINI_MAX_OUTPUT_TOKENS,
+        temperature=settings.GEMINI_TEMPERATURE,
+        context_cache_ttl_seconds=settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS,
+    )
+
+
+def _vision():
+    from app.core.ocr.google_vision import GoogleVisionExtractor
+    return GoogleVisionExtractor(layout=settings.OCR_LAYOUT_PARSER)
+
+
+def _replay():
+    from app.core.ocr.replay import LatencyModel, ReplayExtractor
+    return ReplayExtractor(
+        settings.REPLAY_FIXTURE_DIR,
+        latency=LatencyModel(
+            median_ms=settings.REPLAY_LATENCY_MEDIAN_MS,
+            sigma=settings.REPLAY_LATENCY_SIGMA,
+            max_ms=settings.REPLAY_LATENCY_MAX_MS,
+        ),
+        on_miss=settings.REPLAY_ON_MISS,
+    )
+
+
+def _record():
+    from app.core.ocr.replay import RecordingExtractor
+    return RecordingExtractor(_gemini(), settings.REPLAY_FIXTURE_DIR)
+
+
+extractors = ExtractorRegistry()
+extractors.register("gemini", _gemini)
+extractors.register("vision", _vision)
+# Testes de carga offline: "record" grava respostas reais do Gemini, "replay" as reproduz
+extractors.register("replay", _replay)
+extractors.register("record", _record)
@@ -0,0 +1,166 @@
+"""
+Extratores de gravação e reprodução, para testes de carga sem gastar quota.
+
+- RecordingExtractor envolve um extrator real e grava cada resposta em
+  `<fixture_dir>/<sha256 da imagem>.json`.
+- ReplayExtractor devolve essas respostas pelo hash da imagem recebida,
+  esperando uma latência sintética (log-normal) no lugar da chamada ao modelo.
+
+O hash é do conteúdo que chega ao extrator, ou seja, da imagem já
+pré-processada; grave e reproduza com as mesmas configurações IMAGE_*.
+"""
+from app.core.ocr.image_source import ImageSource, read_image_bytes
+from app.models.receipt import ReceiptData, ReceiptItem
+from typing import AsyncIterator, Optional, Union
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import random
+
+logger = logging.getLogger(__name__)
+
+# Ids são gerados de novo a cada reprodução, como numa extração real
+_EXCLUDE_IDS = {"id": True, "items": {"__all__": {"id"}}}
+
+
+class LatencyModel:
+    """
+    Latência sintética log-normal: mediana `median_ms` e dispersão `sigma`
+    (0 = fixa). Valores são limitados a `max_ms` para não sortear caudas absurdas.
+    """
+
+    def __init__(self, median_ms: float = 0, sigma: float = 0, max_ms: Optional[float] = None,
+                 rng: Optional[random.Random] = None):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.max_ms = max_ms
+        self._rng = rng or random.Random()
+
+    def sample(self) -> float:
+        """Latência sorteada, em segundos."""
+        if self.median_ms <= 0:
+            return 0.0
+        ms = self._rng.lognormvariate(math.log(self.median_ms), self.sigma) if self.sigma > 0 else self.median_ms
+        if self.max_ms is not None:
+            ms = min(ms, self.max_ms)
+        return ms / 1000
+
+
+class FixtureMissError(LookupError):
+    """Nenhuma resposta gravada para a imagem recebida."""
+
+
+def _fixture_path(fixture_dir: str, image_data: bytes) -> str:
+    return os.path.join(fixture_dir, hashlib.sha256(image_data).hexdigest() + ".json")
+
+
+class ReplayExtractor:
+    """
+    Substituto do GeminiVisionExtractor que responde com fixtures gravadas.
+
+    Com `on_miss="any"`, imagens sem fixture recebem uma das gravadas
+    (sorteada): útil para carga com imagens aleatórias. Com "error", levanta
+    FixtureMissError.
+    """
+
+    def __init__(self, fixture_dir: str, latency: Optional[LatencyModel] = None, on_miss: str = "error",
+                 sleep=asyncio.sleep, rng: Optional[random.Random] = None):
+        if on_miss not in ("error", "any"):
+            raise ValueError(f"on_miss inválido: {on_miss!r} (use 'error' ou 'any')")
+        self.fixture_dir = fixture_dir
+        self.latency = latency or LatencyModel()
+        self.on_miss = on_miss
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+        # Fixtures são pequenas: tudo em memória, sem disco no caminho da carga
+        self._fixtures: dict[str, str] = {}
+        if os.path.isdir(fixture_dir):
+            for name in sorted(os.listdir(fixture_dir)):
+                if name.endswith(".json"):
+                    with open(os.path.join(fixture_dir, name), encoding="utf-8") as f:
+                        self._fixtures[name[:-len(".json")]] = f.read()
+        if not self._fixtures and on_miss == "any":
+            raise ValueError(f"Nenhuma fixture em {fixture_dir}; grave antes com EXTRACTOR_ENGINE=record")
+        self._keys = list(self._fixtures)
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, image_data: bytes) -> ReceiptData:
+        key = hashlib.sha256(image_data).hexdigest()
+        raw = self._fixtures.get(key)
+        if raw is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if self.on_miss == "error":
+                raise FixtureMissError(f"Sem fixture para a imagem {key[:12]}")
+            raw = self._fixtures[self._rng.choice(self._keys)]
+        return ReceiptData.model_validate_json(raw)
+
+    def extract(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
+        return self._lookup(read_image_bytes(image))
+
+    async def extract_async(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
+        receipt = self._lookup(read_image_bytes(image))
+        await self._sleep(self.latency.sample())
+        return receipt
+
+    async def extract_stream(
+        self,
+        image: ImageSource,
+        mime_type: str = "image/jpeg"
+    ) -> AsyncIterator[Union[ReceiptItem, ReceiptData]]:
+        """Itens espalhados pela latência sorteada e, por último, o ReceiptData."""
+        receipt = self._lookup(read_image_bytes(image))
+        delay = self.latency.sample() / (len(receipt.items) + 1)
+        for item in receipt.items:
+            await self._sleep(delay)
+            yield item
+        await self._sleep(delay)
+        yield receipt
+
+    def stats(self) -> dict:
+        return {"fixtures": len(self._fixtures), "hits": self.hits, "misses": self.misses}
+
+
+class RecordingExtractor:
+    """Repassa para o extrator real e grava cada resposta como fixture."""
+
+    def __init__(self, extractor, fixture_dir: str):
+        self.extractor = extractor
+        self.fixture_dir = fixture_dir
+        os.makedirs(fixture_dir, exist_ok=True)
+        self.recorded = 0
+
+    def __getattr__(self, name):
+        return getattr(self.extractor, name)
+
+    def _record(self, image_data: bytes, receipt: ReceiptData):
+        path = _fixture_path(self.fixture_dir, image_data)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(receipt.model_dump_json(exclude=_EXCLUDE_IDS, indent=2))
+        os.replace(tmp_path, path)
+        self.recorded += 1
+        logger.info("fixture_gravada", extra={"path": path, "items": len(receipt.items)})
+
+    def extract(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
+        image_data = read_image_bytes(image)
+        receipt = self.extractor.extract(image_data, mime_type)
+        self._record(image_data, receipt)
+        return receipt
+
+    async def extract_async(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
+        image_data = read_image_bytes(image)
+        receipt = await self.extractor.extract_async(image_data, mime_type)
+        await asyncio.to_thread(self._record, image_data, receipt)
+        return receipt
+
+    async def extract_stream(self, image: ImageSource, mime_type: str = "image/jpeg"):
+        image_data = read_image_bytes(image)
+        async for result in self.extractor.extract_stream(image_data, mime_type):
+            if isinstance(result, ReceiptData):
+                await asyncio.to_thread(self._record, image_data, result)
+            yield result
@@ -0,0 +1,67 @@
+from typing import List, Optional, Union
+import json
+
+class IncrementalItemParser:
+    """
+    Extrai os itens do JSON da nota à medida que o texto chega em pedaços.
+
+    Varre cada caractere uma única vez, acompanhando strings/escapes e a
+    profundidade de chaves, e devolve cada item de `"items": [...]` assim que
+    ele fecha, sem esperar o documento inteiro. Itens podem ser objetos ou
+    arrays posicionais (formato compacto).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # Última string vista no nível raiz do objeto (candidata a chave)
+        self._last_key: Optional[str] = None
+        self._in_items = False
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Union[dict, list]]:
+        """Adiciona um pedaço de texto e retorna os itens completados por ele."""
+        self.text += chunk
+        text = self.text
+        completed = []
+
+        for i in range(self._pos, len(text)):
+            c = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start + 1:i]
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == "{" or c == "[":
+                self._depth += 1
+                if c == "[" and self._depth == 2 and self._last_key == "items":
+                    self._in_items = True
+                elif self._depth == 3 and self._in_items:
+                    self._item_start = i
+            elif c == "}" or c == "]":
+                if self._depth == 3 and self._item_start is not None:
+                    try:
+                        completed.append(json.loads(text[self._item_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass  # item malformado: fica de fora do stream, o parse final decide
+                    self._item_start = None
+                elif c == "]" and self._depth == 2 and self._in_items:
+                    self._in_items = False
+                self._depth -= 1
+
+        self._pos = len(text)
+        return completed
@@ -0,0 +1,345 @@
+from app.core.ocr.image_source import ImageSource
+from app.models.receipt import ReceiptData, ReceiptItem
+from typing import AsyncIterator, Callable, Optional, Union
+import asyncio
+import random
+import time
+
+try:
+    # Cliente HTTP da SDK do Gemini (google-genai): falhas de rede não herdam de ConnectionError
+    import httpx
+    _TRANSPORT_ERRORS = (TimeoutError, ConnectionError, httpx.TransportError)
+except ImportError:  # opcional: sem o pacote, só os erros da biblioteca padrão
+    _TRANSPORT_ERRORS = (TimeoutError, ConnectionError)
+
+# Códigos HTTP que indicam problema passageiro no provedor (quota, sobrecarga)
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+_UNAVAILABLE = "Serviço de extração temporariamente indisponível. Tente novamente em instantes."
+
+class RateLimitedError(Exception):
+    """Sem token disponível no limitador dentro do tempo de espera permitido."""
+
+class CircuitOpenError(Exception):
+    """Circuito aberto: o upstream está falhando e a chamada nem é tentada."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Erros de quota/5xx/timeout/rede valem nova tentativa; JSON inválido etc. não.
+    Rede inclui httpx.TransportError (conexão recusada/resetada, timeouts do httpx).
+    """
+    if isinstance(exc, _TRANSPORT_ERRORS):
+        return True
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS
+
+
+class TokenBucket:
+    """
+    Limitador token bucket: `rate` tokens por segundo, acumulando até `burst`.
+    Dimensionado pela quota da API do modelo (ex: 60 RPM -> rate=1.0).
+    """
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Segundos até o próximo token ficar disponível."""
+        self._refill()
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    async def acquire(self, max_wait: float, sleep=asyncio.sleep):
+        """Aguarda um token por até `max_wait` segundos; senão levanta RateLimitedError."""
+        waited = 0.0
+        while not self.try_acquire():
+            delay = self.wait_time()
+            if waited + delay > max_wait:
+                raise RateLimitedError("Limite de requisições ao modelo atingido")
+            await sleep(delay)
+            waited += delay
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+class CircuitBreaker:
+    """
+    Disjuntor clássico: após `failure_threshold` falhas seguidas abre e
+    rejeita chamadas por `reset_timeout` segundos; depois deixa passar uma
+    chamada de teste (half-open) que fecha ou reabre o circuito.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release(self):
+        """Libera a vaga de teste do half-open sem registrar resultado (ex: cancelamento)."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self._opened_at = self.clock()
+            self._probe_in_flight = False
+            self.times_opened += 1
+
+
+class ResilientExtractor:
+    """
+    Envolve um extrator (ex: GeminiVisionExtractor) com:
+    - token bucket para não estourar a quota;
+    - timeout por chamada;
+    - retries limitados com backoff exponencial e jitter total para erros transitórios;
+    - circuit breaker que falha rápido (ou usa `fallback`) enquanto o upstream está fora.
+
+    `fallback_check` devolve o motivo para recusar a resposta do fallback
+    (None = aceita); recusada, vale o erro original.
+
+    `extract_stream` passa pelas mesmas proteções; demais atributos (ex:
+    `cache_stats`) são repassados ao extrator original.
+    `sleep` e `rng` são injetáveis para testes com cliente falso.
+    """
+
+    def __init__(
+        self,
+        extractor,
+        limiter: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_retries: int = 2,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        call_timeout: float = 30.0,
+        fallback=None,
+        fallback_check: Optional[Callable[[ReceiptData], Optional[str]]] = None,
+        sleep=asyncio.sleep,
+        rng: Optional[random.Random] = None,
+    ):
+        self.extractor = extractor
+        self.limiter = limiter
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.call_timeout = call_timeout
+        self.fallback = fallback
+        self.fallback_check = fallback_check
+        self._sleep = sleep
+        self._rng = rng or random.Random()
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.short_circuited = 0
+        self.rate_limited = 0
+        self.fallbacks = 0
+        self.fallbacks_rejected = 0
+
+    def __getattr__(self, name):
+        return getattr(self.extractor, name)
+
+    async def extract_async(self, image: ImageSource, mime_type: str = "image/jpeg") -> ReceiptData:
+        self.calls += 1
+        attempt = 0
+        while True:
+            error = await self._admit()
+            if error is not None:
+                return await self._fallback_or_raise(image, mime_type, error)
+
+            try:
+                result = await asyncio.wait_for(
+                    self.extractor.extract_async(image, mime_type), self.call_timeout
+                )
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # O upstream respondeu; o problema é o conteúdo (ex: JSON inválido)
+                    self.breaker.record_success()
+                    self.failures += 1
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    return await self._fallback_or_raise(image, mime_type, e)
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+
+            self.breaker.record_success()
+            return result
+
+    async def extract_stream(
+        self,
+        image: ImageSource,
+        mime_type: str = "image/jpeg"
+    ) -> AsyncIterator[Union[ReceiptItem, ReceiptData]]:
+        """
+        `extract_stream` do extrator com limitador e disjuntor. O timeout vale
+        para o primeiro pedaço e para cada intervalo entre pedaços; retries e
+        fallback só até o primeiro (depois dele o cliente já recebeu parte da nota).
+        """
+        self.calls += 1
+        attempt = 0
+        while True:
+            error = await self._admit()
+            if error is not None:
+                async for result in self._fallback_stream(image, mime_type, error):
+                    yield result
+                return
+
+            stream = self.extractor.extract_stream(image, mime_type)
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), self.call_timeout)
+            except StopAsyncIteration:
+                self.breaker.record_success()
+                return
+            except asyncio.CancelledError:
+                self.breaker.release()
+                await stream.aclose()
+                raise
+            except Exception as e:
+                await stream.aclose()
+                if not is_retryable(e):
+                    self.breaker.record_success()
+                    self.failures += 1
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    async for result in self._fallback_stream(image, mime_type, e):
+                        yield result
+                    return
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+            break
+
+        try:
+            yield first
+            while True:
+                try:
+                    result = await asyncio.wait_for(stream.__anext__(), self.call_timeout)
+                except StopAsyncIteration:
+                    break
+                yield result
+        except (asyncio.CancelledError, GeneratorExit):
+            # Cliente desconectou no meio: nada a dizer sobre o upstream
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            self.failures += 1
+            raise
+        finally:
+            await stream.aclose()
+        self.breaker.record_success()
+
+    async def _admit(self) -> Optional[Exception]:
+        """Disjuntor e limitador antes de cada tentativa; devolve o erro se a chamada não pode sair."""
+        # Circuito aberto: falha rápido, sem gastar token nem esperar timeout
+        if self.breaker.state == CircuitBreaker.OPEN:
+            self.short_circuited += 1
+            return CircuitOpenError(_UNAVAILABLE)
+
+        if self.limiter is not None:
+            try:
+                await self.limiter.acquire(max_wait=self.call_timeout, sleep=self._sleep)
+            except RateLimitedError as e:
+                self.rate_limited += 1
+                return e
+
+        if not self.breaker.allow():
+            # Half-open com a chamada de teste já em andamento
+            self.short_circuited += 1
+            return CircuitOpenError(_UNAVAILABLE)
+        return None
+
+    async def _backoff(self, attempt: int):
+        # Full jitter: espera aleatória em [0, min(max, base * 2^tentativa)]
+        self.retries += 1
+        await self._sleep(self._rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    async def _fallback_or_raise(self, image: ImageSource, mime_type: str, error: Exception) -> ReceiptData:
+        if self.fallback is None:
+            raise error
+        self.fallbacks += 1
+        receipt = await self.fallback.extract_async(image, mime_type)
+        if self.fallback_check is not None and self.fallback_check(receipt) is not None:
+            self.fallbacks_rejected += 1
+            raise error
+        return receipt
+
+    async def _fallback_stream(self, image: ImageSource, mime_type: str, error: Exception):
+        """Fallback sem streaming: os itens saem todos de uma vez, depois a nota."""
+        receipt = await self._fallback_or_raise(image, mime_type, error)
+        for item in receipt.items:
+            yield item
+        yield receipt
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "rate_limited": self.rate_limited,
+            "fallbacks": self.fallbacks,
+            "fallbacks_rejected": self.fallbacks_rejected,
+            "limiter_tokens": round(self.limiter.tokens, 2) if self.limiter else None,
+        }
@@ -0,0 +1,234 @@
+"""
+Serviço estático da PWA a partir da memória.
+
+No startup (`load`), cada arquivo é lido uma vez, ganha um ETag pelo hash do
+conteúdo e variantes gzip/brotli pré-comprimidas. As referências do
+index.html a css/js/assets recebem `?v=<hash>`, e a lista de precache do
+sw.js as mesmas URLs; pedidos com o hash certo são servidos com
+`Cache-Control: immutable`, os demais revalidam via ETag (304).
+Nenhum acesso ao disco no caminho da requisição.
+"""
+from dataclasses import dataclass, field
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from typing import Dict, Iterable, Optional
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, só gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/manifest+json", "image/svg+xml")
+# Abaixo disso a compressão não compensa o custo no cliente
+MIN_COMPRESS_BYTES = 512
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_REFERENCE_RE = re.compile(r'((?:href|src)=")((?:css|js|assets)/[^"?#]+)(")')
+# Caminhos absolutos entre aspas no service worker ('/css/styles.css')
+_WORKER_REFERENCE_RE = re.compile(r"""(['"]/)((?:css|js|assets)/[^'"?#]+)(['"])""")
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+
+@dataclass
+class StaticFile:
+    content: bytes
+    media_type: str
+    digest: str
+    # Codificação ("br", "gzip") -> bytes pré-comprimidos
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+def _compress(content: bytes, media_type: str) -> Dict[str, bytes]:
+    if len(content) < MIN_COMPRESS_BYTES or not media_type.startswith(COMPRESSIBLE_TYPES):
+        return {}
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, quality=11)
+    # Só guarda variantes que de fato economizam bytes
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(content)}
+
+
+def _digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+class PWAStaticFiles:
+    """
+    App ASGI que serve a PWA da memória.
+
+    `shell` são os arquivos servidos na raiz (index.html, manifest.json,
+    sw.js); `directories` são as pastas expostas por inteiro (css, js, assets).
+    """
+
+    def __init__(self, directory: str, shell: Iterable[str], directories: Iterable[str],
+                 index: str = "index.html", service_worker: str = "sw.js"):
+        self.directory = directory
+        self.shell = tuple(shell)
+        self.directories = tuple(directories)
+        self.index = index
+        self.service_worker = service_worker
+        self.files: Dict[str, StaticFile] = {}
+
+    def load(self):
+        """Lê, versiona e comprime os arquivos (roda uma vez, no startup)."""
+        files = {}
+        for relative in self._walk():
+            with open(os.path.join(self.directory, relative), "rb") as f:
+                content = f.read()
+            files["/" + relative] = self._build(relative, content)
+
+        self._rewrite(files, self.index, _REFERENCE_RE)
+        # Precache com as URLs que o index.html pede: sem isso o cache offline
+        # guarda /css/styles.css e a página busca /css/styles.css?v=<hash>
+        self._rewrite(files, self.service_worker, _WORKER_REFERENCE_RE)
+
+        self.files = files
+        logger.info("pwa_carregada", extra={
+            "files": len(files),
+            "bytes": sum(len(f.content) for f in files.values()),
+            "brotli": brotli is not None,
+        })
+
+    def _walk(self):
+        for name in self.shell:
+            if os.path.isfile(os.path.join(self.directory, name)):
+                yield name
+        for top in self.directories:
+            for root, _, names in os.walk(os.path.join(self.directory, top)):
+                for name in sorted(names):
+                    yield os.path.relpath(os.path.join(root, name), self.directory).replace(os.sep, "/")
+
+    def _rewrite(self, files: Dict[str, StaticFile], relative: str, pattern: re.Pattern):
+        """Acrescenta `?v=<hash>` às referências do arquivo de texto `relative`."""
+        static_file = files.get("/" + relative)
+        if static_file is None:
+            return
+        text = pattern.sub(
+            lambda m: m.group(1) + self._fingerprint(files, m.group(2)) + m.group(3),
+            static_file.content.decode("utf-8"),
+        )
+        files["/" + relative] = self._build(relative, text.encode("utf-8"))
+
+    @staticmethod
+    def _build(relative: str, content: bytes) -> StaticFile:
+        media_type = mimetypes.guess_type(relative)[0] or "application/octet-stream"
+        return StaticFile(content, media_type, _digest(content), _compress(content, media_type))
+
+    @staticmethod
+    def _fingerprint(files: Dict[str, StaticFile], reference: str) -> str:
+        static_file = files.get("/" + reference)
+        return f"{reference}?v={static_file.digest}" if static_file else reference
+
+    async def __call__(self, scope, receive, send):
+        response = self.response(scope)
+        await response(scope, receive, send)
+
+    def response(self, scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            return PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+
+        path = scope["path"]
+        static_file = self.files.get("/" + self.index if path == "/" else path)
+        if static_file is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        request_headers = Headers(scope=scope)
+        version = _query_param(scope.get("query_string", b""), "v")
+        headers = {
+            "ETag": static_file.etag,
+            "Cache-Control": IMMUTABLE if version == static_file.digest else REVALIDATE,
+        }
+        if static_file.encoded:
+            headers["Vary"] = "Accept-Encoding"
+
+        if _etag_matches(request_headers.get("if-none-match"), static_file.digest):
+            return Response(status_code=304, headers=headers)
+
+        body = static_file.content
+        encoding = _negotiate(request_headers.get("accept-encoding", ""), static_file.encoded)
+        if encoding is not None:
+            body = static_file.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+            headers["ETag"] = f'"{static_file.digest}-{encoding}"'
+
+        if scope["method"] == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=static_file.media_type)
+        return Response(body, headers=headers, media_type=static_file.media_type)
+
+
+def _query_param(query_string: bytes, name: str) -> Optional[str]:
+    for pair in query_string.decode("latin-1").split("&"):
+        key, _, value = pair.partition("=")
+        if key == name:
+            return value
+    return None
+
+
+def _etag_matches(if_none_match: Optional[str], digest: str) -> bool:
+    """Aceita o ETag de qualquer variante (identidade, -gzip, -br), fraco ou forte."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        tag = tag.removeprefix("W/").strip('"')
+        if tag.split("-", 1)[0] == digest:
+            return True
+    return False
+
+
+def encoding_weights(accept_encoding: str) -> Dict[str, float]:
+    """Accept-Encoding -> {codificação: q}; q ausente vale 1 e q inválido, 0."""
+    weights = {}
+    for token in accept_encoding.lower().split(","):
+        name, _, params = token.partition(";")
+        name = name.strip()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    return weights
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """`encoding` aceita pelo cliente: citada com q > 0 ou coberta por `*` com q > 0."""
+    weights = encoding_weights(accept_encoding)
+    return weights.get(encoding, weights.get("*", 0.0)) > 0
+
+
+def _negotiate(accept_encoding: str, encoded: Dict[str, bytes]) -> Optional[str]:
+    if not encoded:
+        return None
+    weights = encoding_weights(accept_encoding)
+    best, best_q = None, 0.0
+    # No empate de q, brotli (menor) ganha
+    for encoding in ("br", "gzip"):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if encoding in encoded and q > best_q:
+            best, best_q = encoding, q
+    return best
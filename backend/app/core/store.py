@@ -0,0 +1,175 @@
+from app.models.receipt import ReceiptData
+from typing import Dict, Optional
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ReceiptStore:
+    """
+    Armazena as notas processadas em SQLite, por id e por hash da imagem.
+
+    Gravação em segundo plano (write-behind): `put` só anota a nota em memória
+    e o writer grava em lote, numa transação, fora do caminho da requisição.
+    Leituras enxergam as notas ainda pendentes. Notas vencidas (TTL) são
+    ignoradas na leitura e apagadas periodicamente pela compactação.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: float = 7 * 24 * 3600,
+        flush_interval: float = 0.2,
+        batch_size: int = 100,
+        compact_interval: float = 3600,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.compact_interval = compact_interval
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: commit sem fsync por transação; perde no máximo o último lote num crash do SO
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS receipts ("
+            " id TEXT PRIMARY KEY,"
+            " content_hash TEXT,"
+            " created_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS receipts_content_hash ON receipts (content_hash)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS receipts_expires_at ON receipts (expires_at)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+        # id -> (hash, expira_em, ReceiptData) aguardando o próximo lote
+        self._pending: Dict[str, tuple[Optional[str], float, ReceiptData]] = {}
+        self._pending_by_hash: Dict[str, str] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._last_compaction = 0.0
+
+        self.written = 0
+        self.batches = 0
+        self.compacted = 0
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if self._writer is None:
+            self._wakeup = asyncio.Event()
+            self._writer = asyncio.create_task(self._write_loop(), name="receipt-store-writer")
+
+    async def stop(self):
+        """Para o writer gravando o que ainda estiver pendente."""
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        await self.flush()
+
+    def put(self, receipt: ReceiptData, content_hash: Optional[str] = None) -> None:
+        """Agenda a gravação (não bloqueia; a serialização acontece no writer)."""
+        expires_at = time.time() + self.ttl_seconds
+        self._pending[receipt.id] = (content_hash, expires_at, receipt)
+        if content_hash is not None:
+            self._pending_by_hash[content_hash] = receipt.id
+        if self._wakeup is not None and len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def get(self, receipt_id: str) -> Optional[ReceiptData]:
+        pending = self._pending.get(receipt_id)
+        if pending is not None:
+            self.hits += 1
+            return pending[2]
+        return self._select("id = ?", receipt_id)
+
+    def get_by_hash(self, content_hash: str) -> Optional[ReceiptData]:
+        receipt_id = self._pending_by_hash.get(content_hash)
+        if receipt_id is not None and receipt_id in self._pending:
+            self.hits += 1
+            return self._pending[receipt_id][2]
+        return self._select("content_hash = ? ORDER BY created_at DESC LIMIT 1", content_hash)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "batches": self.batches,
+            "compacted": self.compacted,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _select(self, where: str, value: str) -> Optional[ReceiptData]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT expires_at, payload FROM receipts WHERE {where}", (value,)
+            ).fetchone()
+        if row is None or row[0] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ReceiptData.model_validate_json(row[1])
+
+    async def _write_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if time.time() - self._last_compaction >= self.compact_interval:
+                    await asyncio.to_thread(self._compact)
+            except Exception:
+                # Erro de disco não derruba o writer; as notas continuam pendentes
+                logger.exception("receipt_store_falhou")
+
+    async def flush(self):
+        """Grava as notas pendentes num único lote."""
+        if not self._pending:
+            return
+        # Cópia no event loop: `put` continua livre enquanto a thread grava
+        batch = dict(self._pending)
+        await asyncio.to_thread(self._write, batch)
+        # Só sai da fila o que foi gravado (e não foi substituído enquanto isso)
+        for receipt_id, entry in batch.items():
+            if self._pending.get(receipt_id) is entry:
+                del self._pending[receipt_id]
+                if entry[0] is not None and self._pending_by_hash.get(entry[0]) == receipt_id:
+                    del self._pending_by_hash[entry[0]]
+        self.written += len(batch)
+        self.batches += 1
+
+    def _write(self, batch: Dict[str, tuple]):
+        now = time.time()
+        rows = [
+            (receipt_id, content_hash, now, expires_at, receipt.model_dump_json())
+            for receipt_id, (content_hash, expires_at, receipt) in batch.items()
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO receipts (id, content_hash, created_at, expires_at, payload)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+
+    def _compact(self):
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM receipts WHERE expires_at <= ?", (time.time(),)).rowcount
+            self._db.commit()
+        self._last_compaction = time.time()
+        self.compacted += deleted
+        if deleted:
+            logger.info("receipt_store_compactado", extra={"deleted": deleted})
@@ -1,17 +1,55 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
+from contextlib import asynccontextmanager
 from app.api.routes import api_router
+from app.api.routes.receipt import UPLOAD_ROUTES, client_limiter, job_queue, receipt_service
+from app.api.routes.split import split_sessions
+from app.core.admission import AdmissionMiddleware
 from app.core.config import settings
+from app.core.log import configure_logging
+from app.core.metrics import REGISTRY, MetricsMiddleware
+from app.core.static import PWAStaticFiles
+import asyncio
 import os
 
+configure_logging(settings.LOG_LEVEL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Extratores (SDKs + clientes) são montados em segundo plano: o /health já responde
+    receipt_service.start()
+    # Lê e comprime a PWA uma vez; depois nenhuma requisição estática toca o disco
+    if os.path.exists(PWA_DIR):
+        await asyncio.to_thread(pwa_static.load)
+    # Pool de workers que drena a fila de notas
+    await job_queue.start()
+    split_sessions.start()
+    yield
+    await split_sessions.stop()
+    await job_queue.stop()
+    await receipt_service.stop()
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API para processamento de notas fiscais com OCR",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Uploads recusados (tamanho, tipo, limite por cliente) enquanto o corpo ainda chega
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        upload_paths={
+            f"{settings.API_V1_PREFIX}/receipt{path}": max_files for path, max_files in UPLOAD_ROUTES.items()
+        },
+        max_file_bytes=settings.MAX_UPLOAD_BYTES,
+        limiter=client_limiter,
+        trust_forwarded_for=settings.TRUST_FORWARDED_FOR,
+        key_by_device=settings.CLIENT_KEY_BY_DEVICE_ID,
+    )
+
 # CORS para desenvolvimento local e PWA
 app.add_middleware(
     CORSMiddleware,
@@ -21,47 +59,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Requisições em andamento e latência por rota para o /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Rotas da API
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas no formato texto do Prometheus."""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Caminho para a pasta PWA
 PWA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pwa")
 
-# Servir arquivos estáticos da PWA (CSS, JS, assets)
+# PWA servida da memória: ETag por hash, gzip/brotli pré-comprimidos e
+# `immutable` para css/js/assets versionados (?v=hash) no index.html
+pwa_static = PWAStaticFiles(
+    PWA_DIR,
+    shell=("index.html", "manifest.json", "sw.js"),
+    directories=("css", "js", "assets"),
+)
+
 if os.path.exists(PWA_DIR):
-    app.mount("/css", StaticFiles(directory=os.path.join(PWA_DIR, "css")), name="css")
-    app.mount("/js", StaticFiles(directory=os.path.join(PWA_DIR, "js")), name="js")
-    app.mount("/assets", StaticFiles(directory=os.path.join(PWA_DIR, "assets")), name="assets")
+    app.mount("/css", pwa_static, name="css")
+    app.mount("/js", pwa_static, name="js")
+    app.mount("/assets", pwa_static, name="assets")
 
-@app.get("/")
-async def root():
+@app.api_route("/", methods=["GET", "HEAD"])
+async def root(request: Request):
     """Serve a PWA ou mensagem de boas-vindas"""
-    index_path = os.path.join(PWA_DIR, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path, media_type="text/html")
+    if pwa_static.files:
+        return pwa_static.response(request.scope)
     return {"message": "DivUp API - Use /docs para documentação"}
 
-@app.get("/index.html")
-async def index_html():
-    """Rota alternativa para index.html (compatibilidade com Service Worker)"""
-    index_path = os.path.join(PWA_DIR, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path, media_type="text/html")
-    return {"error": "index.html not found"}
-
-@app.get("/manifest.json")
-async def manifest():
-    """Serve o manifest da PWA"""
-    manifest_path = os.path.join(PWA_DIR, "manifest.json")
-    if os.path.exists(manifest_path):
-        return FileResponse(manifest_path, media_type="application/json")
-    return {"error": "Manifest not found"}
-
-@app.get("/sw.js")
-async def service_worker():
-    """Serve o Service Worker da PWA"""
-    sw_path = os.path.join(PWA_DIR, "sw.js")
-    if os.path.exists(sw_path):
-        return FileResponse(sw_path, media_type="application/javascript")
-    return {"error": "Service Worker not found"}
-
+@app.api_route("/index.html", methods=["GET", "HEAD"], include_in_schema=False)
+@app.api_route("/manifest.json", methods=["GET", "HEAD"], include_in_schema=False)
+@app.api_route("/sw.js", methods=["GET", "HEAD"], include_in_schema=False)
+async def pwa_shell(request: Request):
+    """index.html (compatibilidade com Service Worker), manifest e Service Worker"""
+    return pwa_static.response(request.scope)
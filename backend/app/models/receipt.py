@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from enum import Enum
 from uuid import uuid4
 
 class ReceiptItem(BaseModel):
@@ -10,6 +11,14 @@ class ReceiptItem(BaseModel):
     total_price: float
     confidence: float = 0.0
 
+class TokenUsage(BaseModel):
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # Tokens de raciocínio do modelo (cobrados como saída)
+    thinking_tokens: int = 0
+    # Parte da entrada servida pelo cache de contexto (incluída em input_tokens, cobrada com desconto)
+    cached_input_tokens: int = 0
+
 class ReceiptData(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
     raw_text: str
@@ -19,9 +28,42 @@ class ReceiptData(BaseModel):
     confidence_score: float = 0.0
     establishment_name: Optional[str] = None
     date: Optional[str] = None
+    # Motor que produziu o resultado ("vision" = OCR + parser, "gemini"; "mixed" = fotos juntadas de motores diferentes)
+    engine: Optional[str] = None
+    # Tokens gastos na chamada ao modelo (só para engine="gemini"; somados no merge)
+    usage: Optional[TokenUsage] = None
 
 class ProcessReceiptResponse(BaseModel):
     success: bool
     receipt: Optional[ReceiptData] = None
     error: Optional[str] = None
     processing_time_ms: int
+
+class BatchImageResult(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    success: bool
+    receipt: Optional[ReceiptData] = None
+    error: Optional[str] = None
+    processing_time_ms: int
+
+class BatchReceiptResponse(BaseModel):
+    success: bool
+    # Nota única (merge=true) com itens duplicados entre fotos removidos
+    receipt: Optional[ReceiptData] = None
+    results: List[BatchImageResult]
+    error: Optional[str] = None
+    processing_time_ms: int
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: JobStatus
+    receipt: Optional[ReceiptData] = None
+    error: Optional[str] = None
+    processing_time_ms: Optional[int] = None
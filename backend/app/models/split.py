@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+
+class CreateSplitSessionRequest(BaseModel):
+    receipt_id: str
+
+class SplitSessionResponse(BaseModel):
+    code: str
+    receipt_id: str
+    # Caminho do WebSocket (relativo ao host): ?name=...&participant_id=...&since=...
+    websocket_path: str
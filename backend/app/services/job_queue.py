@@ -0,0 +1,170 @@
+from app.models.receipt import JobResponse, JobStatus, ReceiptData
+from app.services.receipt_service import ReceiptService
+from collections import OrderedDict
+from typing import Optional
+import asyncio
+import math
+import time
+import uuid
+
+class QueueFullError(Exception):
+    """Fila no limite: o cliente deve tentar de novo depois de `retry_after` segundos."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Fila de processamento cheia")
+        self.retry_after = retry_after
+
+
+class Job:
+    """Um upload aguardando (ou já com) resultado da extração."""
+
+    def __init__(self, image_data: bytes):
+        self.id = str(uuid.uuid4())
+        self.status = JobStatus.QUEUED
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.receipt: Optional[ReceiptData] = None
+        self.error: Optional[str] = None
+        self.processing_time_ms: Optional[int] = None
+        self.image_data: Optional[bytes] = image_data
+        self.done = asyncio.Event()
+
+    def to_response(self) -> JobResponse:
+        return JobResponse(
+            job_id=self.id,
+            status=self.status,
+            receipt=self.receipt,
+            error=self.error,
+            processing_time_ms=self.processing_time_ms,
+        )
+
+
+class JobQueue:
+    """
+    Fila de extrações drenada por um pool fixo de workers.
+
+    - `submit` enfileira e retorna na hora; com a fila cheia levanta
+      QueueFullError (a rota responde 503 + Retry-After).
+    - Resultados ficam disponíveis por `result_ttl` segundos para polling.
+    """
+
+    def __init__(
+        self,
+        service: ReceiptService,
+        workers: int = 8,
+        max_depth: int = 64,
+        result_ttl: float = 600,
+    ):
+        self.service = service
+        self.worker_count = workers
+        self.max_depth = max_depth
+        self.result_ttl = result_ttl
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+        # Média móvel do tempo de processamento, usada para estimar o Retry-After
+        self._avg_processing_s = 5.0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"receipt-worker-{n}")
+            for n in range(self.worker_count)
+        ]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, image_data: bytes) -> Job:
+        if self._queue is None:
+            raise RuntimeError("JobQueue não iniciada (chame start() no startup da aplicação)")
+        self._evict_expired()
+
+        job = Job(image_data)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: Job, timeout: Optional[float] = None) -> Job:
+        """Aguarda o job terminar (ou o timeout estourar) e o devolve."""
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def retry_after(self) -> int:
+        """Estimativa (s) de quando haverá vaga: fila atual / workers x tempo médio."""
+        depth = self._queue.qsize() if self._queue else 0
+        waves = depth / max(self.worker_count, 1)
+        return max(1, math.ceil(waves * self._avg_processing_s))
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_depth": self.max_depth,
+            "tracked_jobs": len(self._jobs),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_processing_ms": int(self._avg_processing_s * 1000),
+        }
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = JobStatus.PROCESSING
+        try:
+            receipt, processing_time = await self.service.process_receipt_image(job.image_data)
+            job.receipt = receipt
+            job.processing_time_ms = processing_time
+            job.status = JobStatus.DONE
+            self.completed += 1
+            self._avg_processing_s = 0.8 * self._avg_processing_s + 0.2 * (processing_time / 1000)
+        except asyncio.CancelledError:
+            job.status = JobStatus.FAILED
+            job.error = "Processamento cancelado"
+            raise
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            self.failed += 1
+        finally:
+            job.image_data = None
+            job.finished_at = time.time()
+            job.done.set()
+
+    def _evict_expired(self):
+        """Remove jobs finalizados há mais de `result_ttl` (mais antigos primeiro)."""
+        cutoff = time.time() - self.result_ttl
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            # Ordem de criação: daqui em diante nenhum job pode ter expirado
+            if job.created_at > cutoff:
+                break
+            if job.finished_at is not None and job.finished_at <= cutoff:
+                del self._jobs[job_id]
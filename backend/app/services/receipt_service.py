@@ -1,26 +1,610 @@
-from app.core.ocr.gemini_vision import GeminiVisionExtractor
-from app.models.receipt import ReceiptData
+from app.core.ocr.image_source import ImageSource, read_image_bytes
+from app.core.ocr.preprocessing import ImagePreprocessor
+from app.core.ocr.quality import ImageQualityError, ImageQualityGate
+from app.core.ocr.consistency import check_consistency
+from app.core.ocr.registry import extractors
+from app.core.cache import ReceiptCache
+from app.core.store import ReceiptStore
+from app.core.near_duplicates import NearDuplicateIndex, image_fingerprint
+from app.core.resilience import CircuitBreaker, ResilientExtractor, TokenBucket
+from app.core.config import settings
+from app.core.metrics import (
+    ERRORS, EXTRACTIONS_IN_FLIGHT, ITEMS_EXTRACTED, MODEL_BYTES_SENT,
+    MODEL_CALL_SECONDS, PREPROCESS_SECONDS, QUALITY_CHECK_SECONDS, QUALITY_CHECKS
+)
+from app.models.receipt import ReceiptData, ReceiptItem
+from typing import AsyncIterator, List, Optional, Union
+import asyncio
+import hashlib
+import logging
 import time
 import os
 
+logger = logging.getLogger(__name__)
+
+class StreamAbandonedError(Exception):
+    """O cliente do streaming desconectou antes do fim; quem aguardava extrai de novo."""
+
+def _fresh_copy(receipt_data: ReceiptData) -> ReceiptData:
+    """Mesma extração com ids novos (nota e itens)."""
+    data = receipt_data.model_dump(exclude={"id"})
+    for item in data["items"]:
+        item.pop("id")
+    return ReceiptData.model_validate(data)
+
 class ReceiptService:
     """Serviço de processamento de notas."""
     
     def __init__(self):
-        self.gemini_extractor = GeminiVisionExtractor()
+        # Extratores são construídos em start() (lifespan), não no import:
+        # as SDKs pesam no cold start e exigem credenciais.
+        # Camada barata (OCR + ReceiptParser) antes do modelo
+        self.vision_extractor = None
+        # Modelo protegido por rate limit, retries com backoff e circuit breaker
+        self.gemini_extractor = None
+        self._ready: Optional[asyncio.Future] = None
+        self.tier_stats = {
+            engine: {
+                "attempts": 0, "accepted": 0, "rejected": 0, "errors": 0, "total_ms": 0,
+                "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0,
+            }
+            for engine in ("vision", "gemini")
+        }
+        # Motivos de escalonamento para o Gemini (poucos_itens, total_divergente, ...)
+        self.escalations: dict[str, int] = {}
+        # Quem venceu as corridas de hedging (para calibrar HEDGE_DELAY_MS contra o p99)
+        self.hedge_stats = {"hedged": 0, "primary_wins": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+        self.preprocessor = ImagePreprocessor(
+            max_dimension=settings.IMAGE_MAX_DIMENSION,
+            grayscale=settings.IMAGE_GRAYSCALE,
+            jpeg_quality=settings.IMAGE_JPEG_QUALITY,
+            enabled=settings.IMAGE_PREPROCESS_ENABLED,
+        )
+        # Fotos inutilizáveis são recusadas aqui, sem gastar uma chamada ao modelo
+        self.quality_gate: Optional[ImageQualityGate] = None
+        if settings.QUALITY_GATE_ENABLED:
+            self.quality_gate = ImageQualityGate(
+                min_side=settings.QUALITY_MIN_SIDE_PX,
+                min_brightness=settings.QUALITY_MIN_BRIGHTNESS,
+                max_clipped_ratio=settings.QUALITY_MAX_CLIPPED_RATIO,
+                min_sharpness=settings.QUALITY_MIN_SHARPNESS,
+                min_text_density=settings.QUALITY_MIN_TEXT_DENSITY,
+            )
+        self.quality_stats = {"accepted": 0, "rejected": {}}
+        # Limita quantas chamadas ao modelo ficam em voo ao mesmo tempo;
+        # as demais aguardam aqui sem bloquear o event loop.
+        self._extraction_slots = asyncio.Semaphore(settings.MAX_CONCURRENT_EXTRACTIONS)
+        
+        self.cache: Optional[ReceiptCache] = None
+        if settings.RECEIPT_CACHE_ENABLED:
+            db_path = None
+            if settings.RECEIPT_CACHE_DISK_ENABLED:
+                db_path = os.path.join(settings.UPLOAD_DIR, "receipt_cache.sqlite3")
+            self.cache = ReceiptCache(
+                max_entries=settings.RECEIPT_CACHE_MAX_ENTRIES,
+                max_bytes=settings.RECEIPT_CACHE_MAX_BYTES,
+                ttl_seconds=settings.RECEIPT_CACHE_TTL_SECONDS,
+                db_path=db_path,
+            )
+        
+        # Notas processadas, por id e por hash (SQLite); aberto em start()
+        self.store: Optional[ReceiptStore] = None
+        
+        # Fotos recentes por hash perceptual -> hash do conteúdo da extração
+        # (precisa do cache ou do store para achar o resultado)
+        self.near_duplicates: Optional[NearDuplicateIndex] = None
+        if settings.NEAR_DUPLICATE_ENABLED and (self.cache is not None or settings.RECEIPT_STORE_ENABLED):
+            self.near_duplicates = NearDuplicateIndex(
+                max_distance=settings.NEAR_DUPLICATE_MAX_DISTANCE,
+                window_seconds=settings.NEAR_DUPLICATE_WINDOW_SECONDS,
+                max_entries=settings.NEAR_DUPLICATE_MAX_ENTRIES,
+                max_content_distance=settings.NEAR_DUPLICATE_MAX_CONTENT_DISTANCE,
+            )
+        self.near_duplicate_hits = 0
+        
+        # Extrações em andamento por hash: uploads simultâneos da mesma imagem
+        # aguardam a mesma chamada ao modelo em vez de disparar outra (Task no
+        # caminho normal, Future resolvido pelo streaming).
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.coalesced_requests = 0
+    
+    def start(self):
+        """
+        Dispara a construção dos extratores numa thread, sem segurar o startup.
+        
+        As requisições aguardam a conclusão em `_wait_ready`. Extratores já
+        atribuídos (ex: falsos, em benchmarks) são mantidos.
+        """
+        if self._ready is None:
+            self._ready = asyncio.ensure_future(asyncio.to_thread(self._build_extractors))
+        if self.store is None and settings.RECEIPT_STORE_ENABLED:
+            try:
+                self.store = ReceiptStore(
+                    os.path.join(settings.UPLOAD_DIR, "receipts.sqlite3"),
+                    ttl_seconds=settings.RECEIPT_STORE_TTL_SECONDS,
+                    flush_interval=settings.RECEIPT_STORE_FLUSH_INTERVAL_MS / 1000,
+                    batch_size=settings.RECEIPT_STORE_BATCH_SIZE,
+                    compact_interval=settings.RECEIPT_STORE_COMPACT_INTERVAL_SECONDS,
+                )
+                self.store.start()
+            except Exception as e:
+                logger.warning("receipt_store_desativado", extra={"error": str(e)})
+    
+    async def stop(self):
+        """Grava as notas ainda pendentes no store."""
+        if self.store is not None:
+            await self.store.stop()
+    
+    def _build_extractors(self):
+        start_time = time.perf_counter()
+        if self.vision_extractor is None and settings.TIERED_EXTRACTION_ENABLED:
+            try:
+                self.vision_extractor = extractors.create(settings.OCR_ENGINE)
+            except Exception as e:
+                logger.warning("extracao_em_camadas_desativada", extra={"error": str(e)})
+        
+        if self.gemini_extractor is None:
+            try:
+                extractor = extractors.create(settings.EXTRACTOR_ENGINE)
+            except Exception:
+                logger.exception("extrator_indisponivel", extra={"engine": settings.EXTRACTOR_ENGINE})
+                raise
+            self.gemini_extractor = ResilientExtractor(
+                extractor,
+                limiter=TokenBucket(
+                    rate=settings.GEMINI_RATE_LIMIT_RPM / 60,
+                    burst=settings.GEMINI_RATE_LIMIT_BURST,
+                ),
+                breaker=CircuitBreaker(
+                    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+                    reset_timeout=settings.CIRCUIT_RESET_TIMEOUT_SECONDS,
+                ),
+                max_retries=settings.GEMINI_MAX_RETRIES,
+                base_delay=settings.GEMINI_RETRY_BASE_DELAY_MS / 1000,
+                max_delay=settings.GEMINI_RETRY_MAX_DELAY_MS / 1000,
+                call_timeout=settings.GEMINI_CALL_TIMEOUT_MS / 1000,
+                # Com o circuito aberto, a camada OCR (se configurada) responde no lugar,
+                # desde que passe na mesma checagem de consistência da camada
+                fallback=self.vision_extractor,
+                fallback_check=self._vision_rejection,
+            )
+        logger.info("extratores_prontos", extra={
+            "engine": settings.EXTRACTOR_ENGINE,
+            "ocr_engine": settings.OCR_ENGINE if self.vision_extractor is not None else None,
+            "ms": round((time.perf_counter() - start_time) * 1000, 1),
+        })
     
-    def process_receipt_image(self, image_path: str) -> tuple[ReceiptData, int]:
-        """Pipeline completo de processamento com Gemini Vision."""
+    @property
+    def ready(self) -> bool:
+        return self._ready is not None and self._ready.done() and not self._ready.cancelled() \
+            and self._ready.exception() is None
+    
+    async def _wait_ready(self):
+        if self._ready is None:
+            raise RuntimeError("ReceiptService não iniciado (chame start() no startup da aplicação)")
+        if self._ready.done() and not self.ready:
+            # Falhou antes (ex: sem API key): tenta de novo a cada requisição
+            self._ready = None
+            self.start()
+        # shield: um cliente que desiste não cancela a construção para os demais
+        await asyncio.shield(self._ready)
+    
+    async def process_receipt_image(self, image: ImageSource) -> tuple[ReceiptData, int]:
+        """
+        Pipeline completo de processamento com Gemini Vision.
+        
+        Recebe a imagem em memória (bytes/buffer/arquivo aberto); nada é
+        gravado em disco no caminho normal.
+        """
         start_time = time.time()
         
         try:
-            receipt_data = self.gemini_extractor.extract(image_path)
+            image_data = read_image_bytes(image)
+            if self.cache is None and self.store is None:
+                receipt_data = await self._extract(image_data)
+            else:
+                content_hash = hashlib.sha256(image_data).hexdigest()
+                receipt_data = await self._get_or_extract(content_hash, image_data)
             
             processing_time = int((time.time() - start_time) * 1000)
             
             return receipt_data, processing_time
+        except ImageQualityError:
+            # Recusa esperada (já contabilizada): sem traceback
+            raise
+        except Exception:
+            logger.exception("erro_processamento")
+            raise
+    
+    async def process_batch(
+        self,
+        images: List[ImageSource]
+    ) -> List[tuple[Optional[ReceiptData], Optional[Exception], int]]:
+        """
+        Processa várias imagens em paralelo (até BATCH_CONCURRENCY por lote).
+        
+        Retorna, na ordem de entrada, (receipt, erro, tempo_ms) por imagem;
+        a falha de uma imagem não derruba as demais.
+        """
+        fan_out = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+        
+        async def run(image: ImageSource):
+            start_time = time.time()
+            async with fan_out:
+                try:
+                    receipt_data, processing_time = await self.process_receipt_image(image)
+                    return receipt_data, None, processing_time
+                except Exception as e:
+                    return None, e, int((time.time() - start_time) * 1000)
+        
+        return await asyncio.gather(*(run(image) for image in images))
+    
+    async def stream_receipt_image(
+        self,
+        image: ImageSource
+    ) -> AsyncIterator[Union[ReceiptItem, ReceiptData]]:
+        """
+        Variante em streaming de `process_receipt_image`: gera cada item assim
+        que o modelo o conclui e, por último, o ReceiptData completo.
+        
+        Cache e extrações em andamento da mesma imagem são reaproveitados
+        (nesse caso os itens saem todos de uma vez); enquanto este streaming
+        roda, uploads da mesma imagem aguardam o resultado dele.
+        
+        Ao contrário de `process_receipt_image`, não passa pela busca de
+        quase-duplicatas, pela camada OCR nem pelo hedge, e não tem o prazo
+        EXTRACTION_DEADLINE_MS: o modelo é chamado uma vez, protegido só pelo
+        limitador, disjuntor e timeout por pedaço do ResilientExtractor.
+        """
+        image_data = read_image_bytes(image)
+        content_hash = hashlib.sha256(image_data).hexdigest() if self.cache or self.store else None
+        
+        receipt_data = None
+        if content_hash is not None:
+            receipt_data = await self._lookup(content_hash)
+            task = self._inflight.get(content_hash)
+            if receipt_data is None and task is not None:
+                self.coalesced_requests += 1
+                try:
+                    receipt_data = await asyncio.shield(task)
+                except StreamAbandonedError:
+                    # O outro streaming parou no meio: este extrai por conta própria
+                    pass
+        
+        if receipt_data is not None:
+            for item in receipt_data.items:
+                yield item
+            yield receipt_data
+            return
+        
+        future = None
+        if content_hash is not None and content_hash not in self._inflight:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[content_hash] = future
+        
+        try:
+            await self._wait_ready()
+            prepared = await self._prepare(image_data)
+            MODEL_BYTES_SENT.inc(len(prepared.data), engine="gemini")
+            async with self._extraction_slots:
+                with EXTRACTIONS_IN_FLIGHT.track(engine="gemini"), MODEL_CALL_SECONDS.time(engine="gemini"):
+                    async for result in self.gemini_extractor.extract_stream(prepared.data, prepared.mime_type):
+                        if isinstance(result, ReceiptData):
+                            receipt_data = result
+                            self._record_usage("gemini", result)
+                        yield result
+            if content_hash is not None and receipt_data is not None:
+                await self._remember(content_hash, receipt_data)
+        except ImageQualityError as e:
+            self._settle(content_hash, future, error=e)
+            raise
         except Exception as e:
-            print(f"❌ Erro no processamento com Gemini: {e}")
-            import traceback
-            traceback.print_exc()
-            raise e
+            ERRORS.inc(stage="stream", type=type(e).__name__)
+            logger.exception("erro_streaming")
+            self._settle(content_hash, future, error=e)
+            raise
+        except BaseException:
+            # Cliente desconectou (GeneratorExit) ou a requisição foi cancelada
+            self._settle(content_hash, future, error=StreamAbandonedError())
+            raise
+        self._settle(content_hash, future, result=receipt_data)
+    
+    def _settle(self, content_hash: Optional[str], future: Optional[asyncio.Future],
+                result: Optional[ReceiptData] = None, error: Optional[BaseException] = None):
+        """Resolve o Future do streaming em `_inflight` e o remove."""
+        if future is None:
+            return
+        if self._inflight.get(content_hash) is future:
+            del self._inflight[content_hash]
+        if future.done():
+            return
+        if error is None and result is None:
+            error = StreamAbandonedError()
+        if error is not None:
+            future.set_exception(error)
+            # Sem ninguém aguardando, não vira "exception was never retrieved"
+            future.exception()
+        else:
+            future.set_result(result)
+    
+    @property
+    def keeps_receipts(self) -> bool:
+        """Há onde achar uma nota processada pelo id (store ou cache)."""
+        return self.store is not None or self.cache is not None
+    
+    async def get_receipt(self, receipt_id: str) -> Optional[ReceiptData]:
+        """
+        Nota já processada, pelo id: no store e, sem ele (desligado ou falhou ao
+        abrir) ou sem a nota, na memória do cache. None se não existir ou expirou.
+        """
+        if self.store is not None:
+            receipt_data = await asyncio.to_thread(self.store.get, receipt_id)
+            if receipt_data is not None:
+                return receipt_data
+        if self.cache is not None:
+            return self.cache.get_by_id(receipt_id)
+        return None
+    
+    def stats(self) -> dict:
+        """Contadores expostos em /receipt/stats."""
+        return {
+            "cache": self.cache.stats() if self.cache else None,
+            "store": self.store.stats() if self.store else None,
+            "tiers": self.tier_stats,
+            "escalations": self.escalations,
+            "hedging": self.hedge_stats,
+            # Cada foto recusada é uma chamada ao modelo economizada
+            "quality_gate": self.quality_stats if self.quality_gate else None,
+            "extractors_ready": self.ready,
+            "resilience": self.gemini_extractor.stats() if hasattr(self.gemini_extractor, "stats") else None,
+            "context_cache": self.gemini_extractor.cache_stats()
+            if hasattr(self.gemini_extractor, "cache_stats") else None,
+            "coalesced_requests": self.coalesced_requests,
+            "near_duplicates": dict(self.near_duplicates.stats(), hits=self.near_duplicate_hits)
+            if self.near_duplicates else None,
+            "inflight_extractions": len(self._inflight),
+        }
+    
+    async def _lookup(self, content_hash: str) -> Optional[ReceiptData]:
+        """Cache primeiro; depois o store (promovendo o achado para o cache)."""
+        if self.cache is not None:
+            receipt_data = await asyncio.to_thread(self.cache.get, content_hash)
+            if receipt_data is not None:
+                return receipt_data
+        if self.store is not None:
+            receipt_data = await asyncio.to_thread(self.store.get_by_hash, content_hash)
+            if receipt_data is not None and self.cache is not None:
+                await asyncio.to_thread(self.cache.set, content_hash, receipt_data)
+            return receipt_data
+        return None
+    
+    async def _remember(self, content_hash: str, receipt_data: ReceiptData):
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, content_hash, receipt_data)
+        if self.store is not None:
+            # Só enfileira: a gravação é em lote, fora da requisição
+            self.store.put(receipt_data, content_hash)
+    
+    async def _get_or_extract(self, content_hash: str, image_data: bytes) -> ReceiptData:
+        cached = await self._lookup(content_hash)
+        if cached is not None:
+            return cached
+        
+        prepared = None
+        if self.near_duplicates is not None and content_hash not in self._inflight:
+            # O pHash sai da imagem já reduzida: um decode só da foto original
+            prepared = await self._prepare(image_data)
+            similar = await self._near_duplicate(content_hash, prepared.data)
+            if similar is not None:
+                return similar
+        
+        task = self._inflight.get(content_hash)
+        if task is None:
+            task = asyncio.create_task(self._extract_and_cache(content_hash, image_data, prepared))
+            self._inflight[content_hash] = task
+            task.add_done_callback(lambda _: self._inflight.pop(content_hash, None))
+        else:
+            self.coalesced_requests += 1
+        
+        # shield: se este cliente desistir, a extração continua para os demais
+        try:
+            return await asyncio.shield(task)
+        except StreamAbandonedError:
+            # Streaming da mesma imagem interrompido pelo cliente: extrai de novo
+            return await self._get_or_extract(content_hash, image_data)
+    
+    async def _near_duplicate(self, content_hash: str, image_data: bytes) -> Optional[ReceiptData]:
+        """
+        Cópia (com ids novos) do resultado de outra foto da mesma nota processada
+        há pouco (ou ainda em extração). Sem parecida, registra esta foto para as
+        próximas.
+        """
+        try:
+            phash, content = await asyncio.to_thread(image_fingerprint, image_data)
+        except ValueError:
+            # Imagem ilegível: a extração falha com o erro de sempre
+            return None
+        
+        for similar_hash, distance in self.near_duplicates.query(phash, content):
+            task = self._inflight.get(similar_hash)
+            try:
+                receipt_data = await asyncio.shield(task) if task else await self._lookup(similar_hash)
+            except Exception:
+                continue
+            if receipt_data is None:
+                continue
+            self.near_duplicate_hits += 1
+            logger.info("quase_duplicata", extra={"distance": distance, "source_receipt_id": receipt_data.id})
+            # Nota própria: quem enviou não chega ao id (nem às sessões de divisão) da outra
+            receipt_data = _fresh_copy(receipt_data)
+            # Reenvios desta mesma foto caem no hash exato
+            await self._remember(content_hash, receipt_data)
+            return receipt_data
+        
+        self.near_duplicates.add(phash, content_hash, content)
+        return None
+    
+    async def _extract_and_cache(self, content_hash: str, image_data: bytes, prepared=None) -> ReceiptData:
+        receipt_data = await self._extract(image_data, prepared)
+        await self._remember(content_hash, receipt_data)
+        return receipt_data
+    
+    async def _prepare(self, image_data: bytes):
+        # Pré-processamento é CPU-bound (Pillow): roda fora do event loop
+        try:
+            with PREPROCESS_SECONDS.time():
+                prepared = await asyncio.to_thread(self.preprocessor.prepare, image_data)
+        except Exception as e:
+            ERRORS.inc(stage="preprocess", type=type(e).__name__)
+            raise
+        if self.quality_gate is not None:
+            await self._check_quality(prepared)
+        return prepared
+    
+    async def _check_quality(self, prepared):
+        """Recusa (ImageQualityError) fotos que o modelo não conseguiria ler."""
+        with QUALITY_CHECK_SECONDS.time():
+            report = await asyncio.to_thread(self.quality_gate.check, prepared.data)
+        if report.rejection is None:
+            self.quality_stats["accepted"] += 1
+            QUALITY_CHECKS.inc(result="accepted", reason="")
+            return
+        rejected = self.quality_stats["rejected"]
+        rejected[report.rejection] = rejected.get(report.rejection, 0) + 1
+        QUALITY_CHECKS.inc(result="rejected", reason=report.rejection)
+        logger.info("foto_recusada", extra={
+            "reason": report.rejection,
+            "width": report.width,
+            "height": report.height,
+            "brightness": round(report.brightness, 1),
+            "glare_ratio": round(report.glare_ratio, 3),
+            "sharpness": round(report.sharpness, 1),
+            "text_density": round(report.text_density, 4),
+        })
+        raise ImageQualityError(report.rejection)
+    
+    async def _extract(self, image_data: bytes, prepared=None) -> ReceiptData:
+        await self._wait_ready()
+        if prepared is None:
+            prepared = await self._prepare(image_data)
+        
+        if self.vision_extractor is not None:
+            receipt_data = await self._run_tier("vision", self.vision_extractor, prepared)
+            if receipt_data is not None:
+                reason = self._vision_rejection(receipt_data)
+                if reason is None:
+                    self.tier_stats["vision"]["accepted"] += 1
+                    return receipt_data
+                self.tier_stats["vision"]["rejected"] += 1
+                self.escalations[reason] = self.escalations.get(reason, 0) + 1
+            else:
+                self.escalations["erro_ocr"] = self.escalations.get("erro_ocr", 0) + 1
+        
+        # Com a camada OCR já tentada e reprovada, o hedge só pode ser outro Gemini
+        receipt_data = await self._extract_hedged(prepared, allow_vision_hedge=self.vision_extractor is None)
+        # OCR (hedge ou fallback do circuito) ou o extrator da camada do modelo (gemini, replay, ...)
+        self.tier_stats["vision" if receipt_data.engine == "vision" else "gemini"]["accepted"] += 1
+        return receipt_data
+    
+    async def _extract_hedged(self, prepared, allow_vision_hedge: bool = True) -> ReceiptData:
+        """
+        Chama o Gemini com hedging e prazo total.
+        
+        Se não houver resposta em HEDGE_DELAY_MS, dispara uma segunda tentativa
+        em paralelo (outro Gemini ou OCR + parser, conforme HEDGE_STRATEGY);
+        o primeiro resultado válido vence e o outro é cancelado. Tudo respeita
+        EXTRACTION_DEADLINE_MS.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.EXTRACTION_DEADLINE_MS / 1000
+        hedge_delay = settings.HEDGE_DELAY_MS / 1000 if settings.HEDGE_DELAY_MS > 0 else None
+        
+        attempts = {
+            asyncio.create_task(self._run_tier("gemini", self.gemini_extractor, prepared, raise_errors=True)): "primary"
+        }
+        hedged = hedge_delay is None
+        last_error: Optional[BaseException] = None
+        
+        try:
+            while attempts:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.hedge_stats["deadline_exceeded"] += 1
+                    raise TimeoutError(
+                        f"Extração excedeu o prazo de {settings.EXTRACTION_DEADLINE_MS} ms"
+                    )
+                timeout = remaining if hedged else min(remaining, hedge_delay)
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in done:
+                    label = attempts.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    receipt_data = task.result()
+                    if receipt_data is None:
+                        continue
+                    if receipt_data.engine == "vision" and self._vision_rejection(receipt_data):
+                        continue
+                    if not hedged or label == "primary":
+                        self.hedge_stats["primary_wins"] += 1
+                    else:
+                        self.hedge_stats["hedge_wins"] += 1
+                    return receipt_data
+                
+                # Sem vencedor: dispara o hedge se o prazo dele passou ou se a
+                # tentativa principal já falhou
+                if not hedged and (not done or not attempts):
+                    hedged = True
+                    self.hedge_stats["hedged"] += 1
+                    attempts[asyncio.create_task(self._hedge_attempt(prepared, allow_vision_hedge))] = "hedge"
+            
+            raise last_error or ValueError("Nenhuma tentativa de extração retornou um resultado válido")
+        finally:
+            for task in attempts:
+                task.cancel()
+    
+    def _hedge_attempt(self, prepared, allow_vision_hedge: bool):
+        if settings.HEDGE_STRATEGY == "vision" and allow_vision_hedge and self.vision_extractor is not None:
+            return self._run_tier("vision", self.vision_extractor, prepared)
+        return self._run_tier("gemini", self.gemini_extractor, prepared, raise_errors=True)
+    
+    def _vision_rejection(self, receipt_data: ReceiptData) -> Optional[str]:
+        """Motivo para descartar o resultado do OCR + parser (None = aceito)."""
+        return check_consistency(
+            receipt_data,
+            min_items=settings.OCR_MIN_ITEMS,
+            total_tolerance=settings.OCR_TOTAL_TOLERANCE,
+            service_fee_rate=settings.OCR_SERVICE_FEE_RATE,
+        )
+    
+    async def _run_tier(self, engine: str, extractor, prepared, raise_errors: bool = False) -> Optional[ReceiptData]:
+        """Roda um extrator contabilizando tentativas, erros e tempo da camada."""
+        stats = self.tier_stats[engine]
+        stats["attempts"] += 1
+        start_time = time.time()
+        try:
+            async with self._extraction_slots:
+                MODEL_BYTES_SENT.inc(len(prepared.data), engine=engine)
+                with EXTRACTIONS_IN_FLIGHT.track(engine=engine), MODEL_CALL_SECONDS.time(engine=engine):
+                    receipt_data = await extractor.extract_async(prepared.data, prepared.mime_type)
+            self._record_usage(engine, receipt_data)
+            return receipt_data
+        except Exception as e:
+            stats["errors"] += 1
+            ERRORS.inc(stage="model", type=type(e).__name__)
+            if raise_errors:
+                raise
+            logger.warning("camada_falhou", extra={"engine": engine, "error": str(e)})
+            return None
+        finally:
+            stats["total_ms"] += int((time.time() - start_time) * 1000)
+    
+    def _record_usage(self, engine: str, receipt_data: ReceiptData):
+        """Soma itens e tokens gastos pelo modelo nos contadores da camada."""
+        ITEMS_EXTRACTED.inc(len(receipt_data.items), engine=engine)
+        if receipt_data.usage is not None:
+            stats = self.tier_stats[engine]
+            stats["input_tokens"] += receipt_data.usage.input_tokens
+            stats["cached_input_tokens"] += receipt_data.usage.cached_input_tokens
+            stats["output_tokens"] += receipt_data.usage.output_tokens + receipt_data.usage.thinking_tokens
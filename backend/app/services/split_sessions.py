@@ -0,0 +1,240 @@
+from app.models.receipt import ReceiptData
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+import asyncio
+import json
+import logging
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+# Sem 0/O, 1/I: o código é lido em voz alta na mesa
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+
+
+class SessionError(Exception):
+    """Operação inválida numa sessão (vira mensagem de erro para quem a enviou)."""
+
+
+class SessionLimitError(Exception):
+    """Limite de sessões ou de participantes atingido."""
+
+
+class Subscriber:
+    """
+    Uma conexão inscrita na sessão. As mensagens vão para uma fila limitada
+    drenada pela própria conexão; quem não acompanha é desconectado e
+    reconecta pedindo os deltas perdidos (ou um snapshot).
+    """
+
+    def __init__(self, participant_id: str, max_pending: int):
+        self.participant_id = participant_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def offer(self, message: str) -> bool:
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+
+class SplitSession:
+    """
+    Estado autoritativo da divisão de uma nota: quem está na mesa e quanto
+    de cada item cada um pegou. Toda mudança incrementa `version` e sai como
+    um delta pequeno; os últimos deltas ficam guardados para reconexões.
+    """
+
+    def __init__(self, code: str, receipt: ReceiptData, max_participants: int, history: int):
+        self.code = code
+        self.receipt = receipt
+        self.max_participants = max_participants
+        self.quantities = {item.id: item.quantity for item in receipt.items}
+        self.participants: Dict[str, str] = {}
+        # participante -> item -> quantidade
+        self.claims: Dict[str, Dict[str, int]] = {}
+        self.version = 0
+        self.subscribers: list[Subscriber] = []
+        self.last_activity = time.monotonic()
+        self._history: deque = deque(maxlen=history)
+        # Ids de quem saiu sem pegar nada: quem volta com ele mantém o mesmo id
+        self._departed: "OrderedDict[str, None]" = OrderedDict()
+
+    def join(self, name: str, participant_id: Optional[str] = None) -> str:
+        """Entra na sessão (ou volta, com o mesmo `participant_id`)."""
+        if participant_id in self.participants:
+            return participant_id
+        if len(self.participants) >= self.max_participants:
+            raise SessionLimitError(f"Sessão cheia ({self.max_participants} participantes)")
+        if participant_id in self._departed:
+            del self._departed[participant_id]
+        else:
+            participant_id = secrets.token_urlsafe(6)
+        self.participants[participant_id] = name
+        self.claims[participant_id] = {}
+        self._publish({"type": "join", "participant": {"id": participant_id, "name": name}})
+        return participant_id
+
+    def leave(self, participant_id: str) -> bool:
+        """
+        Tira da sessão quem desconectou sem pegar nada e sem outra conexão
+        aberta; quem tem itens fica, para a divisão continuar fechando.
+        """
+        if participant_id not in self.participants or self.claims[participant_id]:
+            return False
+        if any(subscriber.participant_id == participant_id for subscriber in self.subscribers):
+            return False
+        del self.participants[participant_id]
+        del self.claims[participant_id]
+        self._departed[participant_id] = None
+        while len(self._departed) > self.max_participants:
+            self._departed.popitem(last=False)
+        self._publish({"type": "leave", "participant": participant_id})
+        return True
+
+    def claim(self, participant_id: str, item_id: str, quantity: int):
+        """Define quanto do item o participante pegou (0 = devolve)."""
+        if item_id not in self.quantities:
+            raise SessionError("Item não existe nesta nota")
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 0:
+            raise SessionError("Quantidade inválida")
+        claims = self.claims[participant_id]
+        if claims.get(item_id, 0) == quantity:
+            return
+        taken_by_others = sum(
+            other.get(item_id, 0) for pid, other in self.claims.items() if pid != participant_id
+        )
+        if taken_by_others + quantity > self.quantities[item_id]:
+            raise SessionError(f"Só restam {self.quantities[item_id] - taken_by_others} deste item")
+        if quantity:
+            claims[item_id] = quantity
+        else:
+            claims.pop(item_id, None)
+        self._publish({"type": "claim", "participant": participant_id, "item_id": item_id, "quantity": quantity})
+
+    def snapshot(self) -> dict:
+        return {
+            "type": "snapshot",
+            "version": self.version,
+            "code": self.code,
+            "receipt": self.receipt.model_dump(exclude={"raw_text", "usage"}),
+            "participants": [{"id": pid, "name": name} for pid, name in self.participants.items()],
+            "claims": self.claims,
+        }
+
+    def deltas_since(self, version: int) -> Optional[list]:
+        """Deltas depois de `version`, ou None se já saíram do histórico (mande um snapshot)."""
+        if version == self.version:
+            return []
+        if not self._history or version < self._history[0][0] - 1 or version > self.version:
+            return None
+        return [message for v, message in self._history if v > version]
+
+    def subscribe(self, subscriber: Subscriber):
+        self.subscribers.append(subscriber)
+        self.last_activity = time.monotonic()
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        self.last_activity = time.monotonic()
+
+    def _publish(self, delta: dict):
+        self.version += 1
+        delta["version"] = self.version
+        # Serializado uma vez e compartilhado por todas as conexões
+        message = json.dumps(delta, separators=(",", ":"), ensure_ascii=False)
+        self._history.append((self.version, message))
+        self.last_activity = time.monotonic()
+        for subscriber in self.subscribers:
+            subscriber.offer(message)
+
+
+class SplitSessionManager:
+    """Sessões em memória, por código; as ociosas são removidas periodicamente."""
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_participants: int = 32,
+        idle_seconds: float = 3600,
+        max_pending: int = 64,
+        history: int = 256,
+    ):
+        self.max_sessions = max_sessions
+        self.max_participants = max_participants
+        self.idle_seconds = idle_seconds
+        self.max_pending = max_pending
+        self.history = history
+        self._sessions: "OrderedDict[str, SplitSession]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self.created = 0
+        self.evicted = 0
+        self.slow_disconnects = 0
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop(), name="split-session-sweeper")
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+
+    def create(self, receipt: ReceiptData) -> SplitSession:
+        if len(self._sessions) >= self.max_sessions:
+            self.evict_idle()
+            if len(self._sessions) >= self.max_sessions:
+                raise SessionLimitError("Muitas sessões abertas. Tente novamente em instantes.")
+        code = self._new_code()
+        session = SplitSession(code, receipt, self.max_participants, self.history)
+        self._sessions[code] = session
+        self.created += 1
+        return session
+
+    def get(self, code: str) -> Optional[SplitSession]:
+        return self._sessions.get(code.upper())
+
+    def subscriber(self, participant_id: str) -> Subscriber:
+        return Subscriber(participant_id, self.max_pending)
+
+    def evict_idle(self) -> int:
+        """Remove sessões sem conexões e sem atividade há `idle_seconds`."""
+        cutoff = time.monotonic() - self.idle_seconds
+        idle = [
+            code for code, session in self._sessions.items()
+            if not session.subscribers and session.last_activity <= cutoff
+        ]
+        for code in idle:
+            del self._sessions[code]
+        self.evicted += len(idle)
+        return len(idle)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "connections": sum(len(session.subscribers) for session in self._sessions.values()),
+            "created": self.created,
+            "evicted": self.evicted,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+    def _new_code(self) -> str:
+        while True:
+            code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+            if code not in self._sessions:
+                return code
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(min(60, self.idle_seconds))
+            evicted = self.evict_idle()
+            if evicted:
+                logger.info("sessoes_removidas", extra={"evicted": evicted, "remaining": len(self._sessions)})
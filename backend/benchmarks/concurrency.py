@@ -0,0 +1,115 @@
+"""
+Verifica que uploads paralelos não são serializados pelo event loop.
+
+Substitui o extrator do Gemini por um falso que dorme `--latency` segundos
+(simulando a chamada ao modelo) e dispara N uploads simultâneos contra o app
+em memória. Com o caminho assíncrono, o tempo total deve ficar próximo ao de
+um único upload, e o /health deve continuar respondendo durante a carga.
+
+Uso (a partir de backend/):
+    python -m benchmarks.concurrency --uploads 8 --latency 1.0
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "divup-bench-uploads"))
+# Todos os uploads saem do mesmo IP: o X-Device-Id separa os "celulares"
+os.environ.setdefault("CLIENT_KEY_BY_DEVICE_ID", "true")
+
+import httpx
+from PIL import Image
+
+from app.main import app
+from app.api.routes import receipt as receipt_routes
+from app.models.receipt import ReceiptData, ReceiptItem
+
+
+class SleepyExtractor:
+    """Extrator falso: espera `latency` segundos sem bloquear o loop."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def extract_async(self, image_data: bytes, mime_type: str = "image/jpeg") -> ReceiptData:
+        await asyncio.sleep(self.latency)
+        return ReceiptData(
+            raw_text="{}",
+            items=[ReceiptItem(name="CHOPP", quantity=2, unit_price=9.9, total_price=19.8)],
+            subtotal=19.8,
+            total=19.8,
+        )
+
+
+def random_jpeg() -> bytes:
+    # 640x480: acima da resolução mínima do filtro de qualidade
+    img = Image.frombytes("RGB", (640, 480), os.urandom(640 * 480 * 3))
+    out = io.BytesIO()
+    img.save(out, format="JPEG")
+    return out.getvalue()
+
+
+async def upload(client: httpx.AsyncClient) -> float:
+    # Conteúdo único por upload para não cair no cache nem na deduplicação
+    content = random_jpeg()
+    start = time.perf_counter()
+    response = await client.post(
+        "/api/v1/receipt/process",
+        files={"file": ("nota.jpg", content, "image/jpeg")},
+        # Cada upload vem de um celular diferente (limite por cliente fora da medição)
+        headers={"X-Device-Id": os.urandom(8).hex()},
+    )
+    response.raise_for_status()
+    assert response.json()["success"], response.text
+    return time.perf_counter() - start
+
+
+async def health_during_load(client: httpx.AsyncClient, duration: float) -> float:
+    """Maior latência observada no /health enquanto os uploads estão em voo."""
+    worst = 0.0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        (await client.get("/api/v1/receipt/health")).raise_for_status()
+        worst = max(worst, time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+    return worst
+
+
+async def main(uploads: int, latency: float) -> int:
+    receipt_routes.receipt_service.gemini_extractor = SleepyExtractor(latency)
+
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport não dispara o lifespan (workers da fila): roda manualmente
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        single = await upload(client)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(upload(client) for _ in range(uploads)),
+            health_during_load(client, latency * 0.8),
+        )
+        parallel = time.perf_counter() - start
+        worst_health = results[-1]
+
+    print(f"1 upload:           {single * 1000:8.1f} ms")
+    print(f"{uploads} uploads paralelos: {parallel * 1000:8.1f} ms")
+    print(f"pior /health:       {worst_health * 1000:8.1f} ms")
+
+    ok = parallel < single * 1.5 and worst_health < latency / 2
+    print("✅ OK: uploads concorrentes" if ok else "❌ FALHA: uploads foram serializados")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.uploads, args.latency)))
@@ -0,0 +1,270 @@
+"""
+Corpus sintético de notas fiscais (texto de OCR) para benchmarks e golden tests.
+
+As notas misturam os formatos que o ReceiptParser reconhece (tabular, preço
+na linha seguinte, "R$ X x N", total isolado, nomes fragmentados) com o ruído
+típico de cabeçalho/rodapé e unidades soltas. Tudo é determinístico por seed.
+
+`synthetic_layout` gera a nota como o Vision a devolve (palavras com caixas,
+foto levemente torta) junto com o gabarito de itens e total.
+"""
+import math
+import random
+
+HEADER_LINES = [
+    "RESTAURANTE BOM SABOR LTDA",
+    "CNPJ: 12.345.678/0001-90",
+    "CUPOM FISCAL ELETRONICO",
+    "MESA 12 - 4 PESSOAS",
+    "Operador: MARIA",
+    "DATA: 23/12/2025 21:43",
+    "PRODUTO QTDE PRECO VALOR",
+    "Pedido 8841",
+]
+
+FOOTER_LINES = [
+    "SUBTOTAL 323,70",
+    "SERVICO 10% 32,37",
+    "TOTAL A PAGAR R$ 356,07",
+    "PAGO CARTAO",
+    "www.bomsabor.com.br",
+    "Permanencia media 1h20",
+    "OBRIGADO PELA PREFERENCIA",
+]
+
+ITEM_NAMES = [
+    "CHOPP PILSEN 300ML",
+    "PREMIUM LAGER",
+    "BATATA FRITA GRANDE",
+    "0103 COMBINADO SALMAO",
+    "0207 TEMAKI SKIN",
+    "AGUA C/ GAS 500ML",
+    "REFRIGERANTE LATA",
+    "PICANHA NA CHAPA",
+    "CAIPIRINHA LIMAO",
+    "PASTEL DE QUEIJO",
+    "FILE A PARMEGIANA",
+    "CLASSIC BURGUER",
+    "SUCO DE LARANJA 400ML",
+    "PETIT GATEAU",
+    "ISCA DE PEIXE",
+]
+
+NOISE_LINES = ["HH", "ML", "300ML HH", "LIMAO HH", "Duo Espetos", "002", "35.90 35.90", "UN", "8.00 8.00"]
+
+
+def _price(rng: random.Random, low: float = 4, high: float = 120) -> float:
+    return round(rng.uniform(low, high), 2)
+
+
+def _fmt(value: float, comma: bool) -> str:
+    text = f"{value:.2f}"
+    return text.replace(".", ",") if comma else text
+
+
+def _item_block(rng: random.Random) -> list:
+    """Um item em um dos formatos aceitos pelo parser (ou uma variação ruidosa)."""
+    name = rng.choice(ITEM_NAMES)
+    qty = rng.randint(1, 6)
+    unit = _price(rng)
+    total = round(unit * qty, 2)
+    comma = rng.random() < 0.5
+    kind = rng.randrange(8)
+
+    if kind == 0:  # tabular na mesma linha
+        return [f"{name}    {qty}    {_fmt(unit, comma)}   {_fmt(total, comma)}"]
+    if kind == 1:  # qtd preço total na linha seguinte
+        return [name, f"{qty} {_fmt(unit, comma)} {_fmt(total, comma)}"]
+    if kind == 2:  # preço e total na linha seguinte
+        return [name, f"{_fmt(unit, comma)} {_fmt(total, comma)}"]
+    if kind == 3:  # cálculo explícito
+        return [name, f"R$ {_fmt(unit, True)} X {qty} = {_fmt(total, True)}"]
+    if kind == 4:  # "R$ 12,90 X" + total logo abaixo
+        return [name, f"R$ {_fmt(unit, True)} X", _fmt(total, True)]
+    if kind == 5:  # nome, sufixo e total isolado mais abaixo
+        return [name, rng.choice(["HH", "UN", "LATA"]), _fmt(total, comma)]
+    if kind == 6:  # nome fragmentado em duas linhas
+        first, _, rest = name.partition(" ")
+        return [first, rest or "ESPECIAL", f"{_fmt(unit, comma)} {_fmt(total, comma)}"]
+    # item sem preço reconhecível seguido de ruído
+    return [name, rng.choice(NOISE_LINES)]
+
+
+def synthetic_receipt(n_lines: int, seed: int = 0) -> str:
+    """Gera uma nota com aproximadamente `n_lines` linhas."""
+    rng = random.Random(seed)
+    lines = list(rng.sample(HEADER_LINES, k=min(4, len(HEADER_LINES))))
+    while len(lines) < max(n_lines - 3, 1):
+        if rng.random() < 0.12:
+            lines.append(rng.choice(NOISE_LINES))
+        else:
+            lines.extend(_item_block(rng))
+        if rng.random() < 0.05:
+            lines.append("")
+    lines.extend(rng.sample(FOOTER_LINES, k=3))
+    return "\n".join(lines[:n_lines] if n_lines >= 10 else lines)
+
+
+# Casos escritos à mão, cobrindo cada ramo do parser
+HANDCRAFTED = {
+    "restaurante_tabular": """RESTAURANTE SABOR
+CNPJ 00.000.000/0001-00
+PREMIUM LAGER    10    6.90   69.00
+BATATA FRITA      1   32,00   32,00
+TOTAL A PAGAR R$ 101,00""",
+    "lookahead_calc": """BAR DO ZE
+0103 COMBINADO SALMAO
+R$ 94,90 X 1 = 94,90
+CAIPIRINHA LIMAO
+HH
+R$ 18,00 X 2 = 36,00
+TOTAL 130,90""",
+    "x_only_total": """PICANHA NA CHAPA
+R$ 89,90 X
+179,80
+AGUA MINERAL
+R$ 5,00 X
+nada
+10,00
+TOTAL: 189,80""",
+    "fragmentado": """CLASSIC
+BURGUER DUPLO
+9.99 19.98
+SUCO NATURAL
+2 8.00 16.00
+300ML HH
+Duo Espetos
+ESPETO DE FRANGO
+HH
+25,80
+TOTAL 61,78""",
+    "ruido_puro": """CUPOM FISCAL
+323,70
+35.90 35.90
+002
+www.site.com
+obrigado""",
+    "sem_total": """CHOPP PILSEN
+2 9,90 19,80
+PASTEL DE QUEIJO
+12,00 12,00""",
+}
+
+
+def golden_cases() -> dict:
+    """Todos os casos do golden corpus: manuais + sintéticos de vários tamanhos."""
+    cases = dict(HANDCRAFTED)
+    for n_lines in (10, 100, 1000):
+        for seed in range(3):
+            cases[f"synthetic_{n_lines}_{seed}"] = synthetic_receipt(n_lines, seed)
+    return cases
+
+
+# Nota em colunas, em caracteres de fonte monoespaçada: nome à esquerda e
+# quantidade, unitário e total alinhados à direita
+_QTY_END, _UNIT_END, _TOTAL_END = 34, 44, 54
+_CHAR_WIDTH, _ROW_PITCH, _WORD_HEIGHT, _MARGIN = 12, 30, 20, 40
+DESCRIPTION_LINES = ["300ML HH", "LIMAO HH", "Duo Espetos", "HH"]
+
+
+def _strip_code(name: str) -> str:
+    first, _, rest = name.partition(" ")
+    return rest if first.isdigit() and rest else name
+
+
+def _layout_item(rng: random.Random, number: int, comma: bool) -> tuple:
+    """(linhas, gabarito): cada linha é uma lista de (texto, coluna inicial)."""
+    name = rng.choice(ITEM_NAMES)
+    kind = rng.randrange(5)
+    qty = 1 if kind == 3 else rng.randint(1, 6)
+    unit = _price(rng)
+    total = round(unit * qty, 2)
+    numbers = [(str(qty), _QTY_END - len(str(qty))),
+               (_fmt(unit, comma), _UNIT_END - len(_fmt(unit, comma))),
+               (_fmt(total, comma), _TOTAL_END - len(_fmt(total, comma)))]
+
+    if kind == 0:  # tudo na mesma linha
+        rows = [[(name, 0)] + numbers]
+    elif kind == 1:  # nome longo: valores na linha de baixo
+        rows = [[(name, 0)], numbers]
+    elif kind == 2:  # NFC-e: "001 NOME" / "2 UN X 12,90      25,80"
+        rows = [[(f"{number:03d}", 0), (name, 4)],
+                [(f"{qty} UN X {_fmt(unit, comma)}", 4), numbers[2]]]
+    elif kind == 3:  # só o total
+        rows = [[(name, 0), numbers[2]]]
+    else:  # linha de descrição abaixo do item
+        rows = [[(name, 0)] + numbers, [(rng.choice(DESCRIPTION_LINES), 2)]]
+    return rows, (_strip_code(name), qty, total)
+
+
+def _words(rows: list, rng: random.Random) -> list:
+    """Palavras com polígono (4 vértices, sentido horário), girado pelo ângulo da foto."""
+    angle = math.radians(rng.uniform(-2, 2))
+    cos, sin = math.cos(angle), math.sin(angle)
+    words = []
+    for r, row in enumerate(rows):
+        for text, column in row:
+            for offset, word in _word_offsets(text):
+                x0 = _MARGIN + (column + offset) * _CHAR_WIDTH + rng.uniform(-2, 2)
+                y0 = _MARGIN + r * _ROW_PITCH + rng.uniform(-2, 2)
+                x1, y1 = x0 + len(word) * _CHAR_WIDTH, y0 + _WORD_HEIGHT
+                corners = ((x0, y0), (x1, y0), (x1, y1), (x0, y1))
+                words.append((word, [(x * cos - y * sin, x * sin + y * cos) for x, y in corners]))
+    return words
+
+
+def _word_offsets(text: str) -> list:
+    offsets, position = [], 0
+    for word in text.split(" "):
+        if word:
+            offsets.append((position, word))
+        position += len(word) + 1
+    return offsets
+
+
+def synthetic_layout(n_rows: int, seed: int = 0) -> dict:
+    """
+    Nota tabular com aproximadamente `n_rows` linhas:
+    - words: (texto, polígono) de cada palavra, na ordem em que o Vision devolve;
+    - lines: texto corrido linha a linha (o melhor caso para o ReceiptParser);
+    - blocks: texto corrido como o Vision costuma montar colunas afastadas
+      (nomes de um parágrafo e depois os valores);
+    - items / total: o gabarito.
+    """
+    rng = random.Random(seed)
+    comma = rng.random() < 0.7
+    rows = [[(line, 0)] for line in rng.sample(HEADER_LINES, k=4)]
+    item_rows, items = [], []
+    while len(rows) + len(item_rows) < max(n_rows - 3, 5):
+        block, truth = _layout_item(rng, len(items) + 1, comma)
+        item_rows.extend(block)
+        items.append(truth)
+
+    subtotal = round(sum(total for _, _, total in items), 2)
+    service = round(subtotal * 0.10, 2)
+    total = round(subtotal + service, 2)
+    footer = []
+    for label, value in (("SUBTOTAL", subtotal), ("SERVICO 10%", service), ("TOTAL A PAGAR R$", total)):
+        text = _fmt(value, comma)
+        footer.append([(label, 0), (text, _TOTAL_END - len(text))])
+
+    def text_of(row, columns=lambda column: True) -> str:
+        return " ".join(text for text, column in row if columns(column))
+
+    blocks, start = [], 0
+    while start < len(item_rows):
+        paragraph = item_rows[start:start + rng.randint(2, 6)]
+        blocks.extend(text_of(row, lambda column: column < 30) for row in paragraph)
+        blocks.extend(text_of(row, lambda column: column >= 30) for row in paragraph)
+        start += len(paragraph)
+    all_rows = rows + item_rows + footer
+
+    return {
+        "words": _words(all_rows, rng),
+        "lines": "\n".join(text_of(row) for row in all_rows),
+        "blocks": "\n".join(
+            [text_of(row) for row in rows] + [line for line in blocks if line] + [text_of(row) for row in footer]
+        ),
+        "items": items,
+        "total": total,
+    }
@@ -0,0 +1,103 @@
+"""
+Casos de imagem que o pré-processamento e a checagem de qualidade precisam
+acertar, rodando o mesmo caminho do serviço (ImagePreprocessor.prepare e
+ImageQualityGate.check) sobre imagens sintéticas:
+
+1. Foto de celular comum -> aceita
+2. Scan/print limpo de nota em papel branco (PNG e JPEG) -> aceito; o papel
+   estoura (>= 250) quase inteiro, mas tem texto
+3. Flash que apagou a nota (bloco estourado sem letras) -> "estourada"
+4. Foto no escuro -> "escura"
+5. PNG transparente com texto preto (RGBA e paleta) -> fundo branco na imagem
+   preparada, e aceito (sem o alpha, o fundo viraria preto)
+
+Uso (a partir de backend/):
+    python -m benchmarks.image_cases
+"""
+import io
+import sys
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+
+from app.core.config import settings
+from app.core.ocr.preprocessing import ImagePreprocessor
+from benchmarks.preprocess import quality_gate, synthetic_receipt_photo
+
+LINE = "CHOPP PILSEN 300ML      2 x 9,90      19,80"
+
+
+def encode(img: Image.Image, format: str = "PNG") -> bytes:
+    out = io.BytesIO()
+    img.save(out, format=format)
+    return out.getvalue()
+
+
+def clean_scan(width: int = 1200, height: int = 2400) -> Image.Image:
+    """Nota em papel branco puro, texto preto nítido (scan, print de tela)."""
+    img = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=28)
+    for row in range(80, height - 80, 48):
+        draw.text((80, row), f"{row:04d} {LINE}", font=font, fill=(0, 0, 0))
+    return img
+
+
+def transparent_png(mode: str) -> bytes:
+    """Texto preto sobre fundo transparente (print de tela, nota exportada)."""
+    img = Image.new("RGBA", (1200, 2400), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=28)
+    for row in range(80, 2320, 48):
+        draw.text((80, row), f"{row:04d} {LINE}", font=font, fill=(0, 0, 0, 255))
+    if mode == "P":
+        img = img.quantize(colors=16, method=Image.Quantize.FASTOCTREE)
+    return encode(img)
+
+
+def flash_glare() -> Image.Image:
+    """Foto de nota com o flash estourando o papel inteiro: só a borda da mesa sobra."""
+    img = Image.open(io.BytesIO(synthetic_receipt_photo(2000, 1500))).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, img.width, img.height * 19 // 20), fill=(255, 255, 255))
+    return img
+
+
+def main() -> int:
+    preprocessor = ImagePreprocessor(
+        max_dimension=settings.IMAGE_MAX_DIMENSION,
+        grayscale=settings.IMAGE_GRAYSCALE,
+        jpeg_quality=settings.IMAGE_JPEG_QUALITY,
+    )
+    gate = quality_gate()
+    dark = ImageEnhance.Brightness(Image.open(io.BytesIO(synthetic_receipt_photo(2000, 1500)))).enhance(0.1)
+
+    cases = [
+        ("foto de celular", synthetic_receipt_photo(), None),
+        ("scan limpo em papel branco (PNG)", encode(clean_scan()), None),
+        ("scan limpo em papel branco (JPEG)", encode(clean_scan(), "JPEG"), None),
+        ("flash apagou a nota", encode(flash_glare(), "JPEG"), "estourada"),
+        ("foto no escuro", encode(dark, "JPEG"), "escura"),
+        ("PNG transparente (RGBA)", transparent_png("RGBA"), None),
+        ("PNG transparente (paleta)", transparent_png("P"), None),
+    ]
+
+    failed = 0
+    for name, image_data, expected in cases:
+        prepared = preprocessor.prepare(image_data).data
+        report = gate.check(prepared)
+        ok = report.rejection == expected
+        if "transparente" in name:
+            # Canto sem texto: era transparente, tem que chegar branco ao modelo
+            corner = Image.open(io.BytesIO(prepared)).convert("L").getpixel((5, 5))
+            ok = ok and corner >= 245
+        failed += not ok
+        print(
+            f"{'✅' if ok else '❌'} {name:<36} -> {report.rejection or 'aceita':<10} "
+            f"(estourado {report.clipped_ratio:.0%}, reflexo {report.glare_ratio:.0%}, "
+            f"texto {report.text_density:.3f})"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
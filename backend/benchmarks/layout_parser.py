@@ -0,0 +1,141 @@
+"""
+LayoutParser (caixas das palavras) vs. ReceiptParser (texto corrido + lookahead).
+
+Sobre as mesmas notas tabulares sintéticas (corpus.synthetic_layout), mede:
+- acerto: itens (nome, quantidade, total) batendo com o gabarito, total da
+  nota correto e quantas notas a camada OCR aceitaria (check_consistency) —
+  e quantas dessas estariam erradas (iriam para o usuário sem o Gemini);
+- tempo de parse (mediana) para notas de 10, 100 e 1000 linhas, também por
+  item extraído (quem acha mais itens cria mais ReceiptItem).
+
+O ReceiptParser recebe o texto em duas versões: linha a linha (melhor caso) e
+em blocos, como o Vision monta colunas afastadas. O LayoutParser recebe as
+palavras com polígono, já convertidas em Word (a conversão é medida à parte).
+
+Uso (a partir de backend/):
+    python -m benchmarks.layout_parser
+    python -m benchmarks.layout_parser --receipts 500 --rows 40 --json
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+
+from app.core.config import settings
+from app.core.ocr.consistency import check_consistency
+from app.core.ocr.layout import LayoutParser, Word
+from app.core.ocr.parser import ReceiptParser
+from benchmarks.corpus import synthetic_layout
+
+
+def words_of(case: dict) -> list:
+    return [Word.from_polygon(text, points) for text, points in case["words"]]
+
+
+def score(receipt, case: dict) -> dict:
+    expected = Counter((name, qty, round(total, 2)) for name, qty, total in case["items"])
+    found = Counter(
+        (" ".join(item.name.split()), item.quantity, round(item.total_price, 2)) for item in receipt.items
+    )
+    matched = sum((expected & found).values())
+    correct = found == expected and abs(receipt.total - case["total"]) < 0.005
+    accepted = check_consistency(
+        receipt,
+        min_items=settings.OCR_MIN_ITEMS,
+        total_tolerance=settings.OCR_TOTAL_TOLERANCE,
+        service_fee_rate=settings.OCR_SERVICE_FEE_RATE,
+    ) is None
+    return {
+        "matched": matched,
+        "expected": sum(expected.values()),
+        "found": sum(found.values()),
+        "total_ok": abs(receipt.total - case["total"]) < 0.005,
+        "correct": correct,
+        "accepted": accepted,
+        "accepted_wrong": accepted and not correct,
+    }
+
+
+def accuracy(parse, cases: list) -> dict:
+    scores = [score(parse(case), case) for case in cases]
+    expected = sum(s["expected"] for s in scores)
+    found = sum(s["found"] for s in scores)
+    matched = sum(s["matched"] for s in scores)
+    return {
+        "item_recall": round(matched / max(expected, 1), 4),
+        "item_precision": round(matched / max(found, 1), 4),
+        "total_correct": round(sum(s["total_ok"] for s in scores) / len(scores), 4),
+        "receipts_correct": round(sum(s["correct"] for s in scores) / len(scores), 4),
+        "ocr_accepted": round(sum(s["accepted"] for s in scores) / len(scores), 4),
+        "ocr_accepted_wrong": round(sum(s["accepted_wrong"] for s in scores) / len(scores), 4),
+    }
+
+
+def median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--receipts", type=int, default=300)
+    arg_parser.add_argument("--rows", type=int, default=40, help="Linhas por nota no teste de acerto")
+    arg_parser.add_argument("--repeat", type=int, default=30)
+    arg_parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = arg_parser.parse_args()
+
+    text_parser = ReceiptParser()
+    layout_parser = LayoutParser()
+    parsers = {
+        "receipt_parser[linhas]": lambda case: text_parser.parse(case["lines"]),
+        "receipt_parser[blocos]": lambda case: text_parser.parse(case["blocks"]),
+        # Como no extrator: o texto corrido do Vision vai junto (raw_text da nota)
+        "layout_parser": lambda case: layout_parser.parse(case["words"], raw_text=case["blocks"]),
+    }
+
+    cases = [synthetic_layout(args.rows, seed=seed) for seed in range(args.receipts)]
+    for case in cases:
+        case["words"] = words_of(case)
+    results = {"accuracy": {name: accuracy(parse, cases) for name, parse in parsers.items()}, "timing_ms": {}}
+
+    for n_rows in (10, 100, 1000):
+        case = synthetic_layout(n_rows, seed=n_rows)
+        raw_words = case["words"]
+        case["words"] = words_of(case)
+        timing = {}
+        for name, parse in parsers.items():
+            ms = median_ms(lambda parse=parse: parse(case), args.repeat)
+            items = len(parse(case).items)
+            timing[name] = {"ms": ms, "items": items, "us_per_item": round(ms * 1000 / max(items, 1), 1)}
+        timing["word_from_polygon"] = {"ms": median_ms(lambda: words_of({"words": raw_words}), args.repeat)}
+        results["timing_ms"][f"{n_rows} linhas"] = timing
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"Acerto em {args.receipts} notas de ~{args.rows} linhas")
+    print(f"  {'parser':<24} {'recall':>7} {'precisão':>9} {'total ok':>9} {'nota ok':>8} {'aceita':>7} {'aceita errada':>14}")
+    for name, result in results["accuracy"].items():
+        print(
+            f"  {name:<24} {result['item_recall']:>7.1%} {result['item_precision']:>9.1%} "
+            f"{result['total_correct']:>9.1%} {result['receipts_correct']:>8.1%} "
+            f"{result['ocr_accepted']:>7.1%} {result['ocr_accepted_wrong']:>14.1%}"
+        )
+    print("Tempo de parse (mediana)")
+    for size, timing in results["timing_ms"].items():
+        print(f"  {size}")
+        for name, result in timing.items():
+            per_item = f"   {result['items']:>4} itens, {result['us_per_item']:>6.1f} µs/item" if "items" in result else ""
+            print(f"    {name:<24} {result['ms']:>8.3f} ms{per_item}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
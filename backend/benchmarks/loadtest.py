@@ -0,0 +1,173 @@
+"""
+Gerador de carga para POST /api/v1/receipt/process.
+
+Dispara requisições em malha aberta a uma taxa alvo (--rps), com no máximo
+--concurrency em voo, e reporta vazão, latência p50/p95/p99 e taxa de erro.
+Com várias taxas (--rps 1,2,4,8) roda um degrau por taxa, o que mostra o
+joelho da curva (onde a latência dispara e a vazão para de acompanhar).
+
+Para não gastar quota, suba o servidor com o extrator de replay:
+
+    EXTRACTOR_ENGINE=replay REPLAY_FIXTURE_DIR=fixtures/replay \\
+    GEMINI_RATE_LIMIT_RPM=100000 CLIENT_KEY_BY_DEVICE_ID=true \\
+    uvicorn app.main:app --port 8001
+
+(as fixtures são gravadas antes com EXTRACTOR_ENGINE=record e fotos reais;
+o rate limit alto tira a quota da medição de capacidade, e o X-Device-Id de
+cada requisição, com CLIENT_KEY_BY_DEVICE_ID, tira o limite por cliente).
+
+Uso (a partir de backend/):
+    python -m benchmarks.loadtest --rps 1,2,4,8 --duration 30 --concurrency 32
+    python -m benchmarks.loadtest --images ~/notas --no-bust-cache
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+from PIL import Image
+
+
+def synthetic_jpeg() -> bytes:
+    # 640x480: acima da resolução mínima do filtro de qualidade
+    img = Image.frombytes("RGB", (640, 480), os.urandom(640 * 480 * 3))
+    out = io.BytesIO()
+    img.save(out, format="JPEG")
+    return out.getvalue()
+
+
+def load_images(directory: str) -> list:
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() in (".jpg", ".jpeg", ".png"):
+            with open(os.path.join(directory, name), "rb") as f:
+                images.append(f.read())
+    if not images:
+        raise SystemExit(f"Nenhuma imagem JPG/PNG em {directory}")
+    return images
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_step(client: httpx.AsyncClient, images: list, rps: float, duration: float,
+                   concurrency: int, bust_cache: bool) -> dict:
+    """Um degrau de carga: `rps` requisições/s por `duration` segundos."""
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], {}
+    dropped = 0
+
+    async def one(index: int):
+        content = images[index % len(images)]
+        if bust_cache:
+            # Bytes após o fim do JPEG/PNG: hash (e cache) diferentes, mesma imagem decodificada
+            content += os.urandom(16)
+        start = time.perf_counter()
+        try:
+            response = await client.post(
+                "/api/v1/receipt/process",
+                files={"file": ("nota.jpg", content, "image/jpeg")},
+                # Um "celular" por requisição: mede o servidor, não o limite por cliente
+                headers={"X-Device-Id": f"loadtest-{index}"},
+            )
+            if response.status_code != 200:
+                kind = f"http_{response.status_code}"
+            elif not response.json().get("success"):
+                kind = "success_false"
+            else:
+                kind = None
+        except httpx.HTTPError as e:
+            kind = type(e).__name__
+        finally:
+            slots.release()
+        if kind is None:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors[kind] = errors.get(kind, 0) + 1
+
+    tasks = []
+    interval = 1 / rps
+    start = time.perf_counter()
+    for index in range(int(rps * duration)):
+        # Malha aberta: a próxima sai no horário, mesmo que as anteriores demorem
+        await asyncio.sleep(max(0.0, start + index * interval - time.perf_counter()))
+        if slots.locked():
+            # Concorrência máxima atingida: conta como descartada em vez de atrasar o relógio
+            dropped += 1
+            continue
+        await slots.acquire()
+        tasks.append(asyncio.create_task(one(index)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    sent = len(tasks)
+    failed = sum(errors.values())
+    return {
+        "target_rps": rps,
+        "sent": sent,
+        "dropped": dropped,
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": round(failed / sent, 4) if sent else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+    }
+
+
+async def main(args) -> int:
+    images = load_images(args.images) if args.images else [synthetic_jpeg() for _ in range(16)]
+    rates = [float(rate) for rate in args.rps.split(",")]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        (await client.get("/api/v1/receipt/health")).raise_for_status()
+        steps = []
+        for rps in rates:
+            step = await run_step(client, images, rps, args.duration, args.concurrency, args.bust_cache)
+            steps.append(step)
+            latency = step["latency_ms"]
+            print(
+                f"{rps:>7.1f} rps alvo | {step['throughput_rps']:>7.2f} rps | "
+                f"p50 {latency['p50']:>8.1f} ms | p95 {latency['p95']:>8.1f} ms | "
+                f"p99 {latency['p99']:>8.1f} ms | erro {step['error_rate']:.1%} | "
+                f"descartadas {step['dropped']}",
+                file=sys.stderr,
+            )
+
+    report = {"url": args.url, "concurrency": args.concurrency, "duration_s": args.duration, "steps": steps}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--url", default="http://localhost:8001")
+    arg_parser.add_argument("--rps", default="2", help="Taxa alvo; lista separada por vírgula = um degrau por taxa")
+    arg_parser.add_argument("--duration", type=float, default=30, help="Segundos por degrau")
+    arg_parser.add_argument("--concurrency", type=int, default=32, help="Máximo de requisições em voo")
+    arg_parser.add_argument("--timeout", type=float, default=120)
+    arg_parser.add_argument("--images", help="Pasta com fotos de notas (padrão: imagens sintéticas)")
+    arg_parser.add_argument("--no-bust-cache", dest="bust_cache", action="store_false",
+                            help="Reenvia os mesmos bytes (mede o cache em vez do pipeline)")
+    arg_parser.add_argument("--output", help="Arquivo JSON para gravar o relatório")
+    sys.exit(asyncio.run(main(arg_parser.parse_args())))
@@ -0,0 +1,68 @@
+"""
+Casos que o merge de várias fotos (POST /receipt/process/batch?merge=true)
+precisa acertar:
+
+1. Nota longa em duas fotos que se sobrepõem -> itens repetidos removidos,
+   total da última foto
+2. Fotos do mesmo motor -> engine dele; de motores diferentes -> "mixed"
+3. Tokens -> soma do gasto em cada foto (fotos sem usage não contam);
+   nenhuma com usage -> None
+
+Uso (a partir de backend/):
+    python -m benchmarks.merge_cases
+"""
+import sys
+
+from app.core.ocr.merge import merge_receipts
+from app.models.receipt import ReceiptData, ReceiptItem, TokenUsage
+
+
+def item(name: str, total: float) -> ReceiptItem:
+    return ReceiptItem(name=name, quantity=1, unit_price=total, total_price=total)
+
+
+def photo(names: list, total: float, engine: str, usage: TokenUsage = None) -> ReceiptData:
+    items = [item(name, price) for name, price in names]
+    return ReceiptData(
+        raw_text="", items=items, subtotal=sum(i.total_price for i in items), total=total,
+        engine=engine, usage=usage,
+    )
+
+
+def main() -> int:
+    top = [("CHOPP", 12.9), ("FRITAS", 38.0), ("AGUA", 5.5)]
+    bottom = [("AGUA", 5.5), ("PUDIM", 14.0)]
+    first_usage = TokenUsage(input_tokens=1200, output_tokens=300, thinking_tokens=40, cached_input_tokens=800)
+    second_usage = TokenUsage(input_tokens=1100, output_tokens=250, thinking_tokens=0, cached_input_tokens=800)
+
+    same_engine = merge_receipts([
+        photo(top, 56.4, "gemini", first_usage),
+        photo(bottom, 70.4, "gemini", second_usage),
+    ])
+    mixed = merge_receipts([
+        photo(top, 56.4, "vision"),
+        photo(bottom, 70.4, "gemini", second_usage),
+    ])
+    no_usage = merge_receipts([photo(top, 56.4, "vision"), photo(bottom, 70.4, "vision")])
+
+    checks = [
+        ("sobreposição removida", [i.name for i in same_engine.items] == ["CHOPP", "FRITAS", "AGUA", "PUDIM"]),
+        ("total da última foto", same_engine.total == 70.4),
+        ("mesmo motor mantém o engine", same_engine.engine == "gemini"),
+        ("motores diferentes viram \"mixed\"", mixed.engine == "mixed"),
+        ("tokens somados", same_engine.usage == TokenUsage(
+            input_tokens=2300, output_tokens=550, thinking_tokens=40, cached_input_tokens=1600,
+        )),
+        ("fotos sem usage não contam", mixed.usage == second_usage),
+        ("sem usage em nenhuma foto -> None", no_usage.usage is None and no_usage.engine == "vision"),
+    ]
+
+    failed = 0
+    for name, ok in checks:
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
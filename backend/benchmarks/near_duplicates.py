@@ -0,0 +1,214 @@
+"""
+Quase-duplicatas: falsos positivos entre notas do mesmo modelo e latência do índice.
+
+Gera --receipts notas sintéticas do mesmo restaurante (mesmo cabeçalho,
+fonte e enquadramento; itens e quantidade de linhas diferentes), passa pelo
+pré-processamento do serviço e compara, par a par:
+- notas diferentes: quantas o pHash sozinho casaria (a até --max-distance
+  bits) e quantas passam também pela máscara de tinta (falsos positivos);
+- cópias da mesma nota (redimensionada, recortada, mais escura, todas
+  recomprimidas): quantas são reconhecidas;
+- a mesma nota com a quantidade de um item trocada: o caso que nenhuma das
+  duas checagens separa (motivo de NEAR_DUPLICATE_ENABLED vir desligado).
+
+Depois indexa --entries hashes aleatórios e mede, em µs por consulta, hit,
+miss e a varredura linear que o índice evita; e o tempo do image_fingerprint
+sobre a foto sintética de celular (4032x3024) já pré-processada.
+
+Uso (a partir de backend/):
+    python -m benchmarks.near_duplicates
+    python -m benchmarks.near_duplicates --receipts 40 --max-distance 4 --json
+"""
+import argparse
+import io
+import itertools
+import json
+import random
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+
+from app.core.config import settings
+from app.core.near_duplicates import HASH_BITS, NearDuplicateIndex, content_distance, image_fingerprint
+from app.core.ocr.preprocessing import ImagePreprocessor
+from benchmarks.corpus import ITEM_NAMES
+from benchmarks.loadtest import percentile
+from benchmarks.preprocess import synthetic_receipt_photo
+
+HEADER = ("RESTAURANTE BOM SABOR LTDA", "CNPJ: 12.345.678/0001-90", "MESA 12", "ITEM              QTD    TOTAL")
+
+
+def template_receipt_photo(seed: int, changed_line: int = None) -> bytes:
+    """Nota do modelo fixo; `changed_line` soma 1 à quantidade daquele item."""
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=26)
+    img = Image.new("RGB", (1200, 1800), (70, 58, 45))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((180, 80, 1020, 1720), fill=(238, 234, 226))
+    y = 120
+    for line in HEADER:
+        draw.text((220, y), line, font=font, fill=(25, 25, 25))
+        y += 44
+    total = 0.0
+    for index in range(rng.randint(8, 16)):
+        name = rng.choice(ITEM_NAMES)
+        qty = rng.randint(1, 4) + (1 if index == changed_line else 0)
+        price = round(rng.uniform(5, 90), 2)
+        total += qty * price
+        line = f"{name[:22]:<22} {qty:>2} {qty * price:>8.2f}".replace(".", ",")
+        draw.text((220, y), line, font=font, fill=(25, 25, 25))
+        y += 44
+    draw.text((220, y + 30), f"TOTAL R$ {total:.2f}".replace(".", ","), font=font, fill=(25, 25, 25))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+def copies(image_data: bytes) -> list:
+    """A mesma foto reenviada: reduzida, recortada nas bordas e mais escura (recomprimidas)."""
+    img = Image.open(io.BytesIO(image_data))
+    width, height = img.size
+    variants = [
+        img.resize((width * 2 // 3, height * 2 // 3)),
+        img.crop((15, 20, width - 10, height - 25)),
+        ImageEnhance.Brightness(img).enhance(0.85),
+    ]
+    encoded = []
+    for variant in variants:
+        out = io.BytesIO()
+        variant.save(out, format="JPEG", quality=70)
+        encoded.append(out.getvalue())
+    return encoded
+
+
+def timed_us(fn, args_list: list) -> list:
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def summary(samples: list) -> dict:
+    return {
+        "p50_us": round(percentile(samples, 50), 1),
+        "p99_us": round(percentile(samples, 99), 1),
+        "mean_us": round(statistics.fmean(samples), 1),
+    }
+
+
+def matching(args, pairs: list) -> dict:
+    """Fração dos pares que casariam só pelo pHash e pelo pHash + máscara de tinta."""
+    by_hash = [(a[0] ^ b[0]).bit_count() <= args.max_distance for a, b in pairs]
+    confirmed = [
+        hit and content_distance(a[1], b[1]) <= args.max_content_distance
+        for hit, (a, b) in zip(by_hash, pairs)
+    ]
+    return {
+        "pairs": len(pairs),
+        "phash_only": round(sum(by_hash) / len(pairs), 4),
+        "phash_and_content": round(sum(confirmed) / len(pairs), 4),
+    }
+
+
+def accuracy(args, preprocessor: ImagePreprocessor) -> dict:
+    def fingerprint(image_data: bytes) -> tuple:
+        return image_fingerprint(preprocessor.prepare(image_data).data)
+
+    originals = [template_receipt_photo(seed) for seed in range(args.receipts)]
+    prints = [fingerprint(image_data) for image_data in originals]
+    different = [(prints[i], prints[j]) for i, j in itertools.combinations(range(len(prints)), 2)]
+    same = [(prints[i], fingerprint(copy)) for i, image_data in enumerate(originals) for copy in copies(image_data)]
+    one_line = [(prints[seed], fingerprint(template_receipt_photo(seed, changed_line=3))) for seed in range(len(prints))]
+    return {
+        "different_receipts": matching(args, different),
+        "copies": matching(args, same),
+        "one_line_changed": matching(args, one_line),
+    }
+
+
+def index_latency(args) -> dict:
+    rng = random.Random(42)
+    hashes = [rng.getrandbits(HASH_BITS) for _ in range(args.entries)]
+    index = NearDuplicateIndex(
+        max_distance=args.max_distance, window_seconds=24 * 3600, max_entries=args.entries
+    )
+    insert = timed_us(index.add, [(h, f"{i:x}") for i, h in enumerate(hashes)])
+
+    def flipped(value: int) -> int:
+        for bit in rng.sample(range(HASH_BITS), rng.randint(0, args.max_distance)):
+            value ^= 1 << bit
+        return value
+
+    hits_expected = [(flipped(rng.choice(hashes)),) for _ in range(args.queries)]
+    misses_expected = [(rng.getrandbits(HASH_BITS),) for _ in range(args.queries)]
+    hit = timed_us(index.query, hits_expected)
+    miss = timed_us(index.query, misses_expected)
+
+    def linear_scan(value: int):
+        return [other for other in hashes if (value ^ other).bit_count() <= args.max_distance]
+
+    return {
+        "entries": len(index),
+        "insert": summary(insert),
+        "query_hit": summary(hit),
+        "query_miss": summary(miss),
+        "linear_scan": summary(timed_us(linear_scan, misses_expected[:50])),
+    }
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--receipts", type=int, default=30, help="Notas do mesmo modelo (pares = n*(n-1)/2)")
+    arg_parser.add_argument("--max-distance", type=int, default=settings.NEAR_DUPLICATE_MAX_DISTANCE)
+    arg_parser.add_argument("--max-content-distance", type=float, default=settings.NEAR_DUPLICATE_MAX_CONTENT_DISTANCE)
+    arg_parser.add_argument("--entries", type=int, default=100_000)
+    arg_parser.add_argument("--queries", type=int, default=2000)
+    arg_parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    args = arg_parser.parse_args()
+
+    preprocessor = ImagePreprocessor(
+        max_dimension=settings.IMAGE_MAX_DIMENSION,
+        grayscale=settings.IMAGE_GRAYSCALE,
+        jpeg_quality=settings.IMAGE_JPEG_QUALITY,
+    )
+    prepared = preprocessor.prepare(synthetic_receipt_photo())
+    fingerprint_ms = [t / 1000 for t in timed_us(image_fingerprint, [(prepared.data,)] * 20)]
+
+    results = {
+        "max_distance": args.max_distance,
+        "max_content_distance": args.max_content_distance,
+        "accuracy": accuracy(args, preprocessor),
+        "index": index_latency(args),
+        "image_fingerprint_ms": round(statistics.median(fingerprint_ms), 2),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"Casamentos (pHash a até {args.max_distance} bits; máscara de tinta a até {args.max_content_distance})")
+    labels = {
+        "different_receipts": "notas diferentes (falso positivo)",
+        "copies": "cópias da mesma nota",
+        "one_line_changed": "um item com outra quantidade",
+    }
+    for name, label in labels.items():
+        result = results["accuracy"][name]
+        print(
+            f"  {label:<36} {result['pairs']:>5} pares   só pHash {result['phash_only']:>6.1%}   "
+            f"pHash + conteúdo {result['phash_and_content']:>6.1%}"
+        )
+    index = results["index"]
+    print(f"{index['entries']:,} hashes indexados")
+    for name in ("insert", "query_hit", "query_miss", "linear_scan"):
+        print(f"  {name:<12} p50 {index[name]['p50_us']:>9.1f} µs   p99 {index[name]['p99_us']:>9.1f} µs")
+    print(f"  image_fingerprint: {results['image_fingerprint_ms']:.2f} ms (imagem preparada de {len(prepared.data):,} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Golden test do ReceiptParser: compara a saída atual com a registrada em
+benchmarks/golden/parser.json (itens, subtotal, total e confiança).
+
+Uso (a partir de backend/):
+    python -m benchmarks.parser_golden            # verifica
+    python -m benchmarks.parser_golden --update   # regrava o golden
+"""
+import argparse
+import json
+import os
+import sys
+
+from app.core.ocr.parser import ReceiptParser
+from benchmarks.corpus import golden_cases
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "golden", "parser.json")
+
+
+def snapshot(parser: ReceiptParser, text: str) -> dict:
+    """Saída do parser sem os campos aleatórios (ids)."""
+    receipt = parser.parse(text)
+    return {
+        "items": [
+            [item.name, item.quantity, item.unit_price, item.total_price]
+            for item in receipt.items
+        ],
+        "subtotal": receipt.subtotal,
+        "total": receipt.total,
+        "confidence_score": receipt.confidence_score,
+    }
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Golden test do ReceiptParser")
+    arg_parser.add_argument("--update", action="store_true", help="Regrava o golden com a saída atual")
+    args = arg_parser.parse_args()
+
+    parser = ReceiptParser()
+    current = {name: snapshot(parser, text) for name, text in golden_cases().items()}
+
+    if args.update:
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=1, sort_keys=True)
+        print(f"✅ Golden atualizado: {len(current)} notas em {GOLDEN_PATH}")
+        return 0
+
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+
+    failures = [name for name in golden if current.get(name) != golden[name]]
+    failures += [name for name in current if name not in golden]
+    for name in failures:
+        print(f"❌ {name}: saída diferente do golden")
+    if failures:
+        return 1
+
+    total_items = sum(len(case["items"]) for case in golden.values())
+    print(f"✅ {len(golden)} notas / {total_items} itens idênticos ao golden")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Benchmark do pré-processamento de imagem (ImagePreprocessor).
+
+Para cada imagem reporta bytes de entrada vs. saída e o tempo mediano de cada
+etapa (decode, orient, resize, color, encode), além da checagem de qualidade
+(ImageQualityGate) sobre a imagem preparada. Sem argumentos, gera uma foto
+sintética de nota no tamanho de uma câmera de celular (4032x3024, EXIF rotacionado).
+
+Uso (a partir de backend/):
+    python -m benchmarks.preprocess [imagens...] [--runs 5] [--max-dimension 1600] [--json]
+"""
+import argparse
+import io
+import json
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.core.config import settings
+from app.core.ocr.preprocessing import ImagePreprocessor
+from app.core.ocr.quality import ImageQualityGate
+
+
+def synthetic_receipt_photo(width: int = 4032, height: int = 3024) -> bytes:
+    """Foto 'de celular': papel claro com linhas de texto e ruído de sensor."""
+    img = Image.new("RGB", (width, height), (236, 232, 224))
+    draw = ImageDraw.Draw(img)
+    for row in range(60, height - 60, 48):
+        draw.text((120, row), f"{row:04d} CHOPP PILSEN 300ML      2 x 9,90      19,80", fill=(30, 30, 30))
+    noise = np.random.default_rng(42).normal(0, 12, (height, width, 3))
+    pixels = np.clip(np.asarray(img, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    photo = Image.fromarray(pixels)
+
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotacionar 90° (foto em retrato)
+    out = io.BytesIO()
+    photo.save(out, format="JPEG", quality=95, exif=exif)
+    return out.getvalue()
+
+
+def quality_gate() -> ImageQualityGate:
+    return ImageQualityGate(
+        min_side=settings.QUALITY_MIN_SIDE_PX,
+        min_brightness=settings.QUALITY_MIN_BRIGHTNESS,
+        max_clipped_ratio=settings.QUALITY_MAX_CLIPPED_RATIO,
+        min_sharpness=settings.QUALITY_MIN_SHARPNESS,
+        min_text_density=settings.QUALITY_MIN_TEXT_DENSITY,
+    )
+
+
+def bench(name: str, image_data: bytes, preprocessor: ImagePreprocessor, runs: int) -> dict:
+    results = [preprocessor.prepare(image_data) for _ in range(runs)]
+    last = results[-1]
+    gate = quality_gate()
+    quality_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        report = gate.check(last.data)
+        quality_ms.append((time.perf_counter() - start) * 1000)
+    stages = {
+        stage: round(statistics.median(r.timings_ms[stage] for r in results), 2)
+        for stage in last.timings_ms
+    }
+    return {
+        "image": name,
+        "bytes_in": last.original_size,
+        "bytes_out": len(last.data),
+        "reduction": round(1 - len(last.data) / last.original_size, 4),
+        "mime_type": last.mime_type,
+        "output_dims": [last.width, last.height],
+        "stage_ms": stages,
+        "total_ms": round(sum(stages.values()), 2),
+        "quality_ms": round(statistics.median(quality_ms), 2),
+        "quality": {
+            "rejection": report.rejection,
+            "brightness": round(report.brightness, 1),
+            "clipped_ratio": round(report.clipped_ratio, 3),
+            "glare_ratio": round(report.glare_ratio, 3),
+            "sharpness": round(report.sharpness, 1),
+            "text_density": round(report.text_density, 4),
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do pré-processamento de imagem")
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-dimension", type=int, default=settings.IMAGE_MAX_DIMENSION)
+    parser.add_argument("--quality", type=int, default=settings.IMAGE_JPEG_QUALITY)
+    parser.add_argument("--grayscale", action="store_true", default=settings.IMAGE_GRAYSCALE)
+    parser.add_argument("--json", action="store_true", help="Saída em JSON (uma linha por imagem)")
+    args = parser.parse_args()
+
+    preprocessor = ImagePreprocessor(
+        max_dimension=args.max_dimension,
+        grayscale=args.grayscale,
+        jpeg_quality=args.quality,
+    )
+
+    inputs = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            inputs.append((path, f.read()))
+    if not inputs:
+        inputs.append(("synthetic-4032x3024.jpg", synthetic_receipt_photo()))
+
+    for name, data in inputs:
+        result = bench(name, data, preprocessor, args.runs)
+        if args.json:
+            print(json.dumps(result))
+            continue
+        print(f"\n{result['image']}")
+        print(f"  bytes: {result['bytes_in']:,} -> {result['bytes_out']:,} "
+              f"(-{result['reduction']:.1%}, {result['mime_type']}, {result['output_dims'][0]}x{result['output_dims'][1]})")
+        for stage, ms in result["stage_ms"].items():
+            print(f"  {stage:<8} {ms:8.2f} ms")
+        print(f"  {'total':<8} {result['total_ms']:8.2f} ms")
+        quality = result["quality"]
+        print(f"  {'quality':<8} {result['quality_ms']:8.2f} ms  -> {quality['rejection'] or 'aceita'} "
+              f"(nitidez {quality['sharpness']}, texto {quality['text_density']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Exercita o ResilientExtractor contra um cliente falso, sem rede e sem esperar
+de verdade (relógio e sleep simulados).
+
+Cenários:
+1. Erros 503 passageiros -> retries com backoff e sucesso
+2. Queda do upstream -> circuito abre e as chamadas seguintes falham na hora
+3. Após o reset_timeout -> chamada de teste (half-open) fecha o circuito
+4. Rajada acima da quota -> token bucket segura/rejeita
+5. Streaming com 503 antes do primeiro item -> retry, mesmo limitador
+6. Streaming que não entrega o primeiro item -> timeout conta como falha
+7. Circuito aberto com fallback reprovado na checagem -> erro original
+8. Falhas de rede do httpx (cliente da SDK do Gemini) -> retry e disjuntor
+
+Uso (a partir de backend/):
+    python -m benchmarks.resilience
+"""
+import asyncio
+import random
+import sys
+
+import httpx
+
+from app.core.resilience import CircuitBreaker, CircuitOpenError, RateLimitedError, ResilientExtractor, TokenBucket
+from app.models.receipt import ReceiptData, ReceiptItem
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class UpstreamError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"{code} UNAVAILABLE")
+        self.code = code
+
+
+class FakeExtractor:
+    """
+    Responde conforme um roteiro: None = sucesso, int = erro HTTP, "stall" = não
+    responde, exceção = levantada como veio.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.calls = 0
+
+    async def extract_async(self, image, mime_type="image/jpeg") -> ReceiptData:
+        self.calls += 1
+        outcome = self.script.pop(0) if self.script else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome is not None:
+            raise UpstreamError(outcome)
+        return ReceiptData(raw_text="{}", items=[], subtotal=0.0, total=0.0, engine="fake")
+
+    async def extract_stream(self, image, mime_type="image/jpeg"):
+        self.calls += 1
+        outcome = self.script.pop(0) if self.script else None
+        if outcome == "stall":
+            # Espera de verdade: o timeout do primeiro pedaço é asyncio.wait_for
+            await asyncio.sleep(1)
+        elif outcome is not None:
+            raise UpstreamError(outcome)
+        item = ReceiptItem(name="Item", quantity=1, unit_price=1.0, total_price=1.0)
+        yield item
+        yield ReceiptData(raw_text="{}", items=[item], subtotal=1.0, total=1.0, engine="fake")
+
+
+async def main() -> int:
+    clock = FakeClock()
+    fake = FakeExtractor()
+    resilient = ResilientExtractor(
+        fake,
+        limiter=TokenBucket(rate=1.0, burst=3, clock=clock),
+        breaker=CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock),
+        max_retries=2,
+        base_delay=0.5,
+        call_timeout=10,
+        sleep=clock.sleep,
+        rng=random.Random(7),
+    )
+    checks = []
+
+    # 1. Dois 503 seguidos e depois sucesso
+    fake.script = [503, 503]
+    await resilient.extract_async(b"img")
+    checks.append(("retries com backoff", resilient.retries == 2 and resilient.breaker.state == "closed"))
+
+    # 2. Upstream fora do ar: estoura as tentativas e abre o circuito
+    fake.script = [503] * 10
+    try:
+        await resilient.extract_async(b"img")
+    except UpstreamError:
+        pass
+    calls_before = fake.calls
+    try:
+        await resilient.extract_async(b"img")
+        short_circuit = False
+    except CircuitOpenError:
+        short_circuit = fake.calls == calls_before
+    checks.append(("circuito abre e falha rápido", resilient.breaker.state == "open" and short_circuit))
+
+    # 3. Passado o reset_timeout, a chamada de teste fecha o circuito
+    fake.script = []
+    clock.now += 31
+    await resilient.extract_async(b"img")
+    checks.append(("half-open fecha após sucesso", resilient.breaker.state == "closed"))
+
+    # 4. Rajada: 3 de burst, depois 1/s; com espera máxima curta, rejeita
+    resilient.call_timeout = 0.1
+    clock.now += 10
+    rejected = 0
+    for _ in range(6):
+        try:
+            await resilient.extract_async(b"img")
+        except RateLimitedError:
+            rejected += 1
+    checks.append(("token bucket limita rajada", rejected == 3))
+
+    # 5. Streaming: 503 antes do primeiro item tem retry e gasta token como as outras chamadas
+    resilient.call_timeout = 10
+    clock.now += 10
+    fake.script = [503]
+    retries_before = resilient.retries
+    results = [result async for result in resilient.extract_stream(b"img")]
+    checks.append((
+        "streaming com retry e limitador",
+        len(results) == 2 and resilient.retries == retries_before + 1 and resilient.limiter.tokens < 2,
+    ))
+
+    # 6. Streaming parado antes do primeiro item: timeout, falhas no disjuntor, circuito abre
+    resilient.call_timeout = 0.05
+    clock.now += 10
+    fake.script = ["stall"] * 3
+    try:
+        async for _ in resilient.extract_stream(b"img"):
+            pass
+        timed_out = False
+    except TimeoutError:
+        timed_out = True
+    checks.append(("streaming sem primeiro item abre o circuito", timed_out and resilient.breaker.state == "open"))
+
+    # 7. Circuito ainda aberto: o fallback responde, mas a nota vazia não passa na checagem
+    resilient.fallback = FakeExtractor()
+    resilient.fallback_check = lambda receipt: None if receipt.items else "poucos_itens"
+    try:
+        await resilient.extract_async(b"img")
+        rejected_fallback = False
+    except CircuitOpenError:
+        rejected_fallback = resilient.fallbacks_rejected == 1
+    checks.append(("fallback reprovado não vira resposta", rejected_fallback))
+
+    # 8. Conexão recusada no httpx: retry com sucesso; seguidas, abrem o circuito
+    resilient.fallback = None
+    resilient.call_timeout = 10
+    clock.now += 31
+    # Chamada de teste do half-open com sucesso: o cenário começa com o circuito fechado
+    fake.script = []
+    await resilient.extract_async(b"img")
+    connect_error = httpx.ConnectError("Connection refused")
+    fake.script = [connect_error]
+    retries_before = resilient.retries
+    await resilient.extract_async(b"img")
+    retried = resilient.retries == retries_before + 1
+    fake.script = [connect_error] * 3
+    try:
+        await resilient.extract_async(b"img")
+    except httpx.ConnectError:
+        pass
+    checks.append(("erro de rede do httpx tem retry e abre o circuito", retried and resilient.breaker.state == "open"))
+
+    print(resilient.stats())
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+    return 0 if all(ok for _, ok in checks) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
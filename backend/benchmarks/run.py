@@ -0,0 +1,233 @@
+"""
+Suíte de micro-benchmarks offline do parser e do pipeline.
+
+Cobre:
+- ReceiptParser.parse em notas sintéticas de 10/100/1000 linhas
+- LayoutParser.parse (caixas das palavras) em notas tabulares de 10/100/1000 linhas
+- ReceiptParser._parse_price (throughput)
+- Construção e serialização Pydantic de ReceiptData com muitas linhas
+- Pós-processamento do JSON no GeminiVisionExtractor com respostas gravadas e montagem da requisição
+
+Resultados saem em JSON. Com --baseline, compara com uma execução anterior e
+falha (exit 1) se algum caso ficar mais lento que o limite.
+
+A suíte roda --runs rodadas intercaladas (cada caso uma vez por rodada, com o
+GC desligado durante a medição, como no timeit). A comparação usa o melhor
+tempo entre as rodadas, e o limite de cada caso é o maior entre --threshold e
+o ruído medido (variação do melhor tempo entre rodadas, no baseline e agora):
+em máquina compartilhada duas execuções idênticas chegam a diferir 1.5-2x nos
+casos de Pydantic, e um limite fixo de 15% só mede esse ruído.
+
+Uso (a partir de backend/):
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.15 --runs 5
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+from app.core.ocr.gemini_vision import ITEM_FIELDS, GeminiVisionExtractor
+from app.core.ocr.layout import LayoutParser, Word
+from app.core.ocr.parser import ReceiptParser
+from app.models.receipt import ReceiptData, ReceiptItem
+from benchmarks.corpus import ITEM_NAMES, synthetic_layout, synthetic_receipt
+
+
+def measure(fn, repeat: int = 7, min_time: float = 0.05) -> dict:
+    """
+    Roda `fn` em rodadas de pelo menos `min_time` segundos e devolve a
+    mediana (e a melhor) do tempo por chamada, em microssegundos.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number * 1e6)
+    finally:
+        gc.enable()
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "best_us": round(min(samples), 3),
+        "loops": number,
+    }
+
+
+def measure_rounds(cases: dict, runs: int, repeat: int) -> dict:
+    """
+    `runs` rodadas intercaladas de `measure` (um pico de carga atinge casos
+    diferentes em cada rodada). Por caso: melhor tempo, mediana das medianas
+    e ruído = variação relativa do melhor tempo entre as rodadas.
+    """
+    rounds = {name: [] for name in cases}
+    for _ in range(runs):
+        for name, fn in cases.items():
+            rounds[name].append(measure(fn, repeat=repeat))
+    results = {}
+    for name, measured in rounds.items():
+        bests = [m["best_us"] for m in measured]
+        results[name] = {
+            "median_us": round(statistics.median(m["median_us"] for m in measured), 3),
+            "best_us": min(bests),
+            "noise": round(max(bests) / min(bests) - 1, 3),
+            "loops": measured[0]["loops"],
+            "runs": runs,
+        }
+    return results
+
+
+def canned_gemini_response(n_items: int, compact: bool = False) -> str:
+    """Resposta no formato da saída estruturada do Gemini (JSON com schema)."""
+    items = [
+        [ITEM_NAMES[i % len(ITEM_NAMES)], 1 + i % 4, 10.5 + i, (10.5 + i) * (1 + i % 4)]
+        for i in range(n_items)
+    ]
+    data = {
+        "establishment_name": "RESTAURANTE BOM SABOR",
+        "date": "23/12/2025",
+        "items": items if compact else [dict(zip(ITEM_FIELDS, item)) for item in items],
+        "subtotal": 100.0,
+        "total": 110.0,
+    }
+    return json.dumps(data, ensure_ascii=False)
+
+
+def large_receipt(n_items: int) -> ReceiptData:
+    items = [
+        ReceiptItem(name=ITEM_NAMES[i % len(ITEM_NAMES)], quantity=2, unit_price=9.9, total_price=19.8)
+        for i in range(n_items)
+    ]
+    return ReceiptData(raw_text="x" * 2000, items=items, subtotal=19.8 * n_items, total=19.8 * n_items)
+
+
+def build_cases() -> dict:
+    parser = ReceiptParser()
+    cases = {}
+
+    for n_lines in (10, 100, 1000):
+        text = synthetic_receipt(n_lines, seed=n_lines)
+        cases[f"parser.parse[{n_lines} linhas]"] = lambda text=text: parser.parse(text)
+
+    layout_parser = LayoutParser()
+    for n_rows in (10, 100, 1000):
+        layout = synthetic_layout(n_rows, seed=n_rows)
+        words = [Word.from_polygon(text, points) for text, points in layout["words"]]
+        cases[f"layout.parse[{n_rows} linhas]"] = (
+            lambda words=words, text=layout["blocks"]: layout_parser.parse(words, raw_text=text)
+        )
+
+    prices = ["12,90", "1.200,50", "R$ 94,90", "35.90", "0,99", "R$ 1.234.567,89"] * 100
+    cases["parser._parse_price[600]"] = lambda: [parser._parse_price(p) for p in prices]
+
+    for n_items in (100, 1000):
+        item_dicts = [item.model_dump() for item in large_receipt(n_items).items]
+        receipt = large_receipt(n_items)
+        cases[f"ReceiptData.construct[{n_items} itens]"] = lambda item_dicts=item_dicts: ReceiptData(
+            raw_text="", items=[ReceiptItem(**d) for d in item_dicts], subtotal=0.0, total=0.0
+        )
+        cases[f"ReceiptData.model_validate[{n_items} itens]"] = lambda item_dicts=item_dicts: ReceiptData.model_validate(
+            {"raw_text": "", "items": item_dicts, "subtotal": 0.0, "total": 0.0}
+        )
+        cases[f"ReceiptData.model_dump_json[{n_items} itens]"] = lambda receipt=receipt: receipt.model_dump_json()
+
+    extractor = GeminiVisionExtractor()
+    image_data = b"\xff\xd8\xff" + b"\0" * 200_000
+    cases["gemini._build_contents"] = lambda: extractor._build_contents(image_data, "image/jpeg")
+    for n_items in (10, 100, 500):
+        for compact, label in ((False, ""), (True, ", compacto")):
+            response_text = canned_gemini_response(n_items, compact=compact)
+            cases[f"gemini._parse_response[{n_items} itens{label}]"] = (
+                lambda response_text=response_text: extractor._parse_response(response_text)
+            )
+
+    return cases
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Casos cujo melhor tempo piorou mais que o limite do caso em relação ao
+    baseline: `threshold` (fração) ou o ruído medido nas duas execuções, o maior.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        # Baselines antigos só têm a mediana de uma rodada
+        before_us = before.get("best_us") or before["median_us"]
+        tolerance = max(threshold, before.get("noise", 0.0), result["noise"])
+        ratio = result["best_us"] / before_us
+        if ratio > 1 + tolerance:
+            regressions.append((name, before_us, result["best_us"], ratio, tolerance))
+    return regressions
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Micro-benchmarks offline do DivUp")
+    arg_parser.add_argument("--output", help="Arquivo JSON para gravar os resultados")
+    arg_parser.add_argument("--baseline", help="JSON de uma execução anterior para comparação")
+    arg_parser.add_argument("--threshold", type=float, default=0.15,
+                            help="Piora relativa tolerada antes de acusar regressão (padrão: 0.15)")
+    arg_parser.add_argument("--filter", default="", help="Roda só casos cujo nome contém este texto")
+    arg_parser.add_argument("--repeat", type=int, default=7, help="Amostras por caso em cada rodada")
+    arg_parser.add_argument("--runs", type=int, default=5, help="Rodadas intercaladas da suíte")
+    args = arg_parser.parse_args()
+
+    cases = {name: fn for name, fn in build_cases().items() if args.filter in name}
+    results = measure_rounds(cases, runs=args.runs, repeat=args.repeat)
+    for name, result in results.items():
+        print(f"{name:<45} {result['best_us']:>12.1f} µs  ruído {result['noise']:>6.1%}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": int(time.time()),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio, tolerance in regressions:
+            print(
+                f"❌ REGRESSÃO {name}: {before:.1f} µs -> {after:.1f} µs ({ratio:.2f}x, limite {1 + tolerance:.2f}x)",
+                file=sys.stderr,
+            )
+        if regressions:
+            return 1
+        print(f"✅ Nenhuma regressão acima de {args.threshold:.0%} (ou do ruído de cada caso)", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
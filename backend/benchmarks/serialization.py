@@ -0,0 +1,79 @@
+"""
+Bytes e tempo de serialização da resposta de /receipt/process.
+
+Para notas de 10/100/500 itens compara:
+- fastapi: caminho padrão do response_model (jsonable_encoder + json.dumps),
+  com raw_text;
+- completo: pydantic-core direto para bytes, com raw_text;
+- enxuto: sem raw_text (padrão da API);
+- enxuto+gzip: o mesmo, comprimido como sai para clientes que aceitam gzip.
+
+O raw_text é a resposta do modelo reconstruída no formato real do Gemini.
+
+Uso (a partir de backend/):
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --json
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.config import settings
+from app.core.ocr.gemini_vision import GeminiVisionExtractor
+from app.models.receipt import ProcessReceiptResponse
+from benchmarks.run import canned_gemini_response, measure
+
+SIZES = (10, 100, 500)
+
+
+def build_response(n_items: int) -> ProcessReceiptResponse:
+    receipt = GeminiVisionExtractor()._parse_response(canned_gemini_response(n_items))
+    return ProcessReceiptResponse(success=True, receipt=receipt, processing_time_ms=1234)
+
+
+def variants(response: ProcessReceiptResponse) -> dict:
+    serializer = ProcessReceiptResponse.__pydantic_serializer__
+    slim = {"receipt": {"raw_text"}}
+    return {
+        "fastapi": lambda: json.dumps(jsonable_encoder(response)).encode(),
+        "completo": lambda: serializer.to_json(response),
+        "enxuto": lambda: serializer.to_json(response, exclude=slim),
+        "enxuto+gzip": lambda: gzip.compress(
+            serializer.to_json(response, exclude=slim), compresslevel=settings.RESPONSE_GZIP_LEVEL
+        ),
+    }
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--json", action="store_true", help="Saída em JSON")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    results = {}
+    for n_items in SIZES:
+        response = build_response(n_items)
+        results[n_items] = {
+            name: {"bytes": len(fn()), **measure(fn, repeat=args.repeat)}
+            for name, fn in variants(response).items()
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    for n_items, by_variant in results.items():
+        print(f"\n{n_items} itens")
+        for name, result in by_variant.items():
+            print(f"  {name:<12} {result['bytes']:>9,} bytes  {result['median_us']:>10.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
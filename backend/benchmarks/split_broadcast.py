@@ -0,0 +1,202 @@
+"""
+Latência de broadcast das sessões de divisão (WebSocket /split/sessions/{code}/ws).
+
+Sobe um uvicorn com o extrator de replay (uma fixture, sem quota), processa
+uma nota, abre --sessions sessões com --participants conexões cada e, em cada
+sessão, um participante marca/desmarca um item a cada --interval segundos.
+Mede o tempo do envio do claim até o delta chegar em cada um dos outros
+participantes (p50/p95/p99) e quantas conexões foram derrubadas por lentidão.
+
+Uso (a partir de backend/):
+    python -m benchmarks.split_broadcast
+    python -m benchmarks.split_broadcast --sessions 500 --participants 6 --interval 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+from benchmarks.loadtest import percentile, synthetic_jpeg
+from benchmarks.startup import free_port
+
+FIXTURE = {
+    "raw_text": "",
+    "items": [
+        {"name": "Chopp 300ml", "quantity": 4, "unit_price": 12.9, "total_price": 51.6, "confidence": 0.95},
+        {"name": "Porção de fritas", "quantity": 1, "unit_price": 38.0, "total_price": 38.0, "confidence": 0.95},
+        {"name": "Água sem gás", "quantity": 2, "unit_price": 5.5, "total_price": 11.0, "confidence": 0.95},
+    ],
+    "subtotal": 100.6,
+    "total": 110.66,
+    "confidence_score": 0.95,
+    "establishment_name": "Bar do Benchmark",
+    "engine": "gemini",
+}
+
+
+def server_env(fixture_dir: str, upload_dir: str, args) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "EXTRACTOR_ENGINE": "replay",
+        "REPLAY_FIXTURE_DIR": fixture_dir,
+        "REPLAY_ON_MISS": "any",
+        "REPLAY_LATENCY_MEDIAN_MS": "1",
+        "UPLOAD_DIR": upload_dir,
+        "GEMINI_RATE_LIMIT_RPM": "100000",
+        "SPLIT_MAX_SESSIONS": str(args.sessions),
+        "SPLIT_MAX_PARTICIPANTS": str(args.participants),
+        "LOG_LEVEL": "WARNING",
+    })
+    env.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    return env
+
+
+async def wait_healthy(client: httpx.AsyncClient, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if (await client.get("/api/v1/receipt/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"/health não respondeu em {timeout}s")
+
+
+async def run_session(ws_url: str, code: str, item_id: str, args, latencies: list, counters: dict,
+                      connected: asyncio.Barrier):
+    sockets = []
+    for index in range(args.participants):
+        socket = await websockets.connect(f"{ws_url}/api/v1/split/sessions/{code}/ws?name=p{index}")
+        # welcome + snapshot
+        await socket.recv()
+        await socket.recv()
+        sockets.append(socket)
+    # Só começa a emitir com todas as sessões conectadas (handshakes fora da medição)
+    await connected.wait()
+
+    # Com todos dentro a versão é o número de participantes (um join cada);
+    # o i-ésimo claim do emissor vira a versão participants + 1 + i
+    base_version = args.participants
+    sent_at: list = []
+    claims = int(args.duration / args.interval)
+
+    async def receive(socket):
+        received = 0
+        try:
+            while received < claims:
+                message = json.loads(await socket.recv())
+                if message.get("type") != "claim":
+                    continue
+                latencies.append((time.perf_counter() - sent_at[message["version"] - base_version - 1]) * 1000)
+                received += 1
+        except websockets.ConnectionClosed as e:
+            counters["closed"] += 1
+            if e.rcvd is not None and e.rcvd.code == 4008:
+                counters["slow"] += 1
+
+    receivers = [asyncio.create_task(receive(socket)) for socket in sockets[1:]]
+    sender = sockets[0]
+    for i in range(claims):
+        sent_at.append(time.perf_counter())
+        await sender.send(json.dumps({"type": "claim", "item_id": item_id, "quantity": (i + 1) % 2}))
+        counters["sent"] += 1
+        await asyncio.sleep(args.interval)
+    try:
+        await asyncio.wait_for(asyncio.gather(*receivers), timeout=10)
+    except asyncio.TimeoutError:
+        counters["timeouts"] += 1
+    for socket in sockets:
+        await socket.close()
+
+
+async def run(args, port: int) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        await wait_healthy(client)
+        response = await client.post(
+            "/api/v1/receipt/process", files={"file": ("nota.jpg", synthetic_jpeg(), "image/jpeg")}
+        )
+        response.raise_for_status()
+        receipt = response.json()["receipt"]
+        codes = []
+        for _ in range(args.sessions):
+            created = await client.post("/api/v1/split/sessions", json={"receipt_id": receipt["id"]})
+            created.raise_for_status()
+            codes.append(created.json()["code"])
+
+        latencies: list = []
+        counters = {"sent": 0, "closed": 0, "slow": 0, "timeouts": 0}
+        connected = asyncio.Barrier(len(codes) + 1)
+        sessions = asyncio.gather(*(
+            run_session(f"ws://127.0.0.1:{port}", code, receipt["items"][0]["id"], args, latencies, counters, connected)
+            for code in codes
+        ))
+        await connected.wait()
+        start = time.perf_counter()
+        await sessions
+        elapsed = time.perf_counter() - start
+        stats = (await client.get("/api/v1/split/stats")).json()
+
+    return {
+        "sessions": args.sessions,
+        "participants": args.participants,
+        "interval_s": args.interval,
+        "elapsed_s": round(elapsed, 2),
+        "claims_sent": counters["sent"],
+        "deltas_received": len(latencies),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies, default=0.0), 2),
+        },
+        "connections_closed": counters["closed"],
+        "slow_disconnects": counters["slow"],
+        "session_timeouts": counters["timeouts"],
+        "server": stats,
+    }
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--sessions", type=int, default=200)
+    arg_parser.add_argument("--participants", type=int, default=4, help="Conexões por sessão (uma emite)")
+    arg_parser.add_argument("--interval", type=float, default=0.25, help="Segundos entre claims de cada sessão")
+    arg_parser.add_argument("--duration", type=float, default=10)
+    args = arg_parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as fixture_dir, tempfile.TemporaryDirectory() as upload_dir:
+        with open(os.path.join(fixture_dir, "benchmark.json"), "w", encoding="utf-8") as f:
+            json.dump(FIXTURE, f)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            env=server_env(fixture_dir, upload_dir, args),
+        )
+        try:
+            report = asyncio.run(run(args, port))
+        finally:
+            server.terminate()
+            server.wait()
+
+    latency = report["latency_ms"]
+    print(
+        f"{args.sessions} sessões x {args.participants} conexões | {report['deltas_received']} deltas | "
+        f"p50 {latency['p50']:.1f} ms | p95 {latency['p95']:.1f} ms | p99 {latency['p99']:.1f} ms | "
+        f"lentas {report['slow_disconnects']}",
+        file=sys.stderr,
+    )
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Ciclo de vida dos participantes e criação das sessões de divisão, pelo app de
+verdade (TestClient, sem servidor nem Gemini):
+
+1. Conectar e desconectar sem pegar nada não deixa participante fantasma
+   (sai com um delta "leave")
+2. Reconectar com o participant_id do welcome volta com o mesmo id
+3. Quem pegou itens continua na sessão depois de desconectar
+4. Com o store desligado, a sessão abre a partir da nota no cache
+5. Sem store nem cache, a criação responde 503 com o motivo (não um 404)
+
+Uso (a partir de backend/):
+    python -m benchmarks.split_sessions
+"""
+import os
+import sys
+
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+# Só o cache: a nota não passa pelo store (desligado ou falhou ao abrir)
+os.environ["RECEIPT_STORE_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+from app.api.routes.receipt import receipt_service
+from app.core.cache import ReceiptCache
+from app.core.config import settings
+from app.main import app
+from app.models.receipt import ReceiptData, ReceiptItem
+
+SESSIONS = f"{settings.API_V1_PREFIX}/split/sessions"
+
+
+def sample_receipt() -> ReceiptData:
+    return ReceiptData(
+        raw_text="",
+        items=[
+            ReceiptItem(name="Chopp 300ml", quantity=4, unit_price=12.9, total_price=51.6),
+            ReceiptItem(name="Porção de fritas", quantity=1, unit_price=38.0, total_price=38.0),
+        ],
+        subtotal=89.6,
+        total=98.56,
+    )
+
+
+def welcome(socket) -> str:
+    message = socket.receive_json()
+    assert message["type"] == "welcome", message
+    socket.receive_json()  # snapshot
+    return message["participant_id"]
+
+
+def participants(client: TestClient, code: str) -> set:
+    return {p["id"] for p in client.get(f"{SESSIONS}/{code}").json()["participants"]}
+
+
+def main() -> int:
+    checks = []
+    receipt = sample_receipt()
+    receipt_service.cache = ReceiptCache(max_entries=8, ttl_seconds=60)
+    receipt_service.cache.set("hash-da-imagem", receipt)
+
+    with TestClient(app) as client:
+        response = client.post(SESSIONS, json={"receipt_id": receipt.id})
+        checks.append(("sessão aberta com a nota só no cache", response.status_code == 201))
+        if response.status_code != 201:
+            print(f"❌ criação respondeu {response.status_code}: {response.text}")
+            return 1
+        code = response.json()["code"]
+        ws = f"{SESSIONS}/{code}/ws"
+
+        with client.websocket_connect(f"{ws}?name=Ana") as ana:
+            ana_id = welcome(ana)
+            with client.websocket_connect(f"{ws}?name=Bia") as bia:
+                bia_id = welcome(bia)
+                ana.receive_json()  # join da Bia
+            left = ana.receive_json()
+            checks.append((
+                "desconectar sem pegar nada publica leave",
+                left.get("type") == "leave" and left.get("participant") == bia_id,
+            ))
+            checks.append(("sem participante fantasma", participants(client, code) == {ana_id}))
+
+            with client.websocket_connect(f"{ws}?name=Bia&participant_id={bia_id}") as bia:
+                checks.append(("reconectar com o id mantém o id", welcome(bia) == bia_id))
+                bia.send_json({"type": "claim", "item_id": receipt.items[0].id, "quantity": 2})
+                ana.receive_json()  # join da Bia
+                ana.receive_json()  # claim da Bia
+            checks.append(("quem pegou itens fica na sessão", participants(client, code) == {ana_id, bia_id}))
+
+            with client.websocket_connect(f"{ws}?name=Caio") as caio:
+                caio_id = welcome(caio)
+            checks.append(("sem id, cada conexão que sai some", caio_id not in participants(client, code)))
+
+        cache = receipt_service.cache
+        receipt_service.cache = None
+        response = client.post(SESSIONS, json={"receipt_id": receipt.id})
+        checks.append(("sem store nem cache: 503 explicando", response.status_code == 503))
+        receipt_service.cache = cache
+
+    failed = 0
+    for name, ok in checks:
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
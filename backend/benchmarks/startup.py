@@ -0,0 +1,115 @@
+"""
+Mede o cold start do backend.
+
+- import: tempo para importar `app.main` num processo novo, e quais SDKs
+  pesadas (google.genai, google.cloud.vision) já foram carregadas por ele;
+- primeiro /health: do spawn do uvicorn até o primeiro 200 em
+  /api/v1/receipt/health.
+
+Roda sem GOOGLE_API_KEY por padrão, para provar que o import não depende dela.
+
+Uso (a partir de backend/):
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HEAVY_MODULES = ("google.genai", "google.cloud.vision")
+
+IMPORT_PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "heavy_modules": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def child_env(with_key: bool) -> dict:
+    env = dict(os.environ)
+    if not with_key:
+        env.pop("GOOGLE_API_KEY", None)
+        env.pop("GEMINI_API_KEY", None)
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+
+def measure_import(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_health(env: dict, timeout: float = 30.0) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/api/v1/receipt/health"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise TimeoutError(f"/health não respondeu em {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    arg_parser.add_argument("--runs", type=int, default=5)
+    arg_parser.add_argument("--with-key", action="store_true",
+                            help="Mantém GOOGLE_API_KEY no ambiente dos processos filhos")
+    args = arg_parser.parse_args()
+
+    env = child_env(args.with_key)
+    imports = [measure_import(env) for _ in range(args.runs)]
+    health = [measure_first_health(env) * 1000 for _ in range(args.runs)]
+
+    heavy = sorted({module for run in imports for module in run["heavy_modules"]})
+    report = {
+        "import_ms": {
+            "median": round(statistics.median(run["import_ms"] for run in imports), 1),
+            "min": round(min(run["import_ms"] for run in imports), 1),
+        },
+        "first_health_ms": {
+            "median": round(statistics.median(health), 1),
+            "min": round(min(health), 1),
+        },
+        "heavy_modules_on_import": heavy,
+    }
+    print(json.dumps(report, indent=2))
+
+    if heavy:
+        print(f"❌ SDKs carregadas no import: {', '.join(heavy)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
-const CACHE_NAME = 'divup-v1';
+// The server appends ?v=<content hash> to the css/js/assets URLs below, the
+// same fingerprinted URLs index.html requests (see backend/app/core/static.py)
 const urlsToCache = [
     '/',
     '/index.html',
@@ -8,6 +9,11 @@ const urlsToCache = [
     '/js/components.js',
     '/assets/icons/icon-192.png'
 ];
+// A changed asset changes this script, so the new worker gets a new cache
+// and activate drops the old one
+const CACHE_NAME = 'divup-' + urlsToCache
+    .map(url => url.split('?v=')[1] || '')
+    .join('');
 
 // Install event - cache static assets
 self.addEventListener('install', event => {
@@ -56,6 +62,7 @@ self.addEventListener('fetch', event => {
                     });
                 return response;
             })
-            .catch(() => caches.match(event.request))
+            // ignoreSearch: requests without ?v= (e.g. manifest icons) still hit the precache
+            .catch(() => caches.match(event.request, { ignoreSearch: true }))
     );
 });